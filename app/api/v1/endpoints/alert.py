@@ -9,6 +9,7 @@ from typing import Dict, Any, List
 from app.core import database
 from app.core import models
 from app.config.settings import settings
+from services.prometheus_http import prometheus_http
 
 get_db = database.get_db
 
@@ -17,16 +18,15 @@ router = APIRouter(
     tags=["Alert Rules"]
 )
 
-PROMETHEUS_URL = settings.prometheus_url
+PROMETHEUS_URL = settings.prometheus_url.rstrip("/")
 PROMETHEUS_RULES_ENDPOINT = f"{PROMETHEUS_URL}/api/v1/rules"
 
 async def fetch_prometheus_rules() -> Dict[str, Any]:
     """Fetch alert rules from Prometheus"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(PROMETHEUS_RULES_ENDPOINT, timeout=30.0)
-            response.raise_for_status()  
-            return response.json()  
+        response = await prometheus_http.client.get(PROMETHEUS_RULES_ENDPOINT)
+        response.raise_for_status()  
+        return response.json()  
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=500, 
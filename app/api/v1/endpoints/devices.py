@@ -8,6 +8,11 @@ from app.core import schemas
 from services import device_service, snmp_service
 from services.device_service import DeviceRepository, get_repository
 from services.snmp_service import SNMPClient, get_snmp_client
+from services.polling_service import tier_scheduler
+from services.metrics_publisher import metrics_publisher
+from app.core.prometheus_model import metrics_store, mark_registry_updated, poller_series_evicted
+from app.core.ring_store import recent_samples
+from services.interface_selection import interface_selector
 
 router = APIRouter(prefix="/device", tags=["Device"])
 
@@ -69,4 +74,11 @@ async def delete_devices_endpoint(
     repo: DeviceRepository = Depends(get_repository)  # DI here
 ):
     device_service.delete_device(ip, repo)
-    return {"message": "Device deleted"}
\ No newline at end of file
+    tier_scheduler.forget(ip)
+    removed = metrics_store.remove_host(ip)
+    recent_samples.remove_host(ip)
+    interface_selector.forget(ip)
+    poller_series_evicted.labels(reason="deleted").inc(removed)
+    mark_registry_updated()
+    metrics_publisher.request_push()
+    return {"message": "Device deleted", "series_removed": removed}
\ No newline at end of file
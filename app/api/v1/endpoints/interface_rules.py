@@ -0,0 +1,78 @@
+import re
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.core import database, models
+from app.core import schemas
+from services.interface_selection import InterfaceSelector, compile_rule, get_interface_selector
+
+router = APIRouter(prefix="/interface-rules", tags=["Interface Rules"])
+get_db = database.get_db
+
+
+def validate_rule(rule: schemas.InterfaceRuleInfo) -> None:
+    if rule.scope != "all" and not rule.match:
+        raise HTTPException(status_code=400, detail=f"A {rule.scope} rule needs a match value")
+    try:
+        compile_rule(rule)
+    except (ValueError, re.error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rule: {str(e)}")
+
+
+@router.get("/", response_model=List[schemas.InterfaceRuleRecord])
+def get_all_rules(db: Session = Depends(get_db)):
+    return db.query(models.InterfaceRule).order_by(models.InterfaceRule.id).all()
+
+
+@router.post("/", response_model=schemas.InterfaceRuleRecord)
+def create_rule(
+    rule: schemas.InterfaceRuleInfo,
+    db: Session = Depends(get_db),
+    selector: InterfaceSelector = Depends(get_interface_selector)
+):
+    validate_rule(rule)
+    row = models.InterfaceRule(**rule.model_dump())
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    selector.invalidate()
+    return row
+
+
+@router.put("/{rule_id}", response_model=schemas.InterfaceRuleRecord)
+def update_rule(
+    rule_id: int,
+    rule: schemas.InterfaceRuleInfo,
+    db: Session = Depends(get_db),
+    selector: InterfaceSelector = Depends(get_interface_selector)
+):
+    row = db.get(models.InterfaceRule, rule_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Interface rule not found")
+    validate_rule(rule)
+    for key, value in rule.model_dump().items():
+        setattr(row, key, value)
+    db.commit()
+    db.refresh(row)
+    selector.invalidate()
+    return row
+
+
+@router.delete("/{rule_id}")
+def delete_rule(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    selector: InterfaceSelector = Depends(get_interface_selector)
+):
+    row = db.get(models.InterfaceRule, rule_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Interface rule not found")
+    db.delete(row)
+    db.commit()
+    selector.invalidate()
+    return {"message": "Interface rule deleted successfully"}
+
+
+@router.get("/report")
+def get_selection_report(selector: InterfaceSelector = Depends(get_interface_selector)):
+    return {"status": "success", "selection": selector.report()}
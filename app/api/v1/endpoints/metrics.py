@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Request, Response
+from services.metrics_exposition import ExpositionCache, get_exposition_cache, negotiate_format
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics")
+async def metrics_endpoint(
+    request: Request,
+    cache: ExpositionCache = Depends(get_exposition_cache)
+):
+    """
+    Prometheus scrape endpoint for the poller registry. Serves only the
+    devices this worker process polls, so with SHARDING_ENABLED use the
+    Pushgateway instead of scraping it.
+    """
+    fmt = negotiate_format(request.headers.get("accept"))
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    body, content_type = await cache.render(fmt, compress)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type=content_type, headers=headers)
@@ -1,192 +1,387 @@
 import asyncio
-from fastapi import APIRouter, Depends, HTTPException
+import time
+import numpy as np
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
-from prometheus_client import generate_latest, push_to_gateway
 from app.core import database, models
 from app.core import schemas
 from services.snmp_service import get_snmp_data, bulk_snmp_walk, SNMPClient, get_snmp_client
-from app.core.prometheus_model import device_up, device_info, device_cpu_utilization, device_uptime_seconds, device_memory_utilization, registry, interface_admin_status, interface_octets, interface_errors, interface_discards, interface_oper_status
+from services.polling_service import PollPlan, TierScheduler, get_tier_scheduler, tier_scheduler, run_cycle
+from services.poll_pipeline import PollPipeline
+from services.metrics_publisher import PushgatewayPublisher, get_metrics_publisher
+from services.device_leases import DeviceAssignment, get_device_assignment
+from services.trap_receiver import TrapReceiver, get_trap_receiver
+from services.snmp_budget import SnmpRequestBudget, get_snmp_budget
+from services.interface_selection import InterfaceRuleSet, STATIC_INTERFACE_OIDS, interface_selector
+from app.core.prometheus_model import (
+    metrics_store,
+    mark_registry_updated,
+    poller_series_evicted,
+    poller_device_snmp_latency,
+    poller_decode_errors,
+)
+from app.core.compact_collector import INTERFACE_COLUMNS
+from app.core.ring_store import recent_samples, RECENT_INTERFACE_COLUMNS
 from app.config.settings import settings
 from app.config.logging import logger
 
 router = APIRouter(prefix="/polling", tags=["Polling"])
 get_db = database.get_db
 
+INTERFACE_NAME_OID = "SNMPv2-SMI::mib-2.2.2.1.2"
+
+# Walked ifTable columns in compact_collector.INTERFACE_COLUMNS order
+INTERFACE_COLUMN_OIDS = (
+    "SNMPv2-SMI::mib-2.2.2.1.7",
+    "SNMPv2-SMI::mib-2.2.2.1.8",
+    "SNMPv2-SMI::mib-2.2.2.1.10",
+    "SNMPv2-SMI::mib-2.2.2.1.16",
+    "SNMPv2-SMI::mib-2.2.2.1.14",
+    "SNMPv2-SMI::mib-2.2.2.1.20",
+    "SNMPv2-SMI::mib-2.2.2.1.13",
+    "SNMPv2-SMI::mib-2.2.2.1.19",
+    "SNMPv2-SMI::mib-2.2.2.1.11",
+    "SNMPv2-SMI::mib-2.2.2.1.17",
+)
+
 
 @router.get("/")
-async def poll_all_device(db: Session = Depends(get_db), client: SNMPClient = Depends(get_snmp_client)):
-    host_info = db.query(models.Device.ip_address, models.Device.vendor).all()
+async def poll_all_device(
+    force: bool = False,
+    budget: Optional[float] = Query(None, gt=0, description="Cycle deadline in seconds"),
+    db: Session = Depends(get_db),
+    client: SNMPClient = Depends(get_snmp_client),
+    scheduler: TierScheduler = Depends(get_tier_scheduler),
+    publisher: PushgatewayPublisher = Depends(get_metrics_publisher),
+    shard: DeviceAssignment = Depends(get_device_assignment)
+):
+    host_info = db.query(models.Device.ip_address, models.Device.vendor, models.Device.priority).all()
+    # A sharded worker only sweeps its own slice so no group is pushed twice
+    host_info = [row for row in host_info if shard.owns(row[0])]
+    plans = scheduler.plan(host_info, force=force)
+    budget = budget or settings.polling_interval * settings.poll_deadline_ratio
 
-    semaphore = asyncio.Semaphore(20)
+    cycle = await run_cycle(
+        plans,
+        lambda plan: poll_host(plan, client),
+        budget=budget,
+        concurrency=settings.polling_concurrency,
+        tiers=scheduler
+    )
 
-    async def limited_polling(ip_address: str, vendor: str):
-        async with semaphore:
-            await poll_device(ip_address, vendor, client)
-            await poll_interfaces(ip_address, client)
+    publisher.request_push()
 
-    tasks = [limited_polling(ip, vendor) for ip, vendor in host_info]
-    await asyncio.gather(*tasks)
+    return {
+        "status": "success",
+        "devices": len(host_info),
+        "polled": cycle.completed,
+        "late": cycle.late,
+        "duration": round(cycle.duration, 3),
+        "budget": cycle.budget,
+        "push": "queued" if settings.push_enabled else "disabled"
+    }
 
-    try:
-        push_to_gateway(
-            gateway=settings.pushgateway_url,
-            job='snmp_polling',
-            registry=registry,
-            grouping_key={'instance': 'snmp_poller'}
+
+@router.get("/tiers")
+async def get_polling_tiers(scheduler: TierScheduler = Depends(get_tier_scheduler)):
+    return {"status": "success", "tiers": scheduler.report()}
+
+
+@router.get("/scheduler")
+async def get_scheduler_status(request: Request):
+    poll_scheduler = getattr(request.app.state, "poll_scheduler", None)
+    if poll_scheduler is None:
+        return {"status": "disabled"}
+    return {"status": "success", "scheduler": poll_scheduler.report()}
+
+
+@router.get("/shard")
+async def get_shard_status(
+    db: Session = Depends(get_db),
+    shard: DeviceAssignment = Depends(get_device_assignment)
+):
+    devices = [ip for (ip,) in db.query(models.Device.ip_address).all()]
+    return {"status": "success", "shard": shard.report(devices)}
+
+
+@router.get("/publisher")
+async def get_publisher_status(publisher: PushgatewayPublisher = Depends(get_metrics_publisher)):
+    return {"status": "success", "publisher": publisher.report()}
+
+
+@router.get("/budget")
+async def get_budget_status(budget: SnmpRequestBudget = Depends(get_snmp_budget)):
+    return {"status": "success", "budget": budget.report()}
+
+
+@router.get("/traps")
+async def get_trap_status(receiver: TrapReceiver = Depends(get_trap_receiver)):
+    return {"status": "success", "traps": receiver.report()}
+
+
+async def poll_host(plan: PollPlan, client: SNMPClient):
+    """Run whatever the plan says is due for one device through the poll pipeline"""
+    return await poll_pipeline.submit(plan, client)
+
+
+async def fetch_host(plan: PollPlan, client: SNMPClient) -> dict:
+    """
+    Pipeline fetch stage: issue the SNMP requests the plan calls for. The
+    system GET and interface walk go out together (bounded per device by
+    the SNMP request limiter) and land in one raw record for the device.
+    """
+    raw = {}
+
+    async def system():
+        started = time.monotonic()
+        raw["device"] = await fetch_device(plan.ip_address, plan.vendor, client)
+        poller_device_snmp_latency.labels(kind="system").observe(time.monotonic() - started)
+
+    async def interfaces():
+        started = time.monotonic()
+        await interface_selector.refresh()
+        rule_set = interface_selector.rules_for(plan.ip_address, plan.vendor, plan.priority)
+        if rule_set is None:
+            raw["interfaces"] = await fetch_interfaces(plan.ip_address, client, plan.vendor)
+        else:
+            raw["interfaces"] = await fetch_selected_interfaces(plan.ip_address, rule_set, client, plan.vendor)
+        raw["interfaces_time"] = time.time()
+        poller_device_snmp_latency.labels(kind="interface").observe(time.monotonic() - started)
+
+    fetches = ([system()] if plan.poll_system else []) + ([interfaces()] if plan.poll_interfaces else [])
+    await asyncio.gather(*fetches)
+    return raw
+
+
+def decode_host(plan: PollPlan, raw: dict) -> dict:
+    """Pipeline decode stage: turn raw SNMP responses into metric values"""
+    decoded = {}
+    if "device" in raw:
+        try:
+            decoded["device"] = decode_device(plan.vendor, raw["device"])
+        except Exception as e:
+            logger.error(f"Exception in poll_device: {str(e)}")
+            poller_decode_errors.labels(vendor=plan.vendor or "unknown", kind="system").inc()
+            decoded["device"] = None
+    if "interfaces" in raw:
+        try:
+            decoded["interfaces"] = decode_interfaces(raw["interfaces"], raw.get("interfaces_time"))
+        except Exception as e:
+            logger.error(f"Interface polling error for {plan.ip_address}: {str(e)}")
+            poller_decode_errors.labels(vendor=plan.vendor or "unknown", kind="interface").inc()
+            decoded["interfaces"] = None
+    return decoded
+
+
+def write_host(plan: PollPlan, decoded: dict) -> dict:
+    """Pipeline write stage: update the metric store and record the poll against its tier"""
+    if "device" in decoded:
+        write_device(plan.ip_address, decoded["device"])
+        tier_scheduler.record(plan.ip_address, plan.tier, "system")
+    if "interfaces" in decoded:
+        write_interfaces(plan.ip_address, decoded["interfaces"])
+        tier_scheduler.record(plan.ip_address, plan.tier, "interface")
+    mark_registry_updated()
+    return decoded
+
+
+poll_pipeline = PollPipeline(fetch_fn=fetch_host, decode_fn=decode_host, write_fn=write_host)
+
+
+def get_poll_pipeline() -> PollPipeline:
+    return poll_pipeline
+
+
+@router.get("/pipeline")
+async def get_pipeline_status(pipeline: PollPipeline = Depends(get_poll_pipeline)):
+    return {"status": "success", "pipeline": pipeline.report()}
+
+
+async def fetch_device(host: str, vendor: str, client: SNMPClient) -> Optional[dict]:
+    oids = list(schemas.DEVICE_OIDS.values()) + list(schemas.VENDOR_OIDS.get(vendor, {}).values())
+    return await get_snmp_data(host, oids, client, vendor)
+
+
+def decode_device(vendor: str, result: Optional[dict]) -> Optional[dict]:
+    """Parse a device GET into metric values; None when the device did not answer"""
+    if not result or not result.get("success"):
+        return None
+
+    data = result["data"]
+    oid_values = {}
+    
+    device_oids_list = list(schemas.DEVICE_OIDS.items())
+    for i, (key, oid) in enumerate(device_oids_list):
+        if i < len(data):
+            oid_values[key] = data[i]["value"]
+        else:
+            oid_values[key] = None
+    
+    vendor_oids = schemas.VENDOR_OIDS.get(vendor, {})
+    vendor_data = {}
+    
+    oid_to_value = {item["oid"]: item["value"] for item in data}
+    
+    for key, oid in vendor_oids.items():
+        vendor_data[key] = oid_to_value.get(oid, "0")
+    
+    oid_values["cpu_utilization"] = vendor_data.get("cpu_utilization", "0")
+    
+    if vendor == "Cisco":
+        pool_1 = float(vendor_data.get("memory_pool_1", 0))
+        pool_2 = float(vendor_data.get("memory_pool_2", 0))
+        used_mem = float(vendor_data.get("memory_pool_13", 0))
+        
+        total_mem = pool_1 + pool_2
+        if total_mem > 0:
+            oid_values["memory_utilization"] = str((used_mem / total_mem) * 100)
+        else:
+            oid_values["memory_utilization"] = "0"
+    else:
+        oid_values["memory_utilization"] = "0"
+    
+    return {
+        "uptime_seconds": float(oid_values.get("uptime", 0)) / 100.0,
+        "cpu_utilization": round(float(oid_values.get("cpu_utilization", 0)), 2),
+        "memory_utilization": round(float(oid_values.get("memory_utilization", 0)), 2),
+        "device_name": oid_values.get("device_name", "Unknown"),
+        "model_name": oid_values.get("model_name", "N/A"),
+        "vendor": vendor,
+    }
+
+
+def write_device(host: str, record: Optional[dict]) -> None:
+    if record is None:
+        metrics_store.mark_device_down(host)
+        recent_samples.record_device(host, time.time(), (0, np.nan, np.nan, np.nan))
+    else:
+        metrics_store.update_device(host, **record)
+        recent_samples.record_device(
+            host,
+            time.time(),
+            (1, record["uptime_seconds"], record["cpu_utilization"], record["memory_utilization"])
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to push metrics: {str(e)}")
 
 
 @router.get("/{host}")
 async def poll_device(host: str, vendor: str, client: SNMPClient = Depends(get_snmp_client)):
     try:
-        oids = list(schemas.DEVICE_OIDS.values()) + list(schemas.VENDOR_OIDS.get(vendor, {}).values())
-        result = await get_snmp_data(host, oids, client)
-        
-        if result and result.get("success"):
-            data = result["data"]
-            oid_values = {}
-            
-            device_oids_list = list(schemas.DEVICE_OIDS.items())
-            for i, (key, oid) in enumerate(device_oids_list):
-                if i < len(data):
-                    oid_values[key] = data[i]["value"]
-                else:
-                    oid_values[key] = None
-            
-            vendor_oids = schemas.VENDOR_OIDS.get(vendor, {})
-            vendor_data = {}
-            
-            oid_to_value = {item["oid"]: item["value"] for item in data}
-            
-            for key, oid in vendor_oids.items():
-                vendor_data[key] = oid_to_value.get(oid, "0")
-            
-            oid_values["cpu_utilization"] = vendor_data.get("cpu_utilization", "0")
-            
-            if vendor == "Cisco":
-                pool_1 = float(vendor_data.get("memory_pool_1", 0))
-                pool_2 = float(vendor_data.get("memory_pool_2", 0))
-                used_mem = float(vendor_data.get("memory_pool_13", 0))
-                
-                total_mem = pool_1 + pool_2
-                if total_mem > 0:
-                    oid_values["memory_utilization"] = str((used_mem / total_mem) * 100)
-                else:
-                    oid_values["memory_utilization"] = "0"
-            else:
-                oid_values["memory_utilization"] = "0"
-            
-            device_name = oid_values.get("device_name", "Unknown")
-           
-            device_up.labels(host=host).set(1)
-            device_info.labels(
-                host=host,
-                device_name=device_name,
-                model_name=oid_values.get("model_name", "N/A"),
-                vendor=vendor
-            ).set(1)
-           
-            uptime_seconds = float(oid_values.get("uptime", 0)) / 100.0
-            device_uptime_seconds.labels(host=host).set(uptime_seconds)
-           
-            device_cpu_utilization.labels(host=host).set(
-                round(float(oid_values.get("cpu_utilization", 0)), 2)
-            )
-            device_memory_utilization.labels(host=host).set(
-                round(float(oid_values.get("memory_utilization", 0)), 2)
-            )
-           
-            return {"status": "success", "host": host, "device_name": device_name}
-           
-        else:
-            device_up.labels(host=host).set(0)
+        record = decode_device(vendor, await fetch_device(host, vendor, client))
+        write_device(host, record)
+        if record is None:
             return {"status": "failed", "host": host, "reason": "SNMP query failed"}
+        return {"status": "success", "host": host, "device_name": record["device_name"]}
        
     except Exception as e:
         logger.error(f"Exception in poll_device: {str(e)}")  # Add logging
-        device_up.labels(host=host).set(0)
+        metrics_store.mark_device_down(host)
         return {"status": "error", "host": host, "error": str(e)}
 
+
+async def fetch_interfaces(host: str, client: SNMPClient, vendor: Optional[str] = None) -> dict:
+    oids = list(schemas.INTERFACE_OIDS.values())
+    return await bulk_snmp_walk(host, oids, client, vendor)
+
+
+async def fetch_selected_interfaces(
+    host: str,
+    rule_set: InterfaceRuleSet,
+    client: SNMPClient,
+    vendor: Optional[str] = None
+) -> dict:
+    """
+    Fetch only the interfaces a device's rules select: the name/type/admin
+    columns are walked when the cached selection expires, then the counter
+    columns of the selected rows are fetched with batched GETs. Returns the
+    same shape as fetch_interfaces so decode_interfaces handles both.
+    """
+    selection = interface_selector.cached(host)
+    if selection is None:
+        walk = await bulk_snmp_walk(host, list(STATIC_INTERFACE_OIDS), client, vendor)
+        if not walk.get("success"):
+            return walk
+        selection = interface_selector.select(host, rule_set, walk["data"])
+
+    requests = [(column, index) for index in selection.names for column in INTERFACE_COLUMN_OIDS]
+    batch = settings.interface_get_batch
+    chunks = [requests[i:i + batch] for i in range(0, len(requests), batch)]
+    results = await asyncio.gather(*(
+        get_snmp_data(host, [f"1.3.6.1.2.1.2.2.1.{column.rsplit('.', 1)[-1]}.{index}" for column, index in chunk], client, vendor)
+        for chunk in chunks
+    ))
+
+    data, vanished = [], set()
+    for chunk, result in zip(chunks, results):
+        if not result or not result.get("success") or len(result["data"]) != len(chunk):
+            return {"success": False, "error": "interface GET failed"}
+        for (column, index), item in zip(chunk, result["data"]):
+            if item["value"].lstrip("-").isdigit():
+                data.append({"base_oid": column, "index": index, "value": item["value"]})
+            else:
+                vanished.add(index)
+    if vanished:
+        # Rows removed since the last static walk answer noSuchInstance; re-walk next time
+        interface_selector.forget(host)
+        data = [item for item in data if item["index"] not in vanished]
+    data += [
+        {"base_oid": INTERFACE_NAME_OID, "index": index, "value": name}
+        for index, name in selection.names.items() if index not in vanished
+    ]
+    return {"success": True, "data": data}
+
+
+def decode_interfaces(
+    result: Optional[dict],
+    sampled_at: Optional[float] = None
+) -> Optional[Tuple[List[str], List[str], np.ndarray, float]]:
+    """Group a walk by ifIndex into (indices, names, values in INTERFACE_COLUMNS order, sample time)"""
+    if not result or not result.get("success"):
+        return None
+
+    # Group results by interface index
+    interfaces = {}
+    for item in result["data"]:
+        index = item["index"]
+        if index not in interfaces:
+            interfaces[index] = {}
+        interfaces[index][item["base_oid"]] = item["value"]
+        
+    indices = list(interfaces)
+    names = [interfaces[index].get(INTERFACE_NAME_OID, "n/a") for index in indices]
+    values = np.array(
+        [
+            [int(interfaces[index].get(oid, "0")) for oid in INTERFACE_COLUMN_OIDS]
+            for index in indices
+        ],
+        dtype=np.float64
+    ).reshape(len(indices), len(INTERFACE_COLUMNS))
+    return indices, names, values, sampled_at if sampled_at is not None else time.time()
+
+
+def write_interfaces(host: str, decoded: Optional[Tuple[List[str], List[str], np.ndarray, float]]) -> int:
+    if decoded is None:
+        # A failed walk is a missed cycle, so a dead device's interfaces still age out
+        evicted = metrics_store.mark_interfaces_missed(host)
+    else:
+        evicted = metrics_store.update_interfaces(host, *decoded)
+    if evicted:
+        poller_series_evicted.labels(reason="stale").inc(evicted)
+    if decoded is None:
+        return 0
+    recent_samples.record_interfaces(host, *metrics_store.read_interfaces(host, RECENT_INTERFACE_COLUMNS))
+    return len(decoded[0])
+
+
 @router.get("/int/{host}") 
 async def poll_interfaces(host: str,client: SNMPClient = Depends(get_snmp_client)):
     try:
-        oids = list(schemas.INTERFACE_OIDS.values())
-        result = await bulk_snmp_walk(host, oids, client)
-        
-        if not result or not result.get("success"):
+        result = await fetch_interfaces(host, client)
+        decoded = decode_interfaces(result, time.time())
+        if decoded is None:
             return
 
-        # Group results by interface index
-        interfaces = {}
-        for item in result["data"]:
-            index = item["index"]
-            if index not in interfaces:
-                interfaces[index] = {}
-            interfaces[index][item["base_oid"]] = item["value"]
-            
-        processed_interfaces = 0
-        for index, data in interfaces.items():
-            if_name = data.get("SNMPv2-SMI::mib-2.2.2.1.2", "n/a")
-           
-            interface_admin_status.labels(
-                host=host,
-                interface_index=index,
-                interface_name=if_name
-            ).set(int(data.get("SNMPv2-SMI::mib-2.2.2.1.7", "0")))
-            
-            interface_oper_status.labels(
-                host=host,
-                interface_index=index,
-                interface_name=if_name
-            ).set(int(data.get("SNMPv2-SMI::mib-2.2.2.1.8", "0")))
-           
-            # Octets (traffic)
-            interface_octets.labels(
-                host=host,
-                interface_index=index,
-                interface_name=if_name,
-                direction="in"
-            ).set(int(data.get("SNMPv2-SMI::mib-2.2.2.1.10", "0")))
-            
-            interface_octets.labels(
-                host=host,
-                interface_index=index,
-                interface_name=if_name,
-                direction="out"
-            ).set(int(data.get("SNMPv2-SMI::mib-2.2.2.1.16", "0")))
-            
-            # Errors (use a separate metric)
-            interface_errors.labels(
-                host=host,
-                interface_index=index,
-                interface_name=if_name,
-                direction="in"
-            ).set(int(data.get("SNMPv2-SMI::mib-2.2.2.1.14", "0")))
-            
-            interface_errors.labels(
-                host=host,
-                interface_index=index,
-                interface_name=if_name,
-                direction="out"
-            ).set(int(data.get("SNMPv2-SMI::mib-2.2.2.1.20", "0")))
-            
-            interface_discards.labels(
-                host=host,
-                interface_index=index,
-                interface_name=if_name,
-                direction="in"
-            ).set(int(data.get("SNMPv2-SMI::mib-2.2.2.1.13", "0"))) 
-            
-            interface_discards.labels(
-                host=host,
-                interface_index=index,
-                interface_name=if_name,
-                direction="out"
-            ).set(int(data.get("SNMPv2-SMI::mib-2.2.2.1.19", "0")))
-            
-            processed_interfaces += 1
+        processed_interfaces = write_interfaces(host, decoded)
         
         return {
             "status": "success", 
@@ -200,4 +395,4 @@ async def poll_interfaces(host: str,client: SNMPClient = Depends(get_snmp_client
             "status": "error", 
             "host": host, 
             "error": str(e)
-        }
\ No newline at end of file
+        }
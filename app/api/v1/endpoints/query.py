@@ -2,10 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 import httpx
 import asyncio
 import math
-from typing import Dict, Any, List, Optional
+import re
+import time
+from typing import Dict, Any, List, Literal, Optional, Tuple
 from abc import ABC, abstractmethod
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from app.core import schemas
+from app.core.range_results import convert, decode_matrix, decode_samples, merge, sum_series, to_points
+from app.core.ring_store import RecentSamples, get_recent_samples
+from app.core.prometheus_model import metrics_store, poller_recent_queries
+from app.config.settings import settings
+from services.prometheus_http import get_prometheus_http
+from services.query_coalescer import QueryCoalescer, get_query_coalescer
+from services.range_cache import RangeQueryCache, get_range_cache
+from services.rollup_service import RollupSink, get_rollup_sink, DEVICE_ROLLUP_COLUMNS, INTERFACE_ROLLUP_COLUMNS
 
 class IMetricsService(ABC):
     @abstractmethod
@@ -29,72 +39,119 @@ class IConfigProvider(ABC):
 
 class EnvironmentConfigProvider(IConfigProvider):
     def get_prometheus_url(self) -> str:
-        return "http://localhost:9090"
+        return settings.prometheus_url.rstrip("/")
 
 class PrometheusService(IMetricsService):
-    def __init__(self, config: IConfigProvider):
+    def __init__(self, config: IConfigProvider, client: httpx.AsyncClient, coalescer: Optional[QueryCoalescer] = None):
         self.config = config
+        self.client = client
+        self.coalescer = coalescer or get_query_coalescer()
         base_url = config.get_prometheus_url()
         self.query_endpoint = f"{base_url}/api/v1/query"
         self.query_range_endpoint = f"{base_url}/api/v1/query_range"
     
     async def query(self, query: str) -> Dict[str, Any]:
+        return await self.coalescer.run(
+            "query", (self.query_endpoint, query), lambda: self._query(query), cache=True
+        )
+
+    async def query_range(self, query: str, start_time: str, end_time: str, step: str) -> Dict[str, Any]:
+        return await self.coalescer.run(
+            "query_range",
+            (self.query_range_endpoint, query, start_time, end_time, step),
+            lambda: self._query_range(query, start_time, end_time, step)
+        )
+
+    async def _query(self, query: str) -> Dict[str, Any]:
         try:
-            async with httpx.AsyncClient() as client:
-                params = {"query": query}
-                response = await client.get(self.query_endpoint, params=params, timeout=30.0)
-                response.raise_for_status()
-                return response.json()
+            params = {"query": query}
+            response = await self.client.get(self.query_endpoint, params=params)
+            response.raise_for_status()
+            return response.json()
         except httpx.RequestError as e:
             raise HTTPException(status_code=500, detail=f"Request error: {str(e)}")
         except httpx.HTTPStatusError as e:
             raise HTTPException(status_code=e.response.status_code, detail=f"HTTP error: {str(e)}")
     
-    async def query_range(self, query: str, start_time: str, end_time: str, step: str) -> Dict[str, Any]:
+    async def _query_range(self, query: str, start_time: str, end_time: str, step: str) -> Dict[str, Any]:
         try:
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "query": query,
-                    "start": start_time,
-                    "end": end_time,
-                    "step": step
-                }
-                response = await client.get(self.query_range_endpoint, params=params, timeout=30.0)
-                response.raise_for_status()
-                return response.json()
+            params = {
+                "query": query,
+                "start": start_time,
+                "end": end_time,
+                "step": step
+            }
+            response = await self.client.get(self.query_range_endpoint, params=params)
+            response.raise_for_status()
+            return response.json()
         except httpx.RequestError as e:
             raise HTTPException(status_code=500, detail=f"Request error: {str(e)}")
         except httpx.HTTPStatusError as e:
             raise HTTPException(status_code=e.response.status_code, detail=f"HTTP error: {str(e)}")
 
+class CachedPrometheusService(PrometheusService):
+    """Range queries go through the step-aligned cache and only fetch what it lacks"""
+    def __init__(self, config: IConfigProvider, client: httpx.AsyncClient, coalescer: QueryCoalescer, cache: RangeQueryCache):
+        super().__init__(config, client, coalescer)
+        self.cache = cache
+
+    async def query_range(self, query: str, start_time: str, end_time: str, step: str) -> Dict[str, Any]:
+        return await self.cache.query_range(super().query_range, query, start_time, end_time, step)
+
 def get_config() -> IConfigProvider:
     return EnvironmentConfigProvider()
 
-def get_metrics_service(config: IConfigProvider = Depends(get_config)) -> IMetricsService:
-    return PrometheusService(config)
+def get_metrics_service(
+    config: IConfigProvider = Depends(get_config),
+    client: httpx.AsyncClient = Depends(get_prometheus_http),
+    coalescer: QueryCoalescer = Depends(get_query_coalescer),
+    cache: RangeQueryCache = Depends(get_range_cache)
+) -> IMetricsService:
+    if settings.range_cache_enabled:
+        return CachedPrometheusService(config, client, coalescer, cache)
+    return PrometheusService(config, client, coalescer)
 
 router = APIRouter(
     prefix="/query",
     tags=["Query"]
 )
 
+def serves_from_memory(recent: RecentSamples, since: float) -> bool:
+    """Short windows still held by this poller are answered without Prometheus"""
+    # A sharded worker only holds its own devices
+    return not settings.sharding_enabled and recent.covers(since)
+
 @router.get("/devices/cpu-utilization")
 async def get_all_devices_cpu_utilization(
     metrics_service: IMetricsService = Depends(get_metrics_service),
     duration: str = "5m",
     start_time: Optional[str] = None,
     end_time: Optional[str] = None,
-    step: str = "15s"
+    step: str = "15s",
+    recent: RecentSamples = Depends(get_recent_samples)
 ):
     try:
-        # Query specifically for CPU utilization metric
-        query = f"device_cpu_utilization_percent[{duration}]"
-        result = await metrics_service.query(query) 
-        
-        if result["status"] != "success":
-            raise HTTPException(status_code=500, detail="Prometheus query failed")
-        
-        cpu_data = format_metric(result)
+        since = time.time() - parse_duration(duration)
+        if serves_from_memory(recent, since):
+            cpu_data = [
+                {
+                    "metric": "device_cpu_utilization_percent",
+                    "device_name": metrics_store.device_labels.get(host, ("unknown",))[0],
+                    "data": to_points(times, values, "timestamp", "value", iso=False)
+                }
+                for host, times, values in recent.device_window("cpu_utilization", since)
+            ]
+            poller_recent_queries.labels(endpoint="cpu-utilization", source="memory").inc()
+        else:
+            # Query specifically for CPU utilization metric
+            query = f"device_cpu_utilization_percent[{duration}]"
+            result = await metrics_service.query(query) 
+            
+            if result["status"] != "success":
+                raise HTTPException(status_code=500, detail="Prometheus query failed")
+            
+            cpu_data = format_metric(result)
+            poller_recent_queries.labels(endpoint="cpu-utilization", source="prometheus").inc()
         
         return {
             "status": "success",
@@ -173,83 +230,129 @@ async def summary_device_status(
         }
     }
 
+# Families shown per interface row: metric name -> (field, or {direction: field})
+INTERFACE_PAGE_FIELDS = {
+    "interface_admin_status": "admin_status",
+    "interface_operational_status": "oper_status",
+    "interface_octets_total": {"in": "octets_in", "out": "octets_out"},
+    "interface_errors_total": {"in": "errors_in", "out": "errors_out"},
+    "interface_discards_total": {"in": "discards_in", "out": "discards_out"},
+    "interface_bits_per_second": {"in": "bps_in", "out": "bps_out"},
+}
+
+def label_value(value: str) -> str:
+    """Escape a string for use inside a PromQL label matcher"""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+async def interface_directory(
+    host: str,
+    metrics_service: IMetricsService,
+    with_traffic: bool
+) -> List[Tuple[str, str, float]]:
+    """
+    (ifIndex, ifName, bits per second) of every interface of host. Comes
+    from the poller's own last walk when it holds the device, otherwise from
+    one series per interface in Prometheus.
+    """
+    if not settings.sharding_enabled:
+        indices, names, traffic = metrics_store.interface_directory(host)
+        if indices:
+            return list(zip(indices, names, traffic.tolist()))
+
+    selector = f'host="{label_value(host)}"'
+    admin = await metrics_service.query(f'interface_admin_status{{{selector}}}')
+    if admin.get("status") != "success":
+        raise HTTPException(status_code=500, detail="Failed to query metrics")
+    traffic = {}
+    if with_traffic:
+        rates = await metrics_service.query(f'sum by (interface_index) (interface_bits_per_second{{{selector}}})')
+        for series in rates.get("data", {}).get("result", []):
+            traffic[series["metric"].get("interface_index")] = float(series["value"][1])
+    directory = []
+    for series in admin.get("data", {}).get("result", []):
+        labels = series.get("metric", {})
+        if "interface_index" in labels:
+            index = labels["interface_index"]
+            directory.append((index, labels.get("interface_name", ""), traffic.get(index, math.nan)))
+    return directory
+
+def sort_directory(directory: List[Tuple[str, str, float]], sort: str, descending: bool) -> List[Tuple[str, str, float]]:
+    if sort == "name":
+        key = lambda entry: entry[1]
+    elif sort == "traffic":
+        # Interfaces without a rate yet sort below idle ones either way
+        key = lambda entry: entry[2] if not math.isnan(entry[2]) else (math.inf if not descending else -math.inf)
+    else:
+        key = lambda entry: int(entry[0]) if entry[0].isdigit() else math.inf
+    return sorted(directory, key=key, reverse=descending)
+
 @router.get("/interfaces/{host}", response_model=schemas.PaginatedInterfaces)
 async def get_interfaces(
     host: str,
     metrics_service: IMetricsService = Depends(get_metrics_service),
     page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=100)
+    per_page: int = Query(20, ge=1, le=100),
+    sort: Literal["index", "name", "traffic"] = "index",
+    order: Optional[Literal["asc", "desc"]] = None
 ):
     """Async endpoint for interface metrics"""
-    # Use the injected metrics service instead of direct function call
-    query = f'{{instance="{host}"}}'
-    metrics_result = await metrics_service.query(query)
-    
-    if metrics_result.get("status") != "success":
-        raise HTTPException(status_code=500, detail="Failed to query metrics")
-    
-    metrics = metrics_result.get("data", {}).get("result", [])
-    
-    interfaces = {}
-    for metric in metrics: 
-        labels = metric.get('metric', {})
-        if 'interface_index' not in labels or 'interface_name' not in labels:
-            continue
-            
-        idx = labels.get('interface_index')
-        name = labels.get('interface_name')
-        
-        if idx not in interfaces:
-            interfaces[idx] = {
-                'index': int(idx),
-                'name': name,
-                'admin_status': 0,
-                'oper_status': 0,
-                'octets_in': 0,
-                'octets_out': 0,
-                'errors_in': 0,
-                'errors_out': 0,
-                'discards_in': 0,
-                'discards_out': 0
-            }
-        
-        value = float(metric['value'][1])
-        metric_name = labels.get('__name__', '')
-        
-        if metric_name == 'interface_admin_status':
-            interfaces[idx]['admin_status'] = int(value)
-        elif metric_name == 'interface_operational_status':
-            interfaces[idx]['oper_status'] = int(value)
-        elif 'direction' in labels:
-            direction = labels.get('direction')
-            if metric_name == 'interface_octets_total':
-                if direction == 'in': 
-                    interfaces[idx]['octets_in'] = value
-                else: 
-                    interfaces[idx]['octets_out'] = value
-            elif metric_name == 'interface_errors_total':
-                if direction == 'in': 
-                    interfaces[idx]['errors_in'] = value
-                else: 
-                    interfaces[idx]['errors_out'] = value
-            elif metric_name == 'interface_discards_total':
-                if direction == 'in': 
-                    interfaces[idx]['discards_in'] = value
-                else: 
-                    interfaces[idx]['discards_out'] = value
-    
-    interface_list = list(interfaces.values())
-    total = len(interface_list)
+    # Busiest first is what anyone sorting by traffic wants
+    order = order or ("desc" if sort == "traffic" else "asc")
+    directory = sort_directory(
+        await interface_directory(host, metrics_service, with_traffic=sort == "traffic"),
+        sort,
+        order == "desc"
+    )
+    total = len(directory)
     start = (page - 1) * per_page
-    end = start + per_page
-    paginated = interface_list[start:end]
-    
+    paginated = directory[start:start + per_page]
+
+    interfaces = {}
+    if paginated:
+        families = "|".join(name[len("interface_"):] for name in INTERFACE_PAGE_FIELDS)
+        indices = "|".join(re.escape(index) for index, _, _ in paginated)
+        query = (
+            f'{{__name__=~"interface_({families})", host="{label_value(host)}", '
+            f'interface_index=~"{label_value(indices)}"}}'
+        )
+        metrics_result = await metrics_service.query(query)
+        if metrics_result.get("status") != "success":
+            raise HTTPException(status_code=500, detail="Failed to query metrics")
+
+        for metric in metrics_result.get("data", {}).get("result", []):
+            labels = metric.get("metric", {})
+            idx = labels.get("interface_index")
+            field = INTERFACE_PAGE_FIELDS.get(labels.get("__name__", ""))
+            if idx is None or field is None:
+                continue
+            if isinstance(field, dict):
+                field = field.get(labels.get("direction", ""))
+                if field is None:
+                    continue
+            if idx not in interfaces:
+                interfaces[idx] = {
+                    'index': int(idx),
+                    'name': labels.get("interface_name", ""),
+                    'admin_status': 0,
+                    'oper_status': 0,
+                    'octets_in': 0,
+                    'octets_out': 0,
+                    'errors_in': 0,
+                    'errors_out': 0,
+                    'discards_in': 0,
+                    'discards_out': 0
+                }
+            value = float(metric['value'][1])
+            interfaces[idx][field] = int(value) if field in ("admin_status", "oper_status") else value
+
     return schemas.PaginatedInterfaces(
         host=host,
-        interfaces=[schemas.InterfaceMetric(**data) for data in paginated],
+        interfaces=[schemas.InterfaceMetric(**interfaces[index]) for index, _, _ in paginated if index in interfaces],
         page=page,
         per_page=per_page,
-        total=total
+        total=total,
+        sort=sort,
+        order=order
     )
 
 @router.post("/interface/network")
@@ -259,7 +362,8 @@ async def get_network_throughput_separated(
     end_time: Optional[str] = None,
     step: str = "60s",
     unit: str = "mbps",
-    max_points: int = 1000
+    max_points: int = 1000,
+    recent: RecentSamples = Depends(get_recent_samples)
 ):
     if not start_time or not end_time:
         end_time = datetime.now().isoformat() + "Z"
@@ -274,12 +378,12 @@ async def get_network_throughput_separated(
     except (ValueError, TypeError) as e:
         raise HTTPException(status_code=400, detail=f"Invalid time format: {str(e)}")
 
-    # Unit conversion setup
+    # Unit conversion setup (interface_bits_per_second is already in bits)
     unit_conversions = {
-        "bps": 8,
-        "kbps": 8 / 1_000,
-        "mbps": 8 / 1_000_000,
-        "gbps": 8 / 1_000_000_000
+        "bps": 1,
+        "kbps": 1 / 1_000,
+        "mbps": 1 / 1_000_000,
+        "gbps": 1 / 1_000_000_000
     }
     unit = unit.lower()
     if unit not in unit_conversions:
@@ -287,12 +391,13 @@ async def get_network_throughput_separated(
     conversion_factor = unit_conversions[unit]
 
     step_seconds = parse_duration(step)
-    window = f"{max(step_seconds * 2, 300)}s" 
 
+    # Rates are computed by the poller, so each step is an instant lookup
+    # instead of a rate() over every counter series
     queries = {
-        "inbound": f'sum(rate(interface_octets_total{{direction="in"}}[{window}]))',
-        "outbound": f'sum(rate(interface_octets_total{{direction="out"}}[{window}]))',
-        "total": f'sum(rate(interface_octets_total[{window}]))'
+        "inbound": 'sum(interface_bits_per_second{direction="in"})',
+        "outbound": 'sum(interface_bits_per_second{direction="out"})',
+        "total": 'sum(interface_bits_per_second)'
     }
 
     # Auto-adjust step if too many data points requested
@@ -305,6 +410,29 @@ async def get_network_throughput_separated(
         step_seconds = new_step
 
     results = {}
+    start_ts = start_dt.replace(tzinfo=timezone.utc).timestamp()
+    end_ts = end_dt.replace(tzinfo=timezone.utc).timestamp()
+    if end_ts >= time.time() - step_seconds and serves_from_memory(recent, start_ts - max(step_seconds, recent.lookback)):
+        for direction, column in (("inbound", "bps_in"), ("outbound", "bps_out")):
+            results[direction] = recent.interface_sum(column, start_ts, end_ts, step_seconds)
+        results["total"] = merge(results["inbound"], results["outbound"])
+        poller_recent_queries.labels(endpoint="interface-network", source="memory").inc()
+        return {
+            "status": "success",
+            "metric": "network_throughput_by_direction",
+            "unit": unit.upper(),
+            "time_range": {
+                "start": start_time,
+                "end": end_time,
+                "step": step
+            },
+            "data": {
+                direction: to_points(timestamps, convert(values, conversion_factor, 4))
+                for direction, (timestamps, values) in results.items()
+            }
+        }
+
+    poller_recent_queries.labels(endpoint="interface-network", source="prometheus").inc()
     try:
         tasks = {
             direction: metrics_service.query_range(query, start_time, end_time, step)
@@ -316,37 +444,9 @@ async def get_network_throughput_separated(
         for direction, task_result in zip(tasks.keys(), query_results):
             if isinstance(task_result, Exception):
                 results[direction] = {"error": str(task_result)}
-            elif isinstance(task_result, dict) and task_result.get("status") == "success":
-                all_series = task_result.get("data", {}).get("result", [])
-                if not all_series:
-                    results[direction] = []
-                    continue
-                
-                # Aggregate all values across series
-                aggregated_data = {}
-                for series in all_series:
-                    for point in series.get("values", []):
-                        timestamp = point[0]
-                        try:
-                            value = float(point[1]) * conversion_factor
-                        except (ValueError, TypeError):
-                            value = 0.0
-                            
-                        if timestamp in aggregated_data:
-                            aggregated_data[timestamp] += value
-                        else:
-                            aggregated_data[timestamp] = value
-                
-                formatted_data = [
-                    {
-                        "x": datetime.fromtimestamp(float(ts)).isoformat() + "Z",
-                        "y": round(val, 4)
-                    }
-                    for ts, val in sorted(aggregated_data.items())
-                ]
-                results[direction] = formatted_data
-            else:
-                results[direction] = []
+                continue
+            timestamps, values = sum_series(decode_matrix(task_result))
+            results[direction] = to_points(timestamps, convert(values, conversion_factor, 4))
 
         return {
             "status": "success",
@@ -363,6 +463,52 @@ async def get_network_throughput_separated(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing throughput data: {str(e)}")
 
+@router.get("/cache")
+async def get_query_cache_report(
+    cache: RangeQueryCache = Depends(get_range_cache),
+    coalescer: QueryCoalescer = Depends(get_query_coalescer)
+):
+    return {"range": cache.report(), "instant": coalescer.report()}
+
+@router.get("/history/{host}")
+async def get_metric_history(
+    host: str,
+    metric: str = "cpu_utilization",
+    interface_index: str = "",
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    step: str = "1h",
+    rollups: RollupSink = Depends(get_rollup_sink)
+):
+    """Long-range min/avg/max/p95 history from the rollup tier that matches the step"""
+    valid_metrics = DEVICE_ROLLUP_COLUMNS if not interface_index else INTERFACE_ROLLUP_COLUMNS
+    if metric not in valid_metrics:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Choose from: {list(valid_metrics)}")
+
+    try:
+        end_dt = datetime.fromisoformat(end_time.rstrip("Z")) if end_time else datetime.now(timezone.utc).replace(tzinfo=None)
+        start_dt = datetime.fromisoformat(start_time.rstrip("Z")) if start_time else end_dt - timedelta(days=1)
+        if end_dt <= start_dt:
+            raise ValueError("end_time must be after start_time")
+        step_seconds = parse_duration(step)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time range: {str(e)}")
+
+    start_ts = start_dt.replace(tzinfo=timezone.utc).timestamp()
+    end_ts = end_dt.replace(tzinfo=timezone.utc).timestamp()
+    resolution, points = await asyncio.to_thread(
+        rollups.query, host, metric, start_ts, end_ts, step_seconds, interface_index
+    )
+    return {
+        "status": "success",
+        "host": host,
+        "metric": metric,
+        "interface_index": interface_index or None,
+        "resolution": resolution,
+        "time_range": {"start": start_time or start_dt.isoformat() + "Z", "end": end_time or end_dt.isoformat() + "Z", "step": step},
+        "data": points
+    }
+
 def parse_duration(duration: str) -> int:
     units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
     unit = duration[-1]
@@ -375,15 +521,11 @@ def format_metric(prom_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         metric_meta = entry['metric']
         metric_name = metric_meta.get('__name__', '')
         device_name = metric_meta.get('device_name', 'unknown')
-
-        timeseries = [
-            {"timestamp": ts, "value": float(value)}
-            for ts, value in entry['values']
-        ]
+        times, values = decode_samples(entry['values'])
 
         result.append({
             "metric": metric_name,
             "device_name": device_name,
-            "data": timeseries
+            "data": to_points(times, values, "timestamp", "value", iso=False)
         })
-    return result
\ No newline at end of file
+    return result
@@ -1,6 +1,18 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from pydantic import Field, field_validator
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, Literal, Optional
+
+
+class PollingTier(BaseModel):
+    system_interval: int = Field(..., ge=5, le=3600, description="System metrics poll interval in seconds")
+    interface_interval: int = Field(..., ge=5, le=3600, description="Interface walk interval in seconds")
+
+
+DEFAULT_POLLING_TIERS = {
+    1: PollingTier(system_interval=15, interface_interval=60),
+    2: PollingTier(system_interval=60, interface_interval=120),
+    3: PollingTier(system_interval=300, interface_interval=300),
+}
 
 class Settings(BaseSettings):
     # SNMP Configuration
@@ -21,6 +33,12 @@ class Settings(BaseSettings):
         ge=0, le=10,
         description="Number of SNMP retry attempts"
     )
+    snmp_max_requests_per_device: int = Field(
+        default=2,
+        validation_alias="SNMP_MAX_REQUESTS_PER_DEVICE",
+        ge=1, le=10,
+        description="Max SNMP requests in flight to a single device"
+    )
     
     # Prometheus & Monitoring
     pushgateway_url: str = Field(
@@ -28,11 +46,93 @@ class Settings(BaseSettings):
         validation_alias="PUSHGATEWAY_URL",  # Changed from env
         description="Prometheus Push Gateway URL"
     )
+    push_enabled: bool = Field(
+        default=True,
+        validation_alias="PUSH_ENABLED",
+        description="Push metrics to the Pushgateway; set false only when Prometheus scrapes /metrics instead, never both. Required with SHARDING_ENABLED"
+    )
+    push_timeout: float = Field(
+        default=10.0,
+        validation_alias="PUSH_TIMEOUT",
+        gt=0, le=120,
+        description="Pushgateway request timeout in seconds"
+    )
+    push_retries: int = Field(
+        default=3,
+        validation_alias="PUSH_RETRIES",
+        ge=0, le=10,
+        description="Retries for a failed Pushgateway push"
+    )
     prometheus_url: str = Field(
         default="http://localhost:9090",
         validation_alias="PROMETHEUS_URL",  # Changed from env
         description="Prometheus server URL"
     )
+    prometheus_timeout: float = Field(
+        default=30.0,
+        validation_alias="PROMETHEUS_TIMEOUT",
+        gt=0, le=300,
+        description="Seconds to wait for a Prometheus API response"
+    )
+    prometheus_connect_timeout: float = Field(
+        default=5.0,
+        validation_alias="PROMETHEUS_CONNECT_TIMEOUT",
+        gt=0, le=60,
+        description="Seconds to wait for a new connection to Prometheus"
+    )
+    prometheus_max_connections: int = Field(
+        default=20,
+        validation_alias="PROMETHEUS_MAX_CONNECTIONS",
+        ge=1, le=500,
+        description="Concurrent connections the shared Prometheus client may open"
+    )
+    prometheus_max_keepalive: int = Field(
+        default=10,
+        validation_alias="PROMETHEUS_MAX_KEEPALIVE",
+        ge=0, le=500,
+        description="Idle connections kept open to Prometheus for reuse"
+    )
+    prometheus_keepalive_expiry: float = Field(
+        default=30.0,
+        validation_alias="PROMETHEUS_KEEPALIVE_EXPIRY",
+        ge=0, le=600,
+        description="Seconds an idle Prometheus connection is kept before closing"
+    )
+    prometheus_http2: bool = Field(
+        default=False,
+        validation_alias="PROMETHEUS_HTTP2",
+        description="Talk HTTP/2 to Prometheus (needs the h2 package; falls back to HTTP/1.1)"
+    )
+    query_coalesce_enabled: bool = Field(
+        default=True,
+        validation_alias="QUERY_COALESCE_ENABLED",
+        description="Share one Prometheus call among identical concurrent queries"
+    )
+    query_cache_ttl: float = Field(
+        default=5.0,
+        validation_alias="QUERY_CACHE_TTL",
+        ge=0,
+        le=300,
+        description="Seconds an instant query result is reused (0 disables the cache, coalescing stays)"
+    )
+    range_cache_enabled: bool = Field(
+        default=True,
+        validation_alias="RANGE_CACHE_ENABLED",
+        description="Cache range query results on a step-aligned grid and fetch only the new tail"
+    )
+    range_cache_max_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        validation_alias="RANGE_CACHE_MAX_BYTES",
+        ge=1024,
+        description="Memory budget of the range query cache; least recently used entries are evicted"
+    )
+    range_cache_freshness: float = Field(
+        default=60.0,
+        validation_alias="RANGE_CACHE_FRESHNESS",
+        ge=0,
+        le=3600,
+        description="Points newer than this many seconds are refetched, as Prometheus may still be ingesting them"
+    )
     
     # Database Configuration  
     database_url: str = Field(
@@ -60,6 +160,230 @@ class Settings(BaseSettings):
         ge=1, le=100,
         description="Max concurrent polling operations"
     )
+    pipeline_decode_concurrency: int = Field(
+        default=2,
+        validation_alias="PIPELINE_DECODE_CONCURRENCY",
+        ge=1, le=32,
+        description="Worker threads decoding SNMP responses"
+    )
+    pipeline_queue_size: int = Field(
+        default=100,
+        validation_alias="PIPELINE_QUEUE_SIZE",
+        ge=1, le=100000,
+        description="Capacity of each poll pipeline stage queue"
+    )
+    polling_tiers: Dict[int, PollingTier] = Field(
+        default_factory=lambda: dict(DEFAULT_POLLING_TIERS),
+        validation_alias="POLLING_TIERS",
+        description="Poll intervals per Device.priority (JSON), unknown priorities use the lowest tier"
+    )
+    poll_deadline_ratio: float = Field(
+        default=0.9,
+        validation_alias="POLL_DEADLINE_RATIO",
+        gt=0, le=1,
+        description="Fraction of the poll interval a cycle or device poll may use before it is cut off"
+    )
+    series_ttl_cycles: int = Field(
+        default=3,
+        validation_alias="SERIES_TTL_CYCLES",
+        ge=1, le=1000,
+        description="Polls a device or interface series may miss before it is removed"
+    )
+    recent_samples: int = Field(
+        default=60,
+        validation_alias="RECENT_SAMPLES",
+        ge=0, le=10000,
+        description="Polls kept in memory per device and interface to answer short-window queries (0 disables)"
+    )
+    rollup_enabled: bool = Field(
+        default=True,
+        validation_alias="ROLLUP_ENABLED",
+        description="Write 1m/1h/1d min/avg/max/p95 rollups of polled metrics to the rollup database"
+    )
+    rollup_database_url: str = Field(
+        default="sqlite:///./rollups.db",
+        validation_alias="ROLLUP_DATABASE_URL",
+        description="Database for rollups, kept apart from the device registry"
+    )
+    rollup_write_batch: int = Field(
+        default=1000,
+        validation_alias="ROLLUP_WRITE_BATCH",
+        ge=1, le=100000,
+        description="Rollup rows inserted per transaction"
+    )
+    rollup_minute_retention_days: int = Field(
+        default=7,
+        validation_alias="ROLLUP_MINUTE_RETENTION_DAYS",
+        ge=1, le=365,
+        description="Days of 1-minute rollups kept (also the source of 1h/1d rollups)"
+    )
+    rollup_hour_retention_days: int = Field(
+        default=90,
+        validation_alias="ROLLUP_HOUR_RETENTION_DAYS",
+        ge=1, le=3650,
+        description="Days of 1-hour rollups kept"
+    )
+    rollup_day_retention_days: int = Field(
+        default=400,
+        validation_alias="ROLLUP_DAY_RETENTION_DAYS",
+        ge=1, le=3650,
+        description="Days of 1-day rollups kept"
+    )
+    interface_static_refresh: int = Field(
+        default=600,
+        validation_alias="INTERFACE_STATIC_REFRESH",
+        ge=30, le=86400,
+        description="Seconds between re-walks of interface names/types/admin status on devices with interface rules"
+    )
+    interface_get_batch: int = Field(
+        default=40,
+        validation_alias="INTERFACE_GET_BATCH",
+        ge=1, le=200,
+        description="Varbinds per GET when polling the interfaces selected by interface rules"
+    )
+    state_snapshot_enabled: bool = Field(
+        default=True,
+        validation_alias="STATE_SNAPSHOT_ENABLED",
+        description="Save poll state to disk periodically and on shutdown, and restore it at startup"
+    )
+    state_snapshot_path: str = Field(
+        default="poller_state.npz",
+        validation_alias="STATE_SNAPSHOT_PATH",
+        description="File the poll state snapshot is written to"
+    )
+    state_snapshot_node_id: str = Field(
+        default="",
+        validation_alias="STATE_SNAPSHOT_NODE_ID",
+        description="Stable name for this poller's snapshot file when sharding (defaults to the host-pid worker id); "
+                    "set it only when one worker runs per process environment"
+    )
+    state_snapshot_interval: int = Field(
+        default=60,
+        validation_alias="STATE_SNAPSHOT_INTERVAL",
+        ge=5, le=3600,
+        description="Seconds between poll state snapshots"
+    )
+    state_snapshot_max_age: int = Field(
+        default=900,
+        validation_alias="STATE_SNAPSHOT_MAX_AGE",
+        ge=0, le=86400,
+        description="Snapshots older than this many seconds are ignored at startup"
+    )
+    trap_enabled: bool = Field(
+        default=False,
+        validation_alias="TRAP_ENABLED",
+        description="Listen for SNMP traps/informs and re-poll the device that sent them (re-polls need SCHEDULER_ENABLED)"
+    )
+    trap_listen_address: str = Field(
+        default="0.0.0.0",
+        validation_alias="TRAP_LISTEN_ADDRESS",
+        description="Address the trap receiver binds to; traps are only checked against the SNMP community, so firewall the port"
+    )
+    trap_port: int = Field(
+        default=1162,
+        validation_alias="TRAP_PORT",
+        ge=1, le=65535,
+        description="UDP port the trap receiver binds to (162 needs root)"
+    )
+    trap_repoll_holdoff: float = Field(
+        default=2.0,
+        validation_alias="TRAP_REPOLL_HOLDOFF",
+        ge=0, le=60,
+        description="Seconds to wait after a trap before re-polling, so a burst of traps yields one poll"
+    )
+    scheduler_enabled: bool = Field(
+        default=True,
+        validation_alias="SCHEDULER_ENABLED",
+        description="Run the background polling scheduler from the app lifespan"
+    )
+    device_refresh_interval: int = Field(
+        default=30,
+        validation_alias="DEVICE_REFRESH_INTERVAL",
+        ge=5, le=3600,
+        description="How often the scheduler reloads the device list in seconds"
+    )
+    snmp_global_rate: float = Field(
+        default=500,
+        validation_alias="SNMP_GLOBAL_RATE",
+        ge=0,
+        description="SNMP packets per second across all devices (0 = unlimited)"
+    )
+    snmp_global_burst: float = Field(
+        default=50,
+        validation_alias="SNMP_GLOBAL_BURST",
+        ge=1,
+        description="Packets the global budget may send back to back"
+    )
+    snmp_device_rate: float = Field(
+        default=20,
+        validation_alias="SNMP_DEVICE_RATE",
+        ge=0,
+        description="SNMP packets per second to any one device (0 = unlimited)"
+    )
+    snmp_device_burst: float = Field(
+        default=5,
+        validation_alias="SNMP_DEVICE_BURST",
+        ge=1,
+        description="Packets a device may receive back to back"
+    )
+    snmp_subnet_rate: float = Field(
+        default=100,
+        validation_alias="SNMP_SUBNET_RATE",
+        ge=0,
+        description="SNMP packets per second into any one subnet (0 = unlimited)"
+    )
+    snmp_subnet_burst: float = Field(
+        default=20,
+        validation_alias="SNMP_SUBNET_BURST",
+        ge=1,
+        description="Packets a subnet may receive back to back"
+    )
+    snmp_subnet_prefix: int = Field(
+        default=24,
+        validation_alias="SNMP_SUBNET_PREFIX",
+        ge=8, le=32,
+        description="Prefix length that groups devices into a subnet for the subnet rate cap"
+    )
+    sharding_enabled: bool = Field(
+        default=False,
+        validation_alias="SHARDING_ENABLED",
+        description="Split devices across poller worker processes by consistent hashing; needs PUSH_ENABLED, as /metrics only shows one worker's share"
+    )
+    shard_heartbeat_interval: int = Field(
+        default=5,
+        validation_alias="SHARD_HEARTBEAT_INTERVAL",
+        ge=1, le=300,
+        description="How often a poller worker renews its membership in seconds"
+    )
+    shard_member_ttl: int = Field(
+        default=20,
+        validation_alias="SHARD_MEMBER_TTL",
+        ge=2, le=3600,
+        description="Seconds without a heartbeat before a worker's devices are rebalanced"
+    )
+    shard_virtual_nodes: int = Field(
+        default=64,
+        validation_alias="SHARD_VIRTUAL_NODES",
+        ge=1, le=1024,
+        description="Points per worker on the consistent hash ring"
+    )
+    sharding_mode: Literal["hash", "lease"] = Field(
+        default="hash",
+        validation_alias="SHARDING_MODE",
+        description="hash: split devices by consistent hashing; lease: pollers claim devices through the device_leases table"
+    )
+    lease_ttl: int = Field(
+        default=30,
+        validation_alias="LEASE_TTL",
+        ge=5, le=3600,
+        description="Seconds a device lease stays valid without renewal"
+    )
+    lease_batch_size: int = Field(
+        default=500,
+        validation_alias="LEASE_BATCH_SIZE",
+        ge=1, le=100000,
+        description="Max devices a poller claims per heartbeat"
+    )
     
     # Logging Configuration
     log_level: str = Field(
@@ -99,6 +423,15 @@ class Settings(BaseSettings):
             raise ValueError('URL cannot be empty')
         return v.strip()
 
+    @field_validator('polling_tiers')
+    def validate_polling_tiers(cls, v):
+        if not v:
+            raise ValueError('At least one polling tier is required')
+        for priority, tier in v.items():
+            if tier.interface_interval < tier.system_interval:
+                raise ValueError(f'Tier {priority}: interface_interval must be >= system_interval')
+        return v
+
     @field_validator('environment')
     def validate_environment(cls, v):
         valid_envs = ['development', 'testing', 'staging', 'production']
@@ -0,0 +1,584 @@
+import sys
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+INTERFACE_COLUMNS = (
+    "admin_status",
+    "oper_status",
+    "octets_in",
+    "octets_out",
+    "errors_in",
+    "errors_out",
+    "discards_in",
+    "discards_out",
+    "packets_in",
+    "packets_out",
+)
+
+# Computed by the collector from consecutive walks, NaN until a valid delta exists
+RATE_COLUMNS = (
+    "bps_in",
+    "bps_out",
+    "pps_in",
+    "pps_out",
+)
+
+# Counter columns the rates are derived from, in RATE_COLUMNS order
+RATE_SOURCES = ("octets_in", "octets_out", "packets_in", "packets_out")
+RATE_SCALE = np.array([8.0, 8.0, 1.0, 1.0])
+
+COUNTER32_MODULUS = 2.0 ** 32
+
+DEVICE_COLUMNS = (
+    "up",
+    "uptime_seconds",
+    "cpu_utilization",
+    "memory_utilization",
+)
+
+# metric name, help text, [(column, direction label or None)]
+INTERFACE_FAMILIES = [
+    ("interface_admin_status", "Interface administrative status (1 = up, 0 = down)", [("admin_status", None)]),
+    ("interface_operational_status", "Interface operational status (1 = up, 0 = down)", [("oper_status", None)]),
+    ("interface_octets_total", "Total octets transmitted/received", [("octets_in", "in"), ("octets_out", "out")]),
+    ("interface_errors_total", "Total interface errors", [("errors_in", "in"), ("errors_out", "out")]),
+    ("interface_discards_total", "Total interface discards", [("discards_in", "in"), ("discards_out", "out")]),
+    ("interface_bits_per_second", "Interface traffic rate computed by the poller", [("bps_in", "in"), ("bps_out", "out")]),
+    ("interface_packets_per_second", "Interface unicast packet rate computed by the poller", [("pps_in", "in"), ("pps_out", "out")]),
+]
+
+SERIES_PER_INTERFACE = sum(len(series) for _, _, series in INTERFACE_FAMILIES)
+
+DEVICE_FAMILIES = [
+    ("device_uptime_seconds", "System uptime in seconds", "uptime_seconds"),
+    ("device_cpu_utilization_percent", "CPU utilization percentage", "cpu_utilization"),
+    ("device_memory_utilization_percent", "Memory utilization percentage", "memory_utilization"),
+]
+
+
+class ColumnTable:
+    """
+    Growable column store. Keys are interned to a row number once; values live
+    in one float64 array per column so a poll result is written with a single
+    fancy-indexed assignment. Released rows are reused through a free list.
+    """
+
+    def __init__(self, columns: Sequence[str], capacity: int = 1024):
+        self.columns = tuple(columns)
+        self.column_index = {name: i for i, name in enumerate(self.columns)}
+        self.values = np.zeros((len(self.columns), capacity), dtype=np.float64)
+        self.last_cycle = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.keys: List[Optional[Hashable]] = [None] * capacity
+        self.rows: Dict[Hashable, int] = {}
+        self.free: List[int] = []
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.values.shape[1]
+
+    def _grow(self) -> None:
+        capacity = self.capacity * 2
+        values = np.zeros((len(self.columns), capacity), dtype=np.float64)
+        values[:, :self.size] = self.values[:, :self.size]
+        self.values = values
+        self.last_cycle = np.resize(self.last_cycle, capacity)
+        self.last_cycle[self.size:] = 0
+        active = np.zeros(capacity, dtype=bool)
+        active[:self.size] = self.active[:self.size]
+        self.active = active
+        self.keys.extend([None] * (capacity - len(self.keys)))
+
+    def intern(self, key: Hashable) -> int:
+        row = self.rows.get(key)
+        if row is not None:
+            return row
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow()
+            row = self.size
+            self.size += 1
+        self.rows[key] = row
+        self.keys[row] = key
+        self.active[row] = True
+        return row
+
+    def release(self, rows: Iterable[int]) -> int:
+        released = 0
+        for row in rows:
+            key = self.keys[row]
+            if key is None:
+                continue
+            del self.rows[key]
+            self.keys[row] = None
+            self.active[row] = False
+            self.values[:, row] = 0
+            self.free.append(row)
+            released += 1
+        return released
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.last_cycle.nbytes + self.active.nbytes
+
+
+class CompactMetricsCollector(Collector):
+    """
+    Holds device and interface samples in column arrays keyed by interned
+    (host, ifIndex) rows and yields the same metric families the per-label
+    gauges used to, whenever the registry is scraped or pushed.
+
+    A host's rows that are missing from max_missed consecutive walks are
+    evicted (a failed walk misses them all), and remove_host drops
+    everything for a deleted device.
+    """
+
+    def __init__(self, max_missed: int = 3, capacity: int = 1024):
+        self.max_missed = max_missed
+        self.interfaces = ColumnTable(INTERFACE_COLUMNS + RATE_COLUMNS + ("sample_time",), capacity)
+        self.interface_names: List[str] = [""] * capacity
+        self.devices = ColumnTable(DEVICE_COLUMNS, 64)
+        self.device_labels: Dict[str, Tuple[str, str, str]] = {}
+        self._host_rows: Dict[str, np.ndarray] = {}
+        self._interface_cycles: Dict[str, int] = {}
+        self._device_cycles: Dict[str, int] = {}
+        self._device_success: Dict[str, int] = {}
+        self._rate_uptime: Dict[str, float] = {}
+        self._dirty: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    # Writes
+
+    def update_interfaces(
+        self,
+        host: str,
+        indices: Sequence[str],
+        names: Sequence[str],
+        values: np.ndarray,
+        timestamp: Optional[float] = None
+    ) -> int:
+        """
+        Store one interface walk taken at timestamp. values has one row per
+        interface in INTERFACE_COLUMNS order. Returns the number of evicted series.
+        """
+        host = sys.intern(host)
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self._lock:
+            cycle = self._interface_cycles.get(host, 0) + 1
+            self._interface_cycles[host] = cycle
+            self._touch(host)
+
+            table = self.interfaces
+            rows = np.fromiter(
+                (table.intern((host, str(index))) for index in indices),
+                dtype=np.int64,
+                count=len(indices)
+            )
+            if len(self.interface_names) < table.capacity:
+                self.interface_names.extend([""] * (table.capacity - len(self.interface_names)))
+
+            if len(rows):
+                values = np.asarray(values, dtype=np.float64)
+                self._update_rates(host, rows, values, timestamp)
+                table.values[:len(INTERFACE_COLUMNS), rows] = values.T
+                table.values[self._sample_time, rows] = timestamp
+                table.last_cycle[rows] = cycle
+                for row, name in zip(rows.tolist(), names):
+                    self.interface_names[row] = name
+
+            evicted = self._evict_stale(host, rows, cycle)
+            self._expire_rates(host, cycle)
+            return evicted
+
+    def mark_interfaces_missed(self, host: str) -> int:
+        """
+        Count a failed walk as a cycle in which none of host's interfaces
+        were seen, so they age out like interfaces missing from a walk.
+        Returns the number of evicted series.
+        """
+        host = sys.intern(host)
+        with self._lock:
+            if host not in self._host_rows:
+                return 0
+            cycle = self._interface_cycles.get(host, 0) + 1
+            self._interface_cycles[host] = cycle
+            self._touch(host)
+            evicted = self._evict_stale(host, np.zeros(0, dtype=np.int64), cycle)
+            self._expire_rates(host, cycle)
+            return evicted
+
+    def _evict_stale(self, host: str, rows: np.ndarray, cycle: int) -> int:
+        """Release host's rows missing from max_missed walks; rows are the ones just seen; caller holds the lock"""
+        table = self.interfaces
+        previous = self._host_rows.get(host)
+        known = rows if previous is None else np.union1d(previous, rows)
+        stale = known[cycle - table.last_cycle[known] >= self.max_missed]
+        if len(stale):
+            table.release(stale.tolist())
+            known = np.setdiff1d(known, stale, assume_unique=True)
+        self._host_rows[host] = known
+        return len(stale) * SERIES_PER_INTERFACE
+
+    def _expire_rates(self, host: str, cycle: int) -> None:
+        """
+        Unset the rates of host's rows the latest walk did not refresh, so a
+        row kept only until eviction exports no rate from an old counter
+        delta. Caller holds the lock.
+        """
+        table = self.interfaces
+        rows = self._host_rows[host]
+        unseen = rows[table.last_cycle[rows] != cycle]
+        if len(unseen):
+            table.values[np.ix_([table.column_index[name] for name in RATE_COLUMNS], unseen)] = np.nan
+
+    @property
+    def _sample_time(self) -> int:
+        return self.interfaces.column_index["sample_time"]
+
+    def _update_rates(self, host: str, rows: np.ndarray, values: np.ndarray, timestamp: float) -> None:
+        """
+        Derive bps/pps from the previous sample of each row. A negative delta
+        on a counter below 2^32 is treated as a Counter32 wrap; a negative
+        delta above it, or a drop in the device's sysUpTime since the last
+        walk, is treated as a counter reset and leaves the rate unset.
+        """
+        table = self.interfaces
+        source = [table.column_index[name] for name in RATE_SOURCES]
+        target = [table.column_index[name] for name in RATE_COLUMNS]
+
+        previous = table.values[source][:, rows].T
+        current = values[:, [INTERFACE_COLUMNS.index(name) for name in RATE_SOURCES]]
+        elapsed = timestamp - table.values[self._sample_time, rows]
+        has_previous = table.values[self._sample_time, rows] > 0
+
+        delta = current - previous
+        wrapped = (delta < 0) & (previous < COUNTER32_MODULUS)
+        delta = np.where(wrapped, delta + COUNTER32_MODULUS, delta)
+
+        rebooted = False
+        device_row = self.devices.rows.get(host)
+        if device_row is not None:
+            uptime = float(self.devices.values[DEVICE_COLUMNS.index("uptime_seconds"), device_row])
+            rebooted = 0 < uptime < self._rate_uptime.get(host, 0.0)
+            self._rate_uptime[host] = uptime
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = delta * RATE_SCALE / elapsed[:, None]
+        if rebooted:
+            rates[:] = np.nan
+        rates[~(has_previous & (elapsed > 0))] = np.nan
+        rates[delta < 0] = np.nan
+        table.values[np.ix_(target, rows)] = rates.T
+
+    def update_device(
+        self,
+        host: str,
+        uptime_seconds: float,
+        cpu_utilization: float,
+        memory_utilization: float,
+        device_name: str,
+        model_name: str,
+        vendor: str
+    ) -> None:
+        host = sys.intern(host)
+        with self._lock:
+            cycle = self._device_cycles.get(host, 0) + 1
+            self._device_cycles[host] = cycle
+            self._device_success[host] = cycle
+            self._touch(host)
+            row = self.devices.intern(host)
+            self.devices.values[:, row] = (1, uptime_seconds, cpu_utilization, memory_utilization)
+            self.devices.last_cycle[row] = cycle
+            self.device_labels[host] = (device_name, model_name, vendor)
+
+    def mark_device_down(self, host: str) -> None:
+        host = sys.intern(host)
+        with self._lock:
+            cycle = self._device_cycles.get(host, 0) + 1
+            self._device_cycles[host] = cycle
+            self._touch(host)
+            row = self.devices.intern(host)
+            self.devices.values[0, row] = 0
+            self.devices.last_cycle[row] = cycle
+
+    def set_interface_status(self, host: str, index: str, oper_status: float) -> bool:
+        """Overwrite one interface's oper status between walks, e.g. from a link trap"""
+        with self._lock:
+            row = self.interfaces.rows.get((host, str(index)))
+            if row is None:
+                return False
+            self.interfaces.values[self.interfaces.column_index["oper_status"], row] = oper_status
+            self._touch(host)
+            return True
+
+    def mark_device_reachable(self, host: str) -> bool:
+        """Flip a known device back to up between polls without counting a poll cycle"""
+        with self._lock:
+            row = self.devices.rows.get(host)
+            if row is None:
+                return False
+            self.devices.values[0, row] = 1
+            self._touch(host)
+            return True
+
+    def remove_host(self, host: str, publish: bool = True) -> int:
+        """
+        Drop every series for a host; returns the number of series removed.
+        With publish=False the host is not reported as removed, for hosts
+        that moved to another poller which now owns their published group.
+        """
+        with self._lock:
+            removed = 0
+            rows = self._host_rows.pop(host, None)
+            if rows is not None:
+                removed += self.interfaces.release(rows.tolist()) * SERIES_PER_INTERFACE
+            row = self.devices.rows.get(host)
+            if row is not None:
+                removed += 1 + (len(DEVICE_FAMILIES) + 1 if self._device_fresh(host) else 0)
+                self.devices.release([row])
+            self.device_labels.pop(host, None)
+            self._interface_cycles.pop(host, None)
+            self._device_cycles.pop(host, None)
+            self._device_success.pop(host, None)
+            self._rate_uptime.pop(host, None)
+            self._dirty.discard(host)
+            if removed and publish:
+                self._removed.add(host)
+            return removed
+
+    def _touch(self, host: str) -> None:
+        self._dirty.add(host)
+        self._removed.discard(host)
+
+    def mark_dirty(self, hosts: Iterable[str]) -> None:
+        """Flag hosts for re-publishing, e.g. after a failed push"""
+        with self._lock:
+            self._dirty.update(h for h in hosts if h in self._host_rows or h in self.devices.rows)
+
+    def mark_removed(self, hosts: Iterable[str]) -> None:
+        with self._lock:
+            self._removed.update(hosts)
+
+    def drain_changes(self) -> Tuple[Set[str], Set[str]]:
+        """Hosts written and hosts removed since the last call"""
+        with self._lock:
+            dirty, removed = self._dirty, self._removed
+            self._dirty, self._removed = set(), set()
+            return dirty, removed
+
+    # Snapshots
+
+    def export_state(self) -> Dict[str, np.ndarray]:
+        """Every live row as plain arrays, for a poll-state snapshot"""
+        with self._lock:
+            table = self.interfaces
+            rows = np.flatnonzero(table.active[:table.size])
+            keys = [table.keys[row] for row in rows.tolist()]
+            host_cycles = np.array([self._interface_cycles.get(key[0], 0) for key in keys], dtype=np.int64)  # type: ignore
+
+            device_hosts = list(self.devices.rows)
+            device_rows = [self.devices.rows[h] for h in device_hosts]
+            return {
+                "interface_columns": np.array(table.columns),
+                "interface_hosts": np.array([key[0] for key in keys], dtype=str),  # type: ignore
+                "interface_indices": np.array([key[1] for key in keys], dtype=str),  # type: ignore
+                "interface_names": np.array([self.interface_names[row] for row in rows.tolist()], dtype=str),
+                "interface_values": table.values[:, rows].copy(),
+                "interface_missed": host_cycles - table.last_cycle[rows],
+                "device_columns": np.array(self.devices.columns),
+                "device_hosts": np.array(device_hosts, dtype=str),
+                "device_values": self.devices.values[:, device_rows].copy(),
+                "device_labels": np.array(
+                    [self.device_labels.get(h, ("", "", "")) for h in device_hosts], dtype=str
+                ).reshape(len(device_hosts), 3),
+                "device_missed": np.array([
+                    self._device_cycles[h] - self._device_success[h] if h in self._device_success else -1
+                    for h in device_hosts
+                ], dtype=np.int64),
+                "rate_uptime": np.array([self._rate_uptime.get(h, np.nan) for h in device_hosts]),
+            }
+
+    def import_state(self, state: Dict[str, np.ndarray], keep: Optional[Callable[[str], bool]] = None) -> int:
+        """
+        Load rows saved by export_state, matching columns by name; with keep,
+        only hosts it accepts. Rates are left unset; the first walk after a
+        restart derives them from the restored counters and sample times.
+        Returns the interface rows restored.
+        """
+        with self._lock:
+            table = self.interfaces
+            saved = [str(c) for c in state["interface_columns"]]
+            columns = [(saved.index(c), table.column_index[c]) for c in table.columns if c in saved and c not in RATE_COLUMNS]
+            saved_hosts = state["interface_hosts"].tolist()
+            selected = [i for i, host in enumerate(saved_hosts) if keep is None or keep(host)]
+            hosts = [sys.intern(saved_hosts[i]) for i in selected]
+            missed = state["interface_missed"][selected].tolist()
+            cycles: Dict[str, int] = {}
+            for host, miss in zip(hosts, missed):
+                cycles[host] = max(cycles.get(host, 0), miss + 1)
+
+            host_rows: Dict[str, List[int]] = {}
+            rows = []
+            for host, index, miss in zip(hosts, state["interface_indices"][selected].tolist(), missed):
+                row = table.intern((host, index))
+                table.last_cycle[row] = cycles[host] - miss
+                host_rows.setdefault(host, []).append(row)
+                rows.append(row)
+            if len(self.interface_names) < table.capacity:
+                self.interface_names.extend([""] * (table.capacity - len(self.interface_names)))
+            for row, name in zip(rows, state["interface_names"][selected].tolist()):
+                self.interface_names[row] = name
+            if rows:
+                restored = np.array(rows, dtype=np.int64)
+                for source, target in columns:
+                    table.values[target, restored] = state["interface_values"][source, selected]
+                table.values[np.ix_([table.column_index[c] for c in RATE_COLUMNS], restored)] = np.nan
+            for host, host_row_list in host_rows.items():
+                self._host_rows[host] = np.unique(np.array(host_row_list, dtype=np.int64))
+            self._interface_cycles.update(cycles)
+
+            saved = [str(c) for c in state["device_columns"]]
+            columns = [(saved.index(c), self.devices.column_index[c]) for c in self.devices.columns if c in saved]
+            for i, host in enumerate(state["device_hosts"].tolist()):
+                if keep is not None and not keep(host):
+                    continue
+                host = sys.intern(host)
+                row = self.devices.intern(host)
+                for source, target in columns:
+                    self.devices.values[target, row] = state["device_values"][source, i]
+                miss = int(state["device_missed"][i])
+                self._device_cycles[host] = self.devices.last_cycle[row] = max(miss, 0) + 1
+                if miss >= 0:
+                    self._device_success[host] = 1
+                labels = tuple(state["device_labels"][i].tolist())
+                if any(labels):
+                    self.device_labels[host] = labels  # type: ignore
+                uptime = float(state["rate_uptime"][i])
+                if not np.isnan(uptime):
+                    self._rate_uptime[host] = uptime
+            return len(rows)
+
+    # Reads
+
+    def _device_fresh(self, host: str) -> bool:
+        success = self._device_success.get(host)
+        return success is not None and self._device_cycles[host] - success < self.max_missed
+
+    def hosts(self) -> List[str]:
+        with self._lock:
+            return list(set(self._host_rows) | set(self.devices.rows))
+
+    def read_interfaces(self, host: str, columns: Sequence[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """(ifIndex list, sample times, values with one row per interface) for a host's current rows"""
+        with self._lock:
+            rows = self._host_rows.get(host)
+            if rows is None or not len(rows):
+                return [], np.zeros(0), np.zeros((0, len(columns)))
+            table = self.interfaces
+            indices = [table.keys[row][1] for row in rows.tolist()]  # type: ignore
+            sample_times = table.values[self._sample_time, rows].copy()
+            values = table.values[[table.column_index[c] for c in columns]][:, rows].T.copy()
+            return indices, sample_times, values
+
+    def interface_directory(self, host: str) -> Tuple[List[str], List[str], np.ndarray]:
+        """(ifIndex list, ifName list, bps_in + bps_out) for a host's current rows; traffic is NaN until a rate exists"""
+        with self._lock:
+            rows = self._host_rows.get(host)
+            if rows is None or not len(rows):
+                return [], [], np.zeros(0)
+            table = self.interfaces
+            row_list = rows.tolist()
+            indices = [table.keys[row][1] for row in row_list]  # type: ignore
+            names = [self.interface_names[row] for row in row_list]
+            traffic = table.values[table.column_index["bps_in"], rows] + table.values[table.column_index["bps_out"], rows]
+            return indices, names, traffic
+
+    def series_count(self) -> int:
+        with self._lock:
+            device_series = sum(
+                1 + (len(DEVICE_FAMILIES) + 1 if self._device_fresh(host) else 0)
+                for host in self.devices.rows
+            )
+            table = self.interfaces
+            active = np.flatnonzero(table.active[:table.size])
+            rates = table.values[[table.column_index[c] for c in RATE_COLUMNS]][:, active]
+            static_series = SERIES_PER_INTERFACE - len(RATE_COLUMNS)
+            return len(self.interfaces) * static_series + int(np.isfinite(rates).sum()) + device_series
+
+    def nbytes(self) -> int:
+        return self.interfaces.nbytes() + self.devices.nbytes()
+
+    def _snapshot(self, hosts: Optional[Iterable[str]] = None):
+        """Copy out the rows to export while holding the lock"""
+        with self._lock:
+            if hosts is None:
+                if_rows = np.flatnonzero(self.interfaces.active[:self.interfaces.size])
+                device_hosts = list(self.devices.rows)
+            else:
+                hosts = list(hosts)
+                parts = [self._host_rows[h] for h in hosts if h in self._host_rows]
+                if_rows = np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+                device_hosts = [h for h in hosts if h in self.devices.rows]
+
+            if_values = self.interfaces.values[:, if_rows].copy()
+            if_labels = [
+                (*self.interfaces.keys[row], self.interface_names[row])  # type: ignore
+                for row in if_rows.tolist()
+            ]
+            device_rows = [self.devices.rows[h] for h in device_hosts]
+            device_values = self.devices.values[:, device_rows].copy()
+            device_fresh = [self._device_fresh(h) for h in device_hosts]
+            device_info = [self.device_labels.get(h) for h in device_hosts]
+        return if_labels, if_values, device_hosts, device_values, device_fresh, device_info
+
+    def collect(self, hosts: Optional[Iterable[str]] = None):
+        if_labels, if_values, device_hosts, device_values, device_fresh, device_info = self._snapshot(hosts)
+
+        up = GaugeMetricFamily("device_up", "Device reachability status (1 = up, 0 = down)", labels=["host"])
+        info = GaugeMetricFamily(
+            "device_info",
+            "Device information (static info in labels, value always 1)",
+            labels=["host", "device_name", "model_name", "vendor"]
+        )
+        device_families = [
+            (GaugeMetricFamily(name, documentation, labels=["host"]), DEVICE_COLUMNS.index(column))
+            for name, documentation, column in DEVICE_FAMILIES
+        ]
+        columns = device_values.tolist()
+        for i, host in enumerate(device_hosts):
+            up.add_metric([host], columns[0][i])
+            if not device_fresh[i]:
+                continue
+            if device_info[i]:
+                info.add_metric([host, *device_info[i]], 1)
+            for family, column in device_families:
+                family.add_metric([host], columns[column][i])
+        yield up
+        yield info
+        for family, _ in device_families:
+            yield family
+
+        for name, documentation, series in INTERFACE_FAMILIES:
+            with_direction = series[0][1] is not None
+            labelnames = ["host", "interface_index", "interface_name"] + (["direction"] if with_direction else [])
+            family = GaugeMetricFamily(name, documentation, labels=labelnames)
+            for column, direction in series:
+                values = if_values[self.interfaces.column_index[column]].tolist()
+                if with_direction:
+                    for labels, value in zip(if_labels, values):
+                        if value == value:  # rates stay NaN until two valid samples exist
+                            family.add_metric([*labels, direction], value)
+                else:
+                    for labels, value in zip(if_labels, values):
+                        family.add_metric(list(labels), value)
+            yield family
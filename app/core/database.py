@@ -14,6 +14,17 @@ SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
+# Rollups live in their own file so their bulk writes never hold the
+# registry's write lock (SQLite locks the whole database per writer)
+rollup_engine = create_engine(
+    settings.rollup_database_url,
+    connect_args={"check_same_thread": False}
+)
+
+RollupSessionLocal = sessionmaker(bind=rollup_engine, autocommit=False, autoflush=False)
+
+RollupBase = declarative_base()
+
 
 def get_db():
     db = SessionLocal()
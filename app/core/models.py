@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime
-from .database import Base
+from sqlalchemy import Column, String, Integer, Float, DateTime, Index
+from .database import Base, RollupBase
 
 
 class Device(Base):
@@ -22,3 +22,80 @@ class AlertRule(Base):
     severity = Column(String, nullable=True)       # Severity from labels
     summary = Column(String, nullable=False)       # Summary from annotations
     last_evaluation = Column(DateTime)            # Last evaluation timestamp
+
+
+class PollerWorker(Base):
+    __tablename__ = "poller_workers"
+
+    worker_id = Column(String, primary_key=True)
+    hostname = Column(String)
+    pid = Column(Integer)
+    started_at = Column(Float)     # Epoch seconds
+    heartbeat_at = Column(Float, index=True)
+
+
+class DeviceLease(Base):
+    __tablename__ = "device_leases"
+
+    ip_address = Column(String, primary_key=True)
+    owner = Column(String, index=True)
+    expires_at = Column(Float, index=True)  # Epoch seconds
+
+
+# Metrics kept long term; "up" averages to availability
+DEVICE_ROLLUP_METRICS = ("up", "cpu_utilization", "memory_utilization")
+INTERFACE_ROLLUP_METRICS = ("bps_in", "bps_out", "pps_in", "pps_out")
+ROLLUP_STATS = ("min", "avg", "max", "p95")
+
+
+def rollup_column(metric: str, stat: str) -> str:
+    return f"{metric}_{stat}"
+
+
+class DeviceRollup(RollupBase):
+    """One row per device per bucket; <metric>_<stat> columns are added below"""
+    __tablename__ = "device_rollups"
+    __table_args__ = (
+        Index("ix_device_rollups_series", "resolution", "host", "bucket"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    resolution = Column(Integer, nullable=False)     # Bucket width in seconds: 60, 3600 or 86400
+    host = Column(String, nullable=False)
+    bucket = Column(Integer, nullable=False)         # Bucket start, epoch seconds
+    count = Column(Integer)                          # Polls in the bucket
+
+
+class InterfaceRollup(RollupBase):
+    """One row per interface per bucket; <metric>_<stat> columns are added below"""
+    __tablename__ = "interface_rollups"
+    __table_args__ = (
+        Index("ix_interface_rollups_series", "resolution", "host", "interface_index", "bucket"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    resolution = Column(Integer, nullable=False)
+    host = Column(String, nullable=False)
+    interface_index = Column(String, nullable=False)
+    bucket = Column(Integer, nullable=False)
+    count = Column(Integer)
+
+
+for _model, _metrics in ((DeviceRollup, DEVICE_ROLLUP_METRICS), (InterfaceRollup, INTERFACE_ROLLUP_METRICS)):
+    for _metric in _metrics:
+        for _stat in ROLLUP_STATS:
+            setattr(_model, rollup_column(_metric, _stat), Column(Float))  # NULL when the metric had no samples
+
+
+class InterfaceRule(Base):
+    __tablename__ = "interface_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False, default="all")  # all, vendor, priority or device
+    match = Column(String, nullable=True)                  # Vendor name, priority or device IP for the scope
+    action = Column(String, nullable=False)                # include or exclude
+    name_pattern = Column(String, nullable=True)           # Regex searched in ifDescr
+    if_types = Column(String, nullable=True)               # Comma-separated ifType numbers
+    admin_status = Column(Integer, nullable=True)          # 1 up, 2 down, 3 testing
+    indices = Column(String, nullable=True)                # Comma-separated ifIndex list
+    position = Column(Integer, nullable=False, default=0)  # Order within a scope; later rules win
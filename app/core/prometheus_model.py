@@ -1,79 +1,417 @@
-from prometheus_client import Gauge, Counter, CollectorRegistry
+import threading
+from typing import Dict, List
+from prometheus_client import Gauge, Counter, Histogram, CollectorRegistry
+from app.config.settings import settings
+from app.core.compact_collector import CompactMetricsCollector
+from app.core.ring_store import recent_samples
 
 registry = CollectorRegistry()
 
-# Device reachability status
-device_up = Gauge(
-    'device_up', 
-    'Device reachability status (1 = up, 0 = down)',
-    ['host'],
-    registry=registry
+# Poller self-monitoring metrics are kept apart from device data so they can be
+# pushed under their own grouping key
+poller_registry = CollectorRegistry()
+
+
+class HostView:
+    """The device and interface series of selected hosts, serializable like a registry"""
+
+    def __init__(self, store: CompactMetricsCollector, hosts: List[str]):
+        self.store = store
+        self.hosts = hosts
+
+    def collect(self):
+        yield from self.store.collect(hosts=self.hosts)
+
+
+# Bumped whenever polling writes new samples, so serialized output can be cached
+_registry_generation = 0
+
+
+def mark_registry_updated() -> None:
+    global _registry_generation
+    _registry_generation += 1
+
+
+def registry_generation() -> int:
+    return _registry_generation
+
+
+# Device and interface samples live in column arrays instead of per-label Gauge
+# children; the collector yields device_up, device_info, device_*, and
+# interface_* families with the same names and labels when scraped or pushed.
+metrics_store = CompactMetricsCollector(max_missed=settings.series_ttl_cycles)
+registry.register(metrics_store)
+
+
+# Poller self-monitoring
+poller_tier_devices = Gauge(
+    'poller_tier_devices',
+    'Number of registered devices in each priority tier',
+    ['tier'],
+    registry=poller_registry
+)
+
+poller_tier_achieved_interval = Gauge(
+    'poller_tier_achieved_interval_seconds',
+    'Average interval actually achieved between polls of a device in each tier',
+    ['tier', 'kind'],
+    registry=poller_registry
+)
+
+poller_schedule_lag = Gauge(
+    'poller_schedule_lag_seconds',
+    'Delay between a device poll being due and being dispatched',
+    ['stat'],
+    registry=poller_registry
+)
+
+poller_dispatch_queue_depth = Gauge(
+    'poller_dispatch_queue_depth',
+    'Device polls waiting in the dispatch queue',
+    registry=poller_registry
+)
+
+poller_dispatch_rate = Gauge(
+    'poller_dispatch_rate_per_second',
+    'Target steady dispatch rate of device polls',
+    registry=poller_registry
+)
+
+poller_skipped_polls = Counter(
+    'poller_skipped_polls_total',
+    'Scheduled polls skipped because the previous poll of the device was still running',
+    registry=poller_registry
+)
+
+poller_cycle_duration = Gauge(
+    'poller_cycle_duration_seconds',
+    'Wall-clock duration of the last poll cycle',
+    ['source'],
+    registry=poller_registry
 )
 
-# Device-level metrics
-device_info = Gauge(
-    'device_info',
-    'Device information (static info in labels, value always 1)',
-    ['host', 'device_name', 'model_name', 'vendor'],  # Removed services, added vendor
-    registry=registry
+poller_cycle_budget = Gauge(
+    'poller_cycle_budget_seconds',
+    'Deadline budget of the last poll cycle',
+    ['source'],
+    registry=poller_registry
 )
 
-device_uptime_seconds = Gauge(
-    'device_uptime_seconds',
-    'System uptime in seconds',
-    ['host'],  # Removed device_name (redundant)
-    registry=registry
+poller_cycle_overruns = Counter(
+    'poller_cycle_overruns_total',
+    'Poll cycles or device polls cut off at their deadline',
+    ['source'],
+    registry=poller_registry
 )
 
-device_cpu_utilization = Gauge(
-    'device_cpu_utilization_percent',
-    'CPU utilization percentage',
-    ['host'],  # Removed device_name
-    registry=registry
+poller_late_devices = Counter(
+    'poller_late_devices_total',
+    'Device polls that did not finish before the deadline',
+    ['source'],
+    registry=poller_registry
 )
 
-device_memory_utilization = Gauge(
-    'device_memory_utilization_percent', 
-    'Memory utilization percentage',
-    ['host'],  # Removed device_name
-    registry=registry
+poller_cycle_late_devices = Gauge(
+    'poller_cycle_late_devices',
+    'Devices deferred in the last poll cycle',
+    ['source'],
+    registry=poller_registry
 )
 
-# Interface-level metrics
-interface_admin_status = Gauge(
-    'interface_admin_status',
-    'Interface administrative status (1 = up, 0 = down)',
-    ['host', 'interface_index', 'interface_name'],
-    registry=registry
+poller_push_total = Counter(
+    'poller_push_total',
+    'Pushgateway push attempts by result',
+    ['result'],
+    registry=poller_registry
 )
 
-interface_oper_status = Gauge(
-    'interface_operational_status',
-    'Interface operational status (1 = up, 0 = down)',
-    ['host', 'interface_index', 'interface_name'],
-    registry=registry
+poller_push_coalesced = Counter(
+    'poller_push_coalesced_total',
+    'Push requests folded into a push that was already pending',
+    registry=poller_registry
 )
 
-# Changed from Gauge to Counter
-interface_octets = Gauge(
-    'interface_octets_total',
-    'Total octets transmitted/received', 
-    ['host', 'interface_index', 'interface_name', 'direction'],
-    registry=registry
+poller_push_duration = Gauge(
+    'poller_push_duration_seconds',
+    'Duration of the last Pushgateway push including serialization',
+    registry=poller_registry
 )
 
-# Changed from Gauge to Counter
-interface_errors = Gauge(
-    'interface_errors_total',
-    'Total interface errors',
-    ['host', 'interface_index', 'interface_name', 'direction'],
-    registry=registry
+poller_push_bytes = Gauge(
+    'poller_push_bytes',
+    'Size of the last pushed payload',
+    ['encoding'],
+    registry=poller_registry
+)
+
+metrics_exposition_renders = Counter(
+    'metrics_exposition_renders_total',
+    'Serializations of the registry for the /metrics endpoint',
+    ['format'],
+    registry=poller_registry
+)
+
+poller_series_evicted = Counter(
+    'poller_series_evicted_total',
+    'Labelled series removed from the registry',
+    ['reason'],
+    registry=poller_registry
+)
+
+poller_tracked_series = Gauge(
+    'poller_tracked_series',
+    'Labelled device and interface series currently held in the registry',
+    registry=poller_registry
+)
+poller_tracked_series.set_function(metrics_store.series_count)
+
+poller_store_bytes = Gauge(
+    'poller_store_bytes',
+    'Memory held by the sample column arrays',
+    registry=poller_registry
+)
+poller_store_bytes.set_function(metrics_store.nbytes)
+
+poller_recent_samples_bytes = Gauge(
+    'poller_recent_samples_bytes',
+    'Memory held by the in-process recent sample history',
+    registry=poller_registry
+)
+poller_recent_samples_bytes.set_function(recent_samples.nbytes)
+
+poller_recent_queries = Counter(
+    'poller_recent_queries_total',
+    'Dashboard queries by where they were answered from',
+    ['endpoint', 'source'],
+    registry=poller_registry
+)
+
+
+poller_push_groups = Counter(
+    'poller_push_groups_total',
+    'Per-device Pushgateway groups by outcome of a publish round',
+    ['result'],
+    registry=poller_registry
+)
+
+poller_pipeline_queue_depth = Gauge(
+    'poller_pipeline_queue_depth',
+    'Items waiting in front of each poll pipeline stage',
+    ['stage'],
+    registry=poller_registry
+)
+
+poller_pipeline_busy_workers = Gauge(
+    'poller_pipeline_busy_workers',
+    'Workers currently processing an item in each poll pipeline stage',
+    ['stage'],
+    registry=poller_registry
+)
+
+poller_pipeline_items = Counter(
+    'poller_pipeline_items_total',
+    'Items handled by each poll pipeline stage',
+    ['stage', 'result'],
+    registry=poller_registry
+)
+
+
+# Poll cycle instrumentation
+
+SNMP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+poller_snmp_pdu_rtt = Histogram(
+    'poller_snmp_pdu_rtt_seconds',
+    'Round trip of a single SNMP request/response exchange',
+    ['op'],
+    buckets=SNMP_LATENCY_BUCKETS,
+    registry=poller_registry
 )
 
-# Changed from Gauge to Counter
-interface_discards = Gauge(
-    'interface_discards_total',
-    'Total interface discards',
-    ['host', 'interface_index', 'interface_name', 'direction'],
-    registry=registry
-)
\ No newline at end of file
+poller_device_snmp_latency = Histogram(
+    'poller_device_snmp_latency_seconds',
+    'SNMP time spent on one device poll, retries included',
+    ['kind'],
+    buckets=SNMP_LATENCY_BUCKETS,
+    registry=poller_registry
+)
+
+poller_snmp_timeouts = Counter(
+    'poller_snmp_timeouts_total',
+    'SNMP requests that received no response before the per-attempt timeout',
+    ['op', 'vendor'],
+    registry=poller_registry
+)
+
+poller_snmp_retries = Counter(
+    'poller_snmp_retries_total',
+    'SNMP requests re-sent after a timeout',
+    ['op', 'vendor'],
+    registry=poller_registry
+)
+
+poller_decode_errors = Counter(
+    'poller_decode_errors_total',
+    'SNMP responses that could not be decoded into metric values',
+    ['vendor', 'kind'],
+    registry=poller_registry
+)
+
+poller_stage_duration = Histogram(
+    'poller_stage_duration_seconds',
+    'Time spent in each stage of a device poll or metrics push',
+    ['stage'],
+    buckets=SNMP_LATENCY_BUCKETS,
+    registry=poller_registry
+)
+
+poller_cycle_stage_seconds = Gauge(
+    'poller_cycle_stage_seconds',
+    'Time spent in each stage by the whole process while the last poll cycle ran, summed over devices',
+    ['source', 'stage'],
+    registry=poller_registry
+)
+
+poller_cycle_devices_per_second = Gauge(
+    'poller_cycle_devices_per_second',
+    'Devices polled per second during the last poll cycle',
+    ['source'],
+    registry=poller_registry
+)
+
+
+poller_traps_received = Counter(
+    'poller_traps_received_total',
+    'SNMP traps and informs received, by trap name and how they were handled',
+    ['trap', 'result'],
+    registry=poller_registry
+)
+
+poller_trap_repolls = Counter(
+    'poller_trap_repolls_total',
+    'Device polls requested by a trap',
+    ['result'],
+    registry=poller_registry
+)
+
+
+poller_interface_rows = Gauge(
+    'poller_interface_rows',
+    'Interfaces on devices with interface rules, by whether the rules poll them',
+    ['state'],
+    registry=poller_registry
+)
+
+poller_interface_selection_savings = Gauge(
+    'poller_interface_selection_savings',
+    'Series, column-store bytes and SNMP varbinds per poll round avoided by interface rules',
+    ['unit'],
+    registry=poller_registry
+)
+
+
+poller_snmp_budget_rate = Gauge(
+    'poller_snmp_budget_rate',
+    'Configured SNMP packets per second at each budget level (0 = unlimited)',
+    ['scope'],
+    registry=poller_registry
+)
+
+poller_snmp_budget_tokens = Gauge(
+    'poller_snmp_budget_tokens',
+    'Packets left in the global SNMP budget bucket',
+    registry=poller_registry
+)
+
+poller_snmp_budget_waiters = Gauge(
+    'poller_snmp_budget_waiters',
+    'SNMP requests queued for a budget token',
+    registry=poller_registry
+)
+
+poller_snmp_budget_wait = Histogram(
+    'poller_snmp_budget_wait_seconds',
+    'Time SNMP requests spent queued for a budget token, by device priority',
+    ['priority'],
+    buckets=SNMP_LATENCY_BUCKETS,
+    registry=poller_registry
+)
+
+poller_snmp_budget_throttled = Counter(
+    'poller_snmp_budget_throttled_total',
+    'SNMP requests that had to queue, by the budget level that was exhausted',
+    ['scope'],
+    registry=poller_registry
+)
+
+poller_snmp_packets = Counter(
+    'poller_snmp_packets_total',
+    'SNMP request packets sent through the budget, retries included',
+    registry=poller_registry
+)
+
+poller_range_cache_requests = Counter(
+    'poller_range_cache_requests_total',
+    'Range queries by cache outcome (hit, partial tail fetch, miss, bypass)',
+    ['result'],
+    registry=poller_registry
+)
+poller_range_cache_bytes = Gauge(
+    'poller_range_cache_bytes',
+    'Bytes held by the range query cache',
+    registry=poller_registry
+)
+poller_range_cache_evictions = Counter(
+    'poller_range_cache_evictions_total',
+    'Range cache entries evicted to stay within the byte budget',
+    registry=poller_registry
+)
+
+poller_prometheus_queries = Counter(
+    'poller_prometheus_queries_total',
+    'Prometheus API calls by kind (query, query_range) and outcome (hit, coalesced, miss)',
+    ['kind', 'result'],
+    registry=poller_registry
+)
+poller_query_cache_entries = Gauge(
+    'poller_query_cache_entries',
+    'Instant query results held in the short-TTL cache',
+    registry=poller_registry
+)
+
+
+class StageClock:
+    """
+    Running per-stage totals for the whole process. A cycle reports the
+    difference between the totals at its start and end, i.e. stage time
+    spent by everything that ran meanwhile: overlapping sweeps, scheduler
+    polls and pushes included, not only the cycle's own devices.
+    """
+
+    def __init__(self):
+        self._totals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        poller_stage_duration.labels(stage=stage).observe(seconds)
+        with self._lock:
+            self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._totals)
+
+    def report_cycle(self, source: str, before: Dict[str, float], duration: float, devices: int) -> Dict[str, float]:
+        """Publish the process-wide stage time accumulated since before and return it"""
+        breakdown = {
+            stage: round(total - before.get(stage, 0.0), 3)
+            for stage, total in self.totals().items()
+        }
+        for stage, seconds in breakdown.items():
+            poller_cycle_stage_seconds.labels(source=source, stage=stage).set(seconds)
+        if duration > 0:
+            poller_cycle_devices_per_second.labels(source=source).set(round(devices / duration, 3))
+        return breakdown
+
+
+stage_clock = StageClock()
@@ -0,0 +1,170 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+RESAMPLE_METHODS = ("mean", "max", "min", "sum", "last")
+
+
+@dataclass
+class SeriesMatrix:
+    """
+    Prometheus matrix result as arrays: timestamps is the sorted union of
+    every series' sample times and values has one row per series, NaN
+    where a series has no sample at that time.
+    """
+    timestamps: np.ndarray
+    values: np.ndarray
+    metrics: List[Dict[str, str]]
+
+    def __len__(self) -> int:
+        return len(self.metrics)
+
+    @classmethod
+    def empty(cls) -> "SeriesMatrix":
+        return cls(np.zeros(0), np.zeros((0, 0)), [])
+
+
+def decode_samples(samples: Sequence[Sequence[Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """[[ts, "value"], ...] -> (times, values); NaN and +Inf value strings parse as such"""
+    if not samples:
+        return np.zeros(0), np.zeros(0)
+    times, values = zip(*samples)
+    # float() per string via map is the fastest parse on offer; fromiter skips the intermediate list
+    return np.fromiter(times, dtype=np.float64, count=len(times)), np.fromiter(map(float, values), dtype=np.float64, count=len(values))
+
+
+def time_columns(times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (sorted unique timestamps, column of each input time). Range results sit
+    on a start + k * step grid, which is placed in linear time; anything
+    else falls back to a sort.
+    """
+    if len(times) > 1:
+        first = times.min()
+        gaps = np.diff(times)
+        positive = gaps[gaps > 0]
+        if len(positive):
+            step = positive.min()
+            steps = np.rint((times - first) / step).astype(np.int64)
+            # A sparse grid (irregular times with one tiny gap) would make bincount huge
+            if steps.max() < 4 * len(times) and np.array_equal(first + steps * step, times):
+                present = np.bincount(steps).astype(bool)
+                column_of = np.cumsum(present) - 1
+                return first + step * np.flatnonzero(present), column_of[steps]
+    return np.unique(times, return_inverse=True)
+
+
+def decode_matrix(response: Dict[str, Any]) -> SeriesMatrix:
+    """Decode a query_range (or range vector) response; an unsuccessful one decodes as empty"""
+    if not isinstance(response, dict) or response.get("status") != "success":
+        return SeriesMatrix.empty()
+    result = response.get("data", {}).get("result", [])
+    if not result:
+        return SeriesMatrix.empty()
+
+    decoded = [decode_samples(series.get("values", [])) for series in result]
+    lengths = np.array([len(times) for times, _ in decoded])
+    all_times = np.concatenate([times for times, _ in decoded])
+    timestamps, columns = time_columns(all_times)
+    values = np.full((len(result), len(timestamps)), np.nan)
+    values[np.repeat(np.arange(len(result)), lengths), columns] = np.concatenate([v for _, v in decoded])
+    return SeriesMatrix(timestamps, values, [series.get("metric", {}) for series in result])
+
+
+def sum_series(matrix: SeriesMatrix) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum across series at each timestamp, like sum() in PromQL; timestamps no series has are dropped"""
+    if not len(matrix):
+        return np.zeros(0), np.zeros(0)
+    present = ~np.isnan(matrix.values).all(axis=0)
+    return matrix.timestamps[present], np.nansum(matrix.values[:, present], axis=0)
+
+
+def convert(values: np.ndarray, factor: float, digits: Optional[int] = None) -> np.ndarray:
+    """Scale into another unit, optionally rounding for display"""
+    scaled = values * factor
+    return np.round(scaled, digits) if digits is not None else scaled
+
+
+def resample(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    start: float,
+    end: float,
+    step: float,
+    method: str = "mean"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Put series on the grid start + i * step. Point t takes the samples in
+    (t - step, t], combined with method. timestamps and values are one
+    series, or (series, samples) arrays giving a (series, points) result
+    with NaN where a series has no samples; points no series has are dropped.
+    """
+    if method not in RESAMPLE_METHODS:
+        raise ValueError(f"Invalid resample method: {method}")
+    rows = values.reshape(-1, values.shape[-1]) if values.size else values.reshape(1, 0)
+    times = np.broadcast_to(timestamps, values.shape).reshape(rows.shape)
+    points = int(np.floor((end - start) / step)) + 1
+    valid = ~np.isnan(times) & ~np.isnan(rows)
+    bucket = np.ceil((times[valid] - start) / step).astype(np.int64)
+    inside = (bucket >= 0) & (bucket < points)
+    # One flat bin per (series, point) so every series is combined in one pass
+    bins = (np.nonzero(valid)[0][inside] * points + bucket[inside])
+    samples = rows[valid][inside]
+    size = len(rows) * points
+
+    counts = np.bincount(bins, minlength=size)
+    if method in ("mean", "sum"):
+        out = np.bincount(bins, weights=samples, minlength=size)
+        if method == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out = out / counts
+    elif method == "last":
+        out = np.full(size, np.nan)
+        # Samples are time ordered, so the last write per bin is the newest sample
+        out[bins] = samples
+    else:
+        out = np.full(size, -np.inf if method == "max" else np.inf)
+        (np.maximum if method == "max" else np.minimum).at(out, bins, samples)
+    out = np.where(counts > 0, out, np.nan).reshape(len(rows), points)
+    has_data = (counts.reshape(len(rows), points) > 0).any(axis=0)
+    grid = (start + step * np.arange(points))[has_data]
+    return grid, (out[:, has_data] if values.ndim > 1 else out[0, has_data])
+
+
+def merge(a: Tuple[np.ndarray, np.ndarray], b: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Add two (timestamps, values) series on the union of their times; a lone point keeps its value"""
+    timestamps = np.union1d(a[0], b[0])
+    values = np.zeros(len(timestamps))
+    values[np.searchsorted(timestamps, a[0])] += a[1]
+    values[np.searchsorted(timestamps, b[0])] += b[1]
+    return timestamps, values
+
+
+def iso_timestamps(timestamps: np.ndarray) -> List[str]:
+    """RFC 3339 UTC strings with a Z suffix; fractional seconds only when present"""
+    if not len(timestamps):
+        return []
+    whole = np.all(timestamps == np.floor(timestamps))
+    unit = "s" if whole else "us"
+    instants = (timestamps * (1 if whole else 1_000_000)).astype(np.int64).astype(f"datetime64[{unit}]")
+    return [text + "Z" for text in np.datetime_as_string(instants, unit=unit).tolist()]
+
+
+def to_points(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    x: str = "x",
+    y: str = "y",
+    iso: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Chart points [{x: time, y: value}, ...]. Times are ISO strings, or with
+    iso=False Unix seconds, whole ones as ints as Prometheus writes them.
+    """
+    if iso:
+        times = iso_timestamps(timestamps)
+    elif len(timestamps) and np.all(timestamps == np.floor(timestamps)):
+        times = timestamps.astype(np.int64).tolist()
+    else:
+        times = timestamps.tolist()
+    return [{x: t, y: v} for t, v in zip(times, values.tolist())]
@@ -0,0 +1,295 @@
+import threading
+import time
+import warnings
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.config.settings import settings
+from app.core.compact_collector import DEVICE_COLUMNS, RATE_COLUMNS
+from app.core.range_results import resample
+
+# Interface history is kept for the poller-computed rates only; counters are
+# only meaningful as deltas and those are what the rate columns already hold
+RECENT_DEVICE_COLUMNS = DEVICE_COLUMNS
+RECENT_INTERFACE_COLUMNS = RATE_COLUMNS
+
+# A row's last sample stands in for it this many walk intervals, so jitter
+# in the walk times does not open gaps (Prometheus' lookback serves the same end)
+LOOKBACK_SLACK = 1.5
+
+
+class RingTable:
+    """
+    Fixed-depth sample history per interned key. Row r holds its last `depth`
+    samples in values[r, column, slot] with a write head per row, so memory
+    is rows x columns x depth regardless of how long the poller runs.
+    """
+
+    def __init__(self, columns: Sequence[str], depth: int, capacity: int = 256):
+        self.columns = tuple(columns)
+        self.column_index = {name: i for i, name in enumerate(self.columns)}
+        self.depth = depth
+        self.values = np.full((capacity, len(self.columns), depth), np.nan, dtype=np.float32)
+        self.times = np.zeros((capacity, depth), dtype=np.float64)
+        self.head = np.zeros(capacity, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.keys: List[Optional[Hashable]] = [None] * capacity
+        self.rows: Dict[Hashable, int] = {}
+        self.free: List[int] = []
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.values.shape[0]
+
+    def _grow(self) -> None:
+        capacity = self.capacity * 2
+        values = np.full((capacity, len(self.columns), self.depth), np.nan, dtype=np.float32)
+        values[:self.size] = self.values[:self.size]
+        times = np.zeros((capacity, self.depth), dtype=np.float64)
+        times[:self.size] = self.times[:self.size]
+        self.values, self.times = values, times
+        self.head = np.concatenate([self.head, np.zeros(capacity - len(self.head), dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(capacity - len(self.count), dtype=np.int64)])
+        self.keys.extend([None] * (capacity - len(self.keys)))
+
+    def intern(self, key: Hashable) -> int:
+        row = self.rows.get(key)
+        if row is not None:
+            return row
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow()
+            row = self.size
+            self.size += 1
+        self.rows[key] = row
+        self.keys[row] = key
+        return row
+
+    def release(self, rows: Iterable[int]) -> None:
+        for row in rows:
+            key = self.keys[row]
+            if key is None:
+                continue
+            del self.rows[key]
+            self.keys[row] = None
+            self.values[row] = np.nan
+            self.times[row] = 0
+            self.head[row] = 0
+            self.count[row] = 0
+            self.free.append(row)
+
+    def append(self, rows: np.ndarray, times: np.ndarray, values: np.ndarray) -> None:
+        """Write one sample per row; values has one row per entry in rows"""
+        slots = self.head[rows]
+        self.values[rows, :, slots] = values
+        self.times[rows, slots] = times
+        self.head[rows] = (slots + 1) % self.depth
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.depth)
+
+    def window(self, rows: np.ndarray, column: str, since: float, until: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples of rows within [since, until], oldest first; slots outside the window are NaN"""
+        slots = (self.head[rows, None] + np.arange(self.depth)) % self.depth
+        times = self.times[rows[:, None], slots]
+        values = self.values[rows[:, None], self.column_index[column], slots].astype(np.float64)
+        inside = (times >= since) & (times <= until)
+        return np.where(inside, times, np.nan), np.where(inside, values, np.nan)
+
+    def oldest(self, rows: np.ndarray) -> np.ndarray:
+        """Time of the oldest retained sample per row, or -inf while the row has not wrapped yet"""
+        full = self.count[rows] == self.depth
+        return np.where(full, self.times[rows, self.head[rows]], -np.inf)
+
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.times.nbytes + self.head.nbytes + self.count.nbytes
+
+
+def last_sample_at(times: np.ndarray, values: np.ndarray, at: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per row of (rows, samples) windows, the time and value of the newest
+    valid sample at or before each of at; NaN where a row has none.
+    """
+    rows = len(times)
+    last_time = np.full((rows, len(at)), np.nan)
+    last_value = np.full((rows, len(at)), np.nan)
+    valid = ~np.isnan(times) & ~np.isnan(values)
+    if not valid.any() or not len(at):
+        return last_time, last_value
+    row_of = np.nonzero(valid)[0]
+    sample_times, sample_values = times[valid], values[valid]
+    # Fold the row into the key so one sorted array answers every row's lookups
+    base = min(sample_times.min(), at.min())
+    span = max(sample_times.max(), at.max()) - base + 1
+    order = np.lexsort((sample_times, row_of))
+    keys = row_of[order] * span + (sample_times[order] - base)
+    queries = np.arange(rows)[:, None] * span + (at[None, :] - base)
+    index = np.searchsorted(keys, queries, side="right") - 1
+    found = (index >= 0) & (row_of[order][np.maximum(index, 0)] == np.arange(rows)[:, None])
+    last_time[found] = sample_times[order][index[found]]
+    last_value[found] = sample_values[order][index[found]]
+    return last_time, last_value
+
+
+class RecentSamples:
+    """
+    In-process history of the last `depth` polls of every device and
+    interface, filled from the poll write stage. Dashboards asking for a
+    short window that the history still covers are answered from here with
+    array slicing instead of a Prometheus range query.
+    """
+
+    def __init__(self, depth: int = 60, walk_interval: Optional[float] = None):
+        self.depth = depth
+        # Longest interface walk interval; rows without two samples to measure their own get this
+        self.walk_interval = walk_interval or max(tier.interface_interval for tier in settings.polling_tiers.values())
+        self.devices = RingTable(RECENT_DEVICE_COLUMNS, max(depth, 1), 64)
+        self.interfaces = RingTable(RECENT_INTERFACE_COLUMNS, max(depth, 1), 1024)
+        self._host_rows: Dict[str, Dict[str, int]] = {}
+        self._last_sample: Dict[int, float] = {}
+        self.started_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.depth > 0
+
+    def record_device(self, host: str, timestamp: float, values: Sequence[float]) -> None:
+        """values in RECENT_DEVICE_COLUMNS order"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.started_at = self.started_at or timestamp
+            row = self.devices.intern(host)
+            self.devices.append(np.array([row]), np.array([timestamp]), np.asarray(values, dtype=np.float32)[None, :])
+
+    def record_interfaces(self, host: str, indices: Sequence[str], sample_times: np.ndarray, values: np.ndarray) -> None:
+        """
+        Record a host's current interface rows (values in RECENT_INTERFACE_COLUMNS
+        order). Rows whose sample time has not moved since the last call are
+        skipped, and interfaces no longer present are dropped.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            known = self._host_rows.setdefault(host, {})
+            current = {index: self.interfaces.intern((host, index)) for index in indices}
+            gone = [row for index, row in known.items() if index not in current]
+            self.interfaces.release(gone)
+            for row in gone:
+                self._last_sample.pop(row, None)
+            self._host_rows[host] = current
+
+            rows = np.fromiter(current.values(), dtype=np.int64, count=len(current))
+            fresh = np.array([self._last_sample.get(row) != t for row, t in zip(rows.tolist(), sample_times.tolist())], dtype=bool)
+            if not fresh.any():
+                return
+            self.started_at = self.started_at or float(sample_times[fresh].min())
+            self.interfaces.append(rows[fresh], sample_times[fresh], values[fresh])
+            for row, t in zip(rows[fresh].tolist(), sample_times[fresh].tolist()):
+                self._last_sample[row] = t
+
+    def remove_host(self, host: str) -> None:
+        with self._lock:
+            row = self.devices.rows.get(host)
+            if row is not None:
+                self.devices.release([row])
+            rows = list(self._host_rows.pop(host, {}).values())
+            self.interfaces.release(rows)
+            for row in rows:
+                self._last_sample.pop(row, None)
+
+    def covers(self, since: float) -> bool:
+        """True when no sample at or after `since` has been overwritten (or was never collected)"""
+        if not self.enabled or self.started_at is None or since < self.started_at:
+            return False
+        with self._lock:
+            for table in (self.devices, self.interfaces):
+                rows = np.fromiter(table.rows.values(), dtype=np.int64, count=len(table.rows))
+                if len(rows) and (table.oldest(rows) > since).any():
+                    return False
+        return True
+
+    def device_window(
+        self,
+        column: str,
+        since: float,
+        until: Optional[float] = None
+    ) -> List[Tuple[str, np.ndarray, np.ndarray]]:
+        """(host, times, values) per device with at least one valid sample in the window"""
+        until = until if until is not None else time.time()
+        with self._lock:
+            hosts = list(self.devices.rows)
+            rows = np.array([self.devices.rows[h] for h in hosts], dtype=np.int64)
+            if not len(rows):
+                return []
+            times, values = self.devices.window(rows, column, since, until)
+        series = []
+        for host, t, v in zip(hosts, times, values):
+            valid = ~np.isnan(t) & ~np.isnan(v)
+            if valid.any():
+                series.append((host, t[valid], v[valid]))
+        return series
+
+    @property
+    def lookback(self) -> float:
+        """How far before a query's start interface samples can still count"""
+        return self.walk_interval * LOOKBACK_SLACK
+
+    def interface_sum(self, column: str, start: float, end: float, step: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sum of an interface column across all interfaces on a step grid. Each
+        point t covers (t - step, t]; an interface contributes the mean of its
+        samples there, or else its last sample if that is at most
+        LOOKBACK_SLACK of its walk interval old. Interfaces walked less often
+        than the step so count at every point, not only where they have a
+        sample. Returns (timestamps, sums) for points with any data.
+        """
+        with self._lock:
+            rows = np.fromiter(self.interfaces.rows.values(), dtype=np.int64, count=len(self.interfaces.rows))
+            if not len(rows):
+                return np.zeros(0), np.zeros(0)
+            times, values = self.interfaces.window(rows, column, start - max(step, self.lookback), end)
+
+        points = int(np.floor((end - start) / step)) + 1
+        grid = start + step * np.arange(points)
+        filled = np.full((len(rows), points), np.nan)
+        timestamps, means = resample(times, values, start, end, step)
+        filled[:, np.rint((timestamps - start) / step).astype(np.int64)] = means
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # Rows with fewer than two samples
+            interval = np.nanmedian(np.diff(times, axis=1), axis=1)
+        interval = np.where(np.isnan(interval), self.walk_interval, interval)
+        last_time, last_value = last_sample_at(times, values, grid)
+        carry = np.isnan(filled) & (grid[None, :] - last_time <= interval[:, None] * LOOKBACK_SLACK)
+        filled[carry] = last_value[carry]
+
+        has_data = ~np.isnan(filled).all(axis=0)
+        return grid[has_data], np.nansum(filled[:, has_data], axis=0)
+
+    def snapshot(
+        self,
+        kind: str,
+        columns: Sequence[str],
+        since: float,
+        until: float
+    ) -> Tuple[List[Hashable], Dict[str, np.ndarray]]:
+        """Keys and per-column (rows, depth) windows of every device or interface row"""
+        table = self.devices if kind == "device" else self.interfaces
+        with self._lock:
+            keys = list(table.rows)
+            rows = np.array([table.rows[key] for key in keys], dtype=np.int64)
+            if not len(rows):
+                return [], {}
+            return keys, {column: table.window(rows, column, since, until)[1] for column in columns}
+
+    def nbytes(self) -> int:
+        return self.devices.nbytes() + self.interfaces.nbytes()
+
+
+recent_samples = RecentSamples(depth=settings.recent_samples)
+
+
+def get_recent_samples() -> RecentSamples:
+    return recent_samples
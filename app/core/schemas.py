@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import List
+from typing import List, Literal, Optional
 
 
 class DeviceInfo(BaseModel):
@@ -38,6 +38,8 @@ class InterfaceMetric(BaseModel):
     errors_out: float
     discards_in: float
     discards_out: float
+    bps_in: Optional[float] = None
+    bps_out: Optional[float] = None
 
 class PaginatedInterfaces(BaseModel):
     host: str
@@ -45,6 +47,23 @@ class PaginatedInterfaces(BaseModel):
     page: int
     per_page: int
     total: int
+    sort: str = "index"
+    order: str = "asc"
+
+class InterfaceRuleInfo(BaseModel):
+    scope: Literal["all", "vendor", "priority", "device"] = Field(default="all", description="What the rule applies to")
+    match: Optional[str] = Field(default=None, description="Vendor, priority or device IP matched by the scope")
+    action: Literal["include", "exclude"] = Field(..., description="Poll or skip matching interfaces")
+    name_pattern: Optional[str] = Field(default=None, description="Regex searched in the interface name")
+    if_types: Optional[str] = Field(default=None, description="Comma-separated ifType numbers, e.g. 6,24")
+    admin_status: Optional[int] = Field(default=None, ge=1, le=3, description="ifAdminStatus to match")
+    indices: Optional[str] = Field(default=None, description="Comma-separated ifIndex list")
+    position: int = Field(default=0, description="Order within the scope; later rules win")
+    model_config = ConfigDict(from_attributes=True)
+
+
+class InterfaceRuleRecord(InterfaceRuleInfo):
+    id: int
 
 
 # OID Mapping for easy maintenance
@@ -83,6 +102,8 @@ INTERFACE_OIDS = {
     "outbound_errors": "1.3.6.1.2.1.2.2.1.20",
     "inbound_discards": "1.3.6.1.2.1.2.2.1.13",
     "outbound_discards": "1.3.6.1.2.1.2.2.1.19",
+    "inbound_unicast_packets": "1.3.6.1.2.1.2.2.1.11",
+    "outbound_unicast_packets": "1.3.6.1.2.1.2.2.1.17",
 }
 
 VENDOR_OIDS = {
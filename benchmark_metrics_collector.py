@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Memory and CPU benchmark: per-label Gauge children vs the array-backed
+CompactMetricsCollector, at a given number of interface series.
+
+Both sides are serialized with the same counter and status families. The
+collector also exports poller-computed bps/pps rates, which the Gauge
+baseline has no equivalent for; their cost is reported on a separate line.
+
+Usage: python benchmark_metrics_collector.py --sizes 100000 500000 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+import numpy as np
+from prometheus_client import CollectorRegistry, Gauge, generate_latest
+from app.core.compact_collector import CompactMetricsCollector, INTERFACE_COLUMNS, INTERFACE_FAMILIES, RATE_COLUMNS
+
+INTERFACES_PER_HOST = 50
+# Counter series only; the gauge baseline has no poller-side rates
+SERIES_PER_INTERFACE = 8
+
+# Families both sides export, and the rate families only the collector has
+SHARED_FAMILIES = {name for name, _, series in INTERFACE_FAMILIES if series[0][0] not in RATE_COLUMNS}
+RATE_FAMILIES = {name for name, _, _ in INTERFACE_FAMILIES} - SHARED_FAMILIES
+
+
+def build_gauges(registry):
+    labels = ['host', 'interface_index', 'interface_name']
+    return {
+        "admin": Gauge('interface_admin_status', 'admin', labels, registry=registry),
+        "oper": Gauge('interface_operational_status', 'oper', labels, registry=registry),
+        "octets": Gauge('interface_octets_total', 'octets', labels + ['direction'], registry=registry),
+        "errors": Gauge('interface_errors_total', 'errors', labels + ['direction'], registry=registry),
+        "discards": Gauge('interface_discards_total', 'discards', labels + ['direction'], registry=registry),
+    }
+
+
+def fleet(series: int):
+    interfaces = max(series // SERIES_PER_INTERFACE, 1)
+    hosts = max(interfaces // INTERFACES_PER_HOST, 1)
+    indices = [str(i) for i in range(1, INTERFACES_PER_HOST + 1)]
+    names = [f"GigabitEthernet0/{i}" for i in indices]
+    return [f"10.{h // 65536}.{(h // 256) % 256}.{h % 256}" for h in range(hosts)], indices, names
+
+
+class Families:
+    """Registry view over some of a collector's families (restricted_registry needs describe())"""
+
+    def __init__(self, collector, names):
+        self.collector = collector
+        self.names = names
+
+    def collect(self):
+        return [family for family in self.collector.collect() if family.name in self.names]
+
+
+def gauge_cycle(gauges, hosts, indices, names, values):
+    # Mirrors the original poll_interfaces: eight .labels(...).set() calls per interface
+    for host in hosts:
+        for i, (index, name) in enumerate(zip(indices, names)):
+            row = values[i]
+            gauges["admin"].labels(host=host, interface_index=index, interface_name=name).set(row[0])
+            gauges["oper"].labels(host=host, interface_index=index, interface_name=name).set(row[1])
+            gauges["octets"].labels(host=host, interface_index=index, interface_name=name, direction="in").set(row[2])
+            gauges["octets"].labels(host=host, interface_index=index, interface_name=name, direction="out").set(row[3])
+            gauges["errors"].labels(host=host, interface_index=index, interface_name=name, direction="in").set(row[4])
+            gauges["errors"].labels(host=host, interface_index=index, interface_name=name, direction="out").set(row[5])
+            gauges["discards"].labels(host=host, interface_index=index, interface_name=name, direction="in").set(row[6])
+            gauges["discards"].labels(host=host, interface_index=index, interface_name=name, direction="out").set(row[7])
+
+
+def collector_cycle(collector, hosts, indices, names, values):
+    for host in hosts:
+        collector.update_interfaces(host, indices, names, values)
+
+
+def measure(label, setup, cycle, serialize, extra=None):
+    gc.collect()
+    tracemalloc.start()
+    state = setup()
+    cycle(state)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    cycle(state)
+    update = time.perf_counter() - started
+
+    started = time.perf_counter()
+    payload = serialize(state)
+    render = time.perf_counter() - started
+
+    print(f"  {label:<10} memory {current / 1_048_576:9.1f} MiB   update {update:7.2f}s   "
+          f"serialize {render:7.2f}s   payload {len(payload) / 1_048_576:7.1f} MiB")
+
+    if extra:
+        extra_label, extra_serialize = extra
+        started = time.perf_counter()
+        payload = extra_serialize(state)
+        render = time.perf_counter() - started
+        print(f"  {extra_label:<10} {'':<42}serialize {render:7.2f}s   payload {len(payload) / 1_048_576:7.1f} MiB")
+    del state
+    gc.collect()
+
+
+def run(series: int):
+    hosts, indices, names = fleet(series)
+    actual = len(hosts) * len(indices) * SERIES_PER_INTERFACE
+    values = np.random.default_rng(0).integers(0, 2**32, size=(len(indices), len(INTERFACE_COLUMNS))).astype(np.float64)
+    rows = values.tolist()
+    print(f"\n{actual:,} series ({len(hosts):,} hosts x {len(indices)} interfaces)")
+
+    def gauge_setup():
+        registry = CollectorRegistry()
+        return registry, build_gauges(registry)
+
+    measure(
+        "Gauge",
+        gauge_setup,
+        lambda state: gauge_cycle(state[1], hosts, indices, names, rows),
+        lambda state: generate_latest(state[0])
+    )
+
+    def collector_setup():
+        registry = CollectorRegistry()
+        collector = CompactMetricsCollector(capacity=len(hosts) * len(indices))
+        registry.register(collector)
+        return registry, collector
+
+    # The second cycle gives every interface a previous sample, so rates are set and exported
+    measure(
+        "Compact",
+        collector_setup,
+        lambda state: collector_cycle(state[1], hosts, indices, names, values),
+        lambda state: generate_latest(Families(state[1], SHARED_FAMILIES)),
+        ("+ rates", lambda state: generate_latest(Families(state[1], RATE_FAMILIES)))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 500_000, 1_000_000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,23 @@ import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from sqlalchemy.orm import Session
-from app.api.v1.endpoints import polling, devices, query, alert
+from app.api.v1.endpoints import polling, devices, query, alert, metrics, interface_rules
 from app.core import models
-from app.core.database import engine, get_db
+from app.core.database import engine, rollup_engine, get_db
 from services import snmp_service
 from app.config.settings import settings
 from services.snmp_service import get_snmp_client
+from services.polling_service import PollScheduler
+from services.metrics_publisher import metrics_publisher
+from services.device_leases import device_assignment
+from services.rollup_service import rollup_sink
+from services.state_snapshot import state_snapshotter
+from services.trap_receiver import trap_receiver
+from services.prometheus_http import prometheus_http
 from app.config.logging import logger
 
 models.Base.metadata.create_all(engine)
+models.RollupBase.metadata.create_all(rollup_engine)
 
 # async def run_discovery():
 #     """Run device discovery on startup"""
@@ -32,54 +40,68 @@ models.Base.metadata.create_all(engine)
 #     except Exception as e:
 #         print(f"Error during startup discovery: {str(e)}")
 
-# async def run_polling():
-#     """Run device polling every minute"""
-#     while True:
-#         try:
-#             logger.info("Application starting up...")
-            
-#             db_gen = get_db()
-#             db: Session = next(db_gen)
-            
-#             client = get_snmp_client()
+def build_poll_scheduler() -> PollScheduler:
+    client = get_snmp_client()
 
-#             from app.api.v1.endpoints.polling import poll_all_device
-#             await poll_all_device(db, client)
-            
-#             logger.info("Running scheduled device polling...")
-            
-#             db.close()
-            
-#         except Exception as e:
-#             logger.error(f"Error during startup discovery: {str(e)}")
-        
-#         await asyncio.sleep(settings.polling_interval)
+    async def run_poll(plan):
+        await polling.poll_host(plan, client)
+
+    scheduler = PollScheduler(poll_fn=run_poll, push_fn=metrics_publisher.request_push, owns=device_assignment.owns)
+    device_assignment.on_change(scheduler.request_refresh)
+    trap_receiver.set_repoll(scheduler.poll_now)
+    scheduler.expect_hosts(state_snapshotter.restored_hosts)
+    return scheduler
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     logger.info("Application starting up...")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Application starting up...")
     
-#     # # Run discovery on startup
-#     # await run_discovery()
+    # # Run discovery on startup
+    # await run_discovery()
     
-#     # Start background polling task
-#     logger.info("Starting background polling task...")
-#     polling_task = asyncio.create_task(run_polling())
+    await prometheus_http.start()
+    # Ownership must be known before restoring, so only this worker's devices come back
+    await device_assignment.start()
+    if settings.state_snapshot_enabled:
+        try:
+            await asyncio.to_thread(state_snapshotter.load)
+        except Exception as e:
+            logger.error(f"Failed to restore poll state: {str(e)}")
+        await state_snapshotter.start()
+    if settings.push_enabled:
+        await metrics_publisher.start()
+    elif settings.sharding_enabled:
+        logger.warning("SHARDING_ENABLED without PUSH_ENABLED: each /metrics scrape returns one worker's devices only; enable push")
+    await polling.poll_pipeline.start()
+    if settings.rollup_enabled:
+        await rollup_sink.start()
+    app.state.poll_scheduler = None
+    if settings.scheduler_enabled:
+        logger.info("Starting background polling scheduler...")
+        app.state.poll_scheduler = build_poll_scheduler()
+        await app.state.poll_scheduler.start()
+    if settings.trap_enabled:
+        if not app.state.poll_scheduler:
+            logger.warning("TRAP_ENABLED without SCHEDULER_ENABLED: traps update status but trigger no re-polls")
+        await trap_receiver.start()
     
-#     yield
+    yield
     
-#     logger.info("Application shutting down...")
-#     # Cancel background task
-#     polling_task.cancel()
-#     try:
-#         await polling_task
-#     except asyncio.CancelledError:
-#         logger.error("Background polling task cancelled")
+    logger.info("Application shutting down...")
+    await trap_receiver.stop()
+    if app.state.poll_scheduler:
+        await app.state.poll_scheduler.stop()
+    await polling.poll_pipeline.stop()
+    await state_snapshotter.stop()
+    await rollup_sink.stop()
+    await device_assignment.stop()
+    await metrics_publisher.stop()
+    await prometheus_http.stop()
 
 app = FastAPI(
     title="SNMP Device Monitor",
     description="SNMP device discovery and monitoring API",
-#    lifespan=lifespan
+    lifespan=lifespan
 )
 from app.api.middleware import add_middleware_to_app
 add_middleware_to_app(app)
@@ -88,3 +110,5 @@ app.include_router(devices.router)
 app.include_router(polling.router)
 app.include_router(query.router)
 app.include_router(alert.router)
+app.include_router(metrics.router)
+app.include_router(interface_rules.router)
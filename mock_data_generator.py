@@ -135,6 +135,13 @@ class MockDataGenerator:
             ['host', 'interface_index', 'interface_name', 'direction'],
             registry=self.registry
         )
+        
+        self.interface_bits_per_second = Gauge(
+            'interface_bits_per_second',
+            'Interface traffic rate computed by the poller',
+            ['host', 'interface_index', 'interface_name', 'direction'],
+            registry=self.registry
+        )
 
     def init_states(self):
         """Initialize realistic state tracking"""
@@ -323,6 +330,14 @@ class MockDataGenerator:
                     self.interface_discards.labels(
                         host=host, interface_index=idx, interface_name=name, direction="out"
                     ).set(state["discards_out"])
+                    
+                    self.interface_bits_per_second.labels(
+                        host=host, interface_index=idx, interface_name=name, direction="in"
+                    ).set(base_rate_in)
+                    
+                    self.interface_bits_per_second.labels(
+                        host=host, interface_index=idx, interface_name=name, direction="out"
+                    ).set(base_rate_out)
                 
                 state["last_update"] = current_time
 
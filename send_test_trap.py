@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Send a standard SNMPv2c trap or inform to the poller's trap receiver, to
+exercise link and restart handling without touching a real device.
+
+Usage: python send_test_trap.py linkDown --if-index 3
+       python send_test_trap.py coldStart --agent 192.168.1.10 --inform
+"""
+
+import argparse
+import asyncio
+from pysnmp.hlapi.v3arch.asyncio import (
+    CommunityData,
+    ContextData,
+    NotificationType,
+    ObjectIdentity,
+    SnmpEngine,
+    UdpTransportTarget,
+    send_notification,
+)
+from pysnmp.proto.rfc1902 import Integer, IpAddress
+from app.config.settings import settings
+from services.trap_receiver import IF_INDEX_PREFIX, IF_OPER_STATUS_PREFIX, SNMP_TRAP_ADDRESS, STANDARD_TRAPS
+
+TRAP_OIDS = {name: oid for oid, name in STANDARD_TRAPS.items()}
+
+
+async def send(args) -> None:
+    varbinds = {}
+    if args.trap in ("linkUp", "linkDown"):
+        varbinds[IF_INDEX_PREFIX + str(args.if_index)] = Integer(args.if_index)
+        varbinds[IF_OPER_STATUS_PREFIX + str(args.if_index)] = Integer(1 if args.trap == "linkUp" else 2)
+    if args.agent:
+        # Report another device as the originator, as a trap forwarder would
+        varbinds[SNMP_TRAP_ADDRESS] = IpAddress(args.agent)
+
+    engine = SnmpEngine()
+    error_indication, error_status, _, _ = await send_notification(
+        engine,
+        CommunityData(args.community, mpModel=1),
+        await UdpTransportTarget.create((args.host, args.port), timeout=2, retries=1),
+        ContextData(),
+        "inform" if args.inform else "trap",
+        NotificationType(ObjectIdentity(TRAP_OIDS[args.trap])).add_varbinds(*varbinds.items()),
+    )
+    engine.close_dispatcher()
+    if error_indication or error_status:
+        print(f"Failed: {error_indication or error_status.prettyPrint()}")
+    else:
+        print(f"Sent {args.trap} {'inform' if args.inform else 'trap'} to {args.host}:{args.port}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trap", choices=sorted(TRAP_OIDS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=settings.trap_port)
+    parser.add_argument("--community", default=settings.snmp_community)
+    parser.add_argument("--if-index", type=int, default=1)
+    parser.add_argument("--agent", help="Originating device address (snmpTrapAddress)")
+    parser.add_argument("--inform", action="store_true", help="Send an acknowledged inform instead of a trap")
+    asyncio.run(send(parser.parse_args()))
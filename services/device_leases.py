@@ -0,0 +1,214 @@
+import asyncio
+import math
+import time
+from typing import Callable, Iterable, List, Optional, Set, Union
+from sqlalchemy.exc import IntegrityError
+from app.config.settings import settings
+from app.config.logging import logger
+from app.core import database, models
+from services.shard_membership import ShardMembership, shard_membership
+
+
+class LeaseAssignment:
+    """
+    Assigns devices to poller nodes through expiring rows in device_leases,
+    so several app instances sharing one database split the estate without a
+    coordinator.
+
+    On every heartbeat a node renews the leases it holds, releases any above
+    its fair share (devices / live nodes, from the poller_workers table) and
+    claims up to lease_batch_size unowned or expired leases until it reaches
+    that share. Claims are compare-and-swap updates, so two nodes never hold
+    the same device; the leases of a node that dies expire after lease_ttl
+    and are taken over by the others. A node whose renewals fail stops
+    polling once its own leases would have expired.
+    """
+
+    def __init__(
+        self,
+        membership: ShardMembership = shard_membership,
+        ttl: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        session_factory: Callable = database.SessionLocal
+    ):
+        self.membership = membership
+        self.ttl = ttl or settings.lease_ttl
+        self.batch_size = batch_size or settings.lease_batch_size
+        self.session_factory = session_factory
+
+        self.owned: Set[str] = set()
+        self.valid_until = 0.0
+        self.target = 0
+        self.claimed = 0
+        self.released = 0
+        self._listeners: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.membership.enabled
+
+    @property
+    def worker_id(self) -> str:
+        return self.membership.worker_id
+
+    def owns(self, ip_address: str) -> bool:
+        if not self.enabled:
+            return True
+        return ip_address in self.owned and time.time() < self.valid_until
+
+    def on_change(self, listener: Callable[[], None]) -> None:
+        """Call listener whenever the set of leased devices changes"""
+        self._listeners.append(listener)
+
+    def reconcile(self, now: Optional[float] = None) -> Set[str]:
+        """Renew, rebalance and claim leases; returns the devices now held. Blocking DB I/O"""
+        now = now if now is not None else time.time()
+        Lease = models.DeviceLease
+        db = self.session_factory()
+        try:
+            db.query(Lease).filter(Lease.owner == self.worker_id).update(
+                {Lease.expires_at: now + self.ttl}, synchronize_session=False
+            )
+            db.query(Lease).filter(~Lease.ip_address.in_(db.query(models.Device.ip_address))).delete(
+                synchronize_session=False
+            )
+            db.commit()
+
+            owned = {ip for (ip,) in db.query(Lease.ip_address).filter(Lease.owner == self.worker_id)}
+            devices = db.query(models.Device.ip_address).count()
+            self.target = math.ceil(devices / max(len(self.membership.ring.members), 1))
+
+            if len(owned) > self.target:
+                # A node joined: hand the excess back for it to claim
+                excess = sorted(owned)[self.target:]
+                db.query(Lease).filter(Lease.owner == self.worker_id, Lease.ip_address.in_(excess)).update(
+                    {Lease.owner: None, Lease.expires_at: 0.0}, synchronize_session=False
+                )
+                db.commit()
+                owned.difference_update(excess)
+                self.released += len(excess)
+            elif len(owned) < self.target:
+                owned |= self._claim(db, min(self.target - len(owned), self.batch_size), now)
+
+            self.valid_until = now + self.ttl
+            return owned
+        finally:
+            db.close()
+
+    def _claim(self, db, wanted: int, now: float) -> Set[str]:
+        Lease = models.DeviceLease
+        claimed = set()
+
+        stale = (
+            db.query(Lease.ip_address, Lease.owner, Lease.expires_at)
+            .filter((Lease.owner.is_(None)) | (Lease.expires_at < now))
+            .limit(wanted)
+            .all()
+        )
+        for ip_address, owner, expires_at in stale:
+            # Only succeeds if nobody claimed or renewed the lease since it was read
+            won = db.query(Lease).filter(
+                Lease.ip_address == ip_address,
+                Lease.owner.is_(None) if owner is None else Lease.owner == owner,
+                Lease.expires_at == expires_at
+            ).update({Lease.owner: self.worker_id, Lease.expires_at: now + self.ttl}, synchronize_session=False)
+            if won:
+                claimed.add(ip_address)
+        db.commit()
+
+        if len(claimed) < wanted:
+            unleased = (
+                db.query(models.Device.ip_address)
+                .filter(~models.Device.ip_address.in_(db.query(Lease.ip_address)))
+                .limit(wanted - len(claimed))
+                .all()
+            )
+            try:
+                db.add_all(
+                    models.DeviceLease(ip_address=ip, owner=self.worker_id, expires_at=now + self.ttl)
+                    for (ip,) in unleased
+                )
+                db.commit()
+                claimed.update(ip for (ip,) in unleased)
+            except IntegrityError:
+                # Another node inserted some of them first; retry on the next heartbeat
+                db.rollback()
+
+        self.claimed += len(claimed)
+        return claimed
+
+    def release_all(self) -> None:
+        Lease = models.DeviceLease
+        db = self.session_factory()
+        try:
+            db.query(Lease).filter(Lease.owner == self.worker_id).update(
+                {Lease.owner: None, Lease.expires_at: 0.0}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def apply_leases(self, owned: Iterable[str]) -> bool:
+        owned = set(owned)
+        if owned == self.owned:
+            return False
+        gained, lost = len(owned - self.owned), len(self.owned - owned)
+        self.owned = owned
+        logger.info(f"Lease set changed (+{gained}/-{lost}), now polling {len(owned)} devices")
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Lease change listener failed: {str(e)}")
+        return True
+
+    async def start(self) -> None:
+        if not self.enabled or self._task:
+            return
+        await self.membership.start()
+        self.apply_leases(await asyncio.to_thread(self.reconcile))
+        self._task = asyncio.create_task(self._lease_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            # Let the other nodes pick the devices up without waiting for expiry
+            try:
+                await asyncio.to_thread(self.release_all)
+            except Exception as e:
+                logger.error(f"Failed to release device leases: {str(e)}")
+        await self.membership.stop()
+
+    async def _lease_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.membership.heartbeat_interval)
+            try:
+                self.apply_leases(await asyncio.to_thread(self.reconcile))
+            except Exception as e:
+                logger.error(f"Lease renewal failed: {str(e)}")
+
+    def report(self, devices: Iterable[str] = ()) -> dict:
+        return {
+            "enabled": self.enabled,
+            "mode": "lease",
+            "worker_id": self.worker_id,
+            "workers": self.membership.ring.members,
+            "leased": len(self.owned),
+            "target": self.target,
+            "valid_until": self.valid_until,
+            "claimed": self.claimed,
+            "released": self.released,
+        }
+
+
+DeviceAssignment = Union[ShardMembership, LeaseAssignment]
+
+# Decides which devices this process polls; owns every device when sharding is off
+device_assignment: DeviceAssignment = LeaseAssignment() if settings.sharding_mode == "lease" else shard_membership
+
+
+def get_device_assignment() -> DeviceAssignment:
+    return device_assignment
@@ -0,0 +1,252 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+from app.config.settings import settings
+from app.config.logging import logger
+from app.core import database, models
+from app.core.compact_collector import INTERFACE_COLUMNS, RATE_COLUMNS, SERIES_PER_INTERFACE
+from app.core.prometheus_model import poller_interface_rows, poller_interface_selection_savings
+
+# ifTable columns walked to decide which rows to poll
+NAME_COLUMN, TYPE_COLUMN, ADMIN_COLUMN = "2", "3", "7"
+STATIC_INTERFACE_OIDS = tuple(f"1.3.6.1.2.1.2.2.1.{column}" for column in (NAME_COLUMN, TYPE_COLUMN, ADMIN_COLUMN))
+
+# Broader scopes first, so a device rule overrides a vendor rule overrides a global one
+SCOPE_ORDER = {"all": 0, "vendor": 1, "priority": 2, "device": 3}
+
+# Column store bytes per interface row: counters, rates and sample time as float64
+ROW_BYTES = (len(INTERFACE_COLUMNS) + len(RATE_COLUMNS) + 1) * 8
+
+
+def parse_numbers(text: Optional[str]) -> Optional[FrozenSet[int]]:
+    if not text:
+        return None
+    return frozenset(int(part) for part in text.replace(" ", "").split(",") if part)
+
+
+def to_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)  # type: ignore
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    include: bool
+    pattern: Optional[re.Pattern]
+    if_types: Optional[FrozenSet[int]]
+    admin_status: Optional[int]
+    indices: Optional[FrozenSet[int]]
+
+    def matches(self, index: Optional[int], name: str, if_type: Optional[int], admin_status: Optional[int]) -> bool:
+        """Every criterion the rule sets must hold; a rule with none matches everything"""
+        return (
+            (self.pattern is None or self.pattern.search(name) is not None)
+            and (self.if_types is None or if_type in self.if_types)
+            and (self.admin_status is None or admin_status == self.admin_status)
+            and (self.indices is None or index in self.indices)
+        )
+
+
+def compile_rule(rule) -> CompiledRule:
+    """Compile an InterfaceRule row or schema; raises ValueError or re.error on bad input"""
+    return CompiledRule(
+        include=rule.action == "include",
+        pattern=re.compile(rule.name_pattern) if rule.name_pattern else None,
+        if_types=parse_numbers(rule.if_types),
+        admin_status=rule.admin_status,
+        indices=parse_numbers(rule.indices),
+    )
+
+
+@dataclass(frozen=True)
+class InterfaceRuleSet:
+    """
+    The rules that apply to one device, in evaluation order. The last
+    matching rule decides; an interface no rule matches is polled unless the
+    set has include rules, in which case only included interfaces are.
+    """
+    rules: Tuple[CompiledRule, ...]
+
+    @property
+    def default(self) -> bool:
+        return not any(rule.include for rule in self.rules)
+
+    def selects(self, index: Optional[int], name: str, if_type: Optional[int], admin_status: Optional[int]) -> bool:
+        selected = self.default
+        for rule in self.rules:
+            if rule.matches(index, name, if_type, admin_status):
+                selected = rule.include
+        return selected
+
+
+@dataclass
+class InterfaceSelection:
+    fetched_at: float
+    names: Dict[str, str]  # Selected ifIndex -> ifDescr
+    total: int
+
+
+class InterfaceSelector:
+    """
+    Compiles the interface_rules table into per-device rule sets and keeps
+    each ruled device's selected ifIndex list. Devices with rules walk only
+    the name/type/admin columns, every interface_static_refresh seconds,
+    and GET the counters of the selected rows; devices without rules keep
+    the plain walk. Rules are re-read on the device refresh interval or
+    right after they are edited.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = database.SessionLocal,
+        static_refresh: Optional[int] = None,
+        reload_interval: Optional[int] = None
+    ):
+        self.session_factory = session_factory
+        self.static_refresh = static_refresh or settings.interface_static_refresh
+        self.reload_interval = reload_interval or settings.device_refresh_interval
+        self._rules: List[Tuple[str, Optional[str], CompiledRule]] = []
+        self._loaded_at: Optional[float] = None
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._rule_sets: Dict[Tuple[str, str, int], Optional[InterfaceRuleSet]] = {}
+        self._selections: Dict[str, InterfaceSelection] = {}
+
+    def load(self) -> int:
+        """Read and compile every rule; blocking DB I/O"""
+        Rule = models.InterfaceRule
+        db = self.session_factory()
+        try:
+            rows = db.query(Rule).all()
+        finally:
+            db.close()
+        rows.sort(key=lambda row: (SCOPE_ORDER.get(row.scope, 0), row.position, row.id))
+        compiled = []
+        for row in rows:
+            try:
+                compiled.append((row.scope, (row.match or "").lower(), compile_rule(row)))
+            except (ValueError, re.error) as e:
+                logger.warning(f"Skipping interface rule {row.id}: {str(e)}")
+        self._rules = compiled
+        self._rule_sets = {}
+        self._loaded_at = time.monotonic()
+        return len(compiled)
+
+    def _fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_interval
+
+    async def refresh(self) -> None:
+        """
+        Reload the rules once reload_interval has passed. Called on the poll
+        path, so it never raises: one poll reloads while the others wait, and
+        a failed read keeps the previous rules until the next interval.
+        """
+        if self._fresh():
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._fresh():
+                return
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception as e:
+                self._loaded_at = time.monotonic()
+                logger.error(f"Failed to load interface rules, keeping the previous {len(self._rules)}: {str(e)}")
+
+    def invalidate(self) -> None:
+        """Drop compiled rules and selections so the next poll re-reads and re-walks"""
+        self._loaded_at = None
+        self._rule_sets = {}
+        self._selections = {}
+        self._publish()
+
+    def rules_for(self, ip_address: str, vendor: Optional[str], priority: Optional[int]) -> Optional[InterfaceRuleSet]:
+        """The device's rule set, or None when no rule applies and every interface is polled"""
+        key = (ip_address, (vendor or "").lower(), priority)
+        if key in self._rule_sets:
+            return self._rule_sets[key]
+        scopes = {"all": None, "vendor": key[1], "priority": str(priority), "device": ip_address}
+        rules = tuple(
+            rule for scope, match, rule in self._rules
+            if scope in scopes and (scope == "all" or match == scopes[scope])
+        )
+        rule_set = InterfaceRuleSet(rules) if rules else None
+        self._rule_sets[key] = rule_set
+        return rule_set
+
+    def cached(self, ip_address: str) -> Optional[InterfaceSelection]:
+        selection = self._selections.get(ip_address)
+        if selection is None or time.monotonic() - selection.fetched_at >= self.static_refresh:
+            return None
+        return selection
+
+    def select(self, ip_address: str, rule_set: InterfaceRuleSet, walk: List[dict]) -> InterfaceSelection:
+        """Apply the rule set to a walk of STATIC_INTERFACE_OIDS and remember the chosen rows"""
+        rows: Dict[str, Dict[str, str]] = {}
+        for item in walk:
+            rows.setdefault(item["index"], {})[item["base_oid"].rsplit(".", 1)[-1]] = item["value"]
+
+        names = {
+            index: columns.get(NAME_COLUMN, "n/a")
+            for index, columns in rows.items()
+            if rule_set.selects(
+                to_int(index),
+                columns.get(NAME_COLUMN, ""),
+                to_int(columns.get(TYPE_COLUMN)),
+                to_int(columns.get(ADMIN_COLUMN))
+            )
+        }
+        selection = InterfaceSelection(time.monotonic(), names, len(rows))
+        self._selections[ip_address] = selection
+        self._publish()
+        return selection
+
+    def forget(self, ip_address: str) -> None:
+        if self._selections.pop(ip_address, None) is not None:
+            self._publish()
+
+    def _totals(self) -> Tuple[int, int]:
+        polled = sum(len(selection.names) for selection in self._selections.values())
+        total = sum(selection.total for selection in self._selections.values())
+        return polled, total - polled
+
+    def savings(self) -> Dict[str, int]:
+        """Per poll round: series, column-store bytes and response varbinds the rules avoid"""
+        _, excluded = self._totals()
+        return {
+            "series": excluded * SERIES_PER_INTERFACE,
+            "store_bytes": excluded * ROW_BYTES,
+            "varbinds": excluded * len(INTERFACE_COLUMNS),
+        }
+
+    def _publish(self) -> None:
+        polled, excluded = self._totals()
+        poller_interface_rows.labels(state="polled").set(polled)
+        poller_interface_rows.labels(state="excluded").set(excluded)
+        for unit, value in self.savings().items():
+            poller_interface_selection_savings.labels(unit=unit).set(value)
+
+    def report(self) -> dict:
+        polled, excluded = self._totals()
+        return {
+            "rules": len(self._rules),
+            "devices_with_rules": len(self._selections),
+            "interfaces_polled": polled,
+            "interfaces_excluded": excluded,
+            "avoided": self.savings(),
+            "devices": {
+                ip: {"polled": len(selection.names), "total": selection.total}
+                for ip, selection in sorted(self._selections.items())
+            },
+        }
+
+
+interface_selector = InterfaceSelector()
+
+
+def get_interface_selector() -> InterfaceSelector:
+    return interface_selector
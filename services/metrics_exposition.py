@@ -0,0 +1,86 @@
+import asyncio
+import gzip
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from prometheus_client import generate_latest
+from prometheus_client.exposition import CONTENT_TYPE_LATEST
+from prometheus_client.openmetrics.exposition import (
+    CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE,
+    generate_latest as generate_openmetrics,
+)
+from prometheus_client.registry import CollectorRegistry
+from app.core.prometheus_model import registry, poller_registry, registry_generation, metrics_exposition_renders
+
+TEXT_FORMAT = "text"
+OPENMETRICS_FORMAT = "openmetrics"
+OPENMETRICS_EOF = b"# EOF\n"
+
+
+@dataclass
+class _CachedBody:
+    generation: int
+    body: bytes
+    gzipped: Optional[bytes] = None
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    if accept and "application/openmetrics-text" in accept:
+        return OPENMETRICS_FORMAT
+    return TEXT_FORMAT
+
+
+class ExpositionCache:
+    """
+    Serves the serialized registries for scrapes. The device and interface
+    series are rebuilt in a worker thread only when polling has written new
+    samples since the last render; concurrent scrapes wait on the same
+    rebuild instead of starting their own. The poller's own metrics are
+    small and move without polls (counters, histograms), so they are
+    serialized fresh on every scrape and appended.
+    """
+
+    def __init__(self, source: CollectorRegistry = registry, live: CollectorRegistry = poller_registry):
+        self.source = source
+        self.live = live
+        self._cache: Dict[str, _CachedBody] = {}
+        self._locks = {TEXT_FORMAT: asyncio.Lock(), OPENMETRICS_FORMAT: asyncio.Lock()}
+
+    @staticmethod
+    def _serialize(source: CollectorRegistry, fmt: str) -> bytes:
+        if fmt == OPENMETRICS_FORMAT:
+            return generate_openmetrics(source)
+        return generate_latest(source)
+
+    async def render(self, fmt: str = TEXT_FORMAT, compress: bool = False) -> Tuple[bytes, str]:
+        content_type = OPENMETRICS_CONTENT_TYPE if fmt == OPENMETRICS_FORMAT else CONTENT_TYPE_LATEST
+
+        async with self._locks[fmt]:
+            generation = registry_generation()
+            cached = self._cache.get(fmt)
+            if cached is None or cached.generation != generation:
+                body = await asyncio.to_thread(self._serialize, self.source, fmt)
+                if fmt == OPENMETRICS_FORMAT and body.endswith(OPENMETRICS_EOF):
+                    # The live part that follows carries the one EOF marker
+                    body = body[:-len(OPENMETRICS_EOF)]
+                metrics_exposition_renders.labels(format=fmt).inc()
+                cached = _CachedBody(generation=generation, body=body)
+                self._cache[fmt] = cached
+            if compress and cached.gzipped is None:
+                cached.gzipped = await asyncio.to_thread(gzip.compress, cached.body, 6)
+            cached_body = cached.gzipped if compress else cached.body
+
+        live = self._serialize(self.live, fmt)
+        if not compress:
+            return cached_body + live, content_type
+        # Concatenated gzip members decode as one stream (RFC 1952), so the cached part stays compressed
+        return cached_body + gzip.compress(live, 6), content_type  # type: ignore
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+
+
+exposition_cache = ExpositionCache()
+
+
+def get_exposition_cache() -> ExpositionCache:
+    return exposition_cache
@@ -0,0 +1,264 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import time
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import quote
+import httpx
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.exposition import CONTENT_TYPE_LATEST
+from app.config.settings import settings
+from app.config.logging import logger
+from app.core.compact_collector import CompactMetricsCollector
+from app.core.prometheus_model import (
+    HostView,
+    metrics_store,
+    poller_registry,
+    poller_push_groups,
+    poller_push_total,
+    poller_push_coalesced,
+    poller_push_duration,
+    poller_push_bytes,
+    stage_clock,
+)
+from services.shard_membership import shard_membership
+
+
+def build_push_url(gateway: str, job: str, grouping_key: Dict[str, str]) -> str:
+    if not gateway.startswith(("http://", "https://")):
+        gateway = f"http://{gateway}"
+
+    def encode(name: str, value: str) -> str:
+        # Values containing '/' must use the base64 form of the Pushgateway path
+        if "/" in value or not value:
+            encoded = base64.urlsafe_b64encode(value.encode()).decode()
+            return f"{name}@base64/{encoded or '='}"
+        return f"{name}/{quote(value, safe='')}"
+
+    path = encode("job", job)
+    for name, value in sorted(grouping_key.items()):
+        path += "/" + encode(name, str(value))
+    return f"{gateway.rstrip('/')}/metrics/{path}"
+
+
+def serialize_registry(source) -> bytes:
+    """Serialize and gzip a registry; meant to run in a worker thread"""
+    return gzip.compress(generate_latest(source), compresslevel=6)
+
+
+def digest(payload: bytes) -> bytes:
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class PushgatewayPublisher:
+    """
+    Pushes poller metrics to the Pushgateway from a background task.
+
+    Device and interface series go under one grouping key per device
+    ({'instance': <host>}) with pushadd (POST) semantics. Each round only
+    serializes hosts the store reports as written since the last round, skips
+    those whose payload digest is unchanged, and deletes the groups of removed
+    devices. Every family of a host is sent complete, so a POST still replaces
+    evicted interfaces. Self-monitoring metrics are PUT under
+    {'instance': 'snmp_poller'}; an ephemeral publisher (one per sharded
+    worker process) deletes that group again when it stops.
+
+    Requests made while a round is pending or in flight are coalesced,
+    serialization runs off the event loop and HTTP connections are pooled.
+    """
+
+    def __init__(
+        self,
+        store: CompactMetricsCollector = metrics_store,
+        self_registry: CollectorRegistry = poller_registry,
+        gateway: Optional[str] = None,
+        job: str = "snmp_polling",
+        instance: str = "snmp_poller",
+        retries: Optional[int] = None,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        timeout: Optional[float] = None,
+        concurrency: int = 8,
+        ephemeral: bool = False
+    ):
+        self.store = store
+        self.self_registry = self_registry
+        self.gateway = gateway or settings.pushgateway_url
+        self.job = job
+        self.instance = instance
+        self.url = build_push_url(self.gateway, job, {"instance": instance})
+        self.retries = settings.push_retries if retries is None else retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout or settings.push_timeout
+        self.concurrency = concurrency
+        self.ephemeral = ephemeral
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pending = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._digests: Dict[str, bytes] = {}
+        self.last_success: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_round: Dict[str, int] = {}
+
+    def group_url(self, host: str) -> str:
+        return build_push_url(self.gateway, self.job, {"instance": host})
+
+    async def start(self) -> None:
+        if self._task:
+            return
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        )
+        # First round after a restart pushes every known host
+        self.store.mark_dirty(self.store.hosts())
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Pushgateway publisher started for {self.url}")
+
+    async def stop(self, flush: bool = True) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if flush and self._pending.is_set() and self._client:
+            self._pending.clear()
+            await self._publish()
+        if self.ephemeral and self._client:
+            await self._send_with_retry("DELETE", self.url)
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def request_push(self) -> None:
+        """Ask for a publish round without waiting for it"""
+        if self._task is None:
+            return
+        if self._pending.is_set():
+            poller_push_coalesced.inc()
+            return
+        self._pending.set()
+
+    async def push_now(self) -> bool:
+        if self._client is None:
+            raise RuntimeError("Publisher is not started")
+        return await self._publish()
+
+    async def _run(self) -> None:
+        while True:
+            await self._pending.wait()
+            self._pending.clear()
+            try:
+                await self._publish()
+            except Exception as e:
+                logger.error(f"Publish round failed: {str(e)}")
+
+    def _serialize_changed(self, hosts: Set[str]) -> Tuple[Dict[str, Tuple[bytes, bytes]], bytes]:
+        """Runs in a worker thread: per-host payloads whose content changed, plus the self-monitoring payload"""
+        changed = {}
+        for host in hosts:
+            body = generate_latest(HostView(self.store, [host]))
+            body_digest = digest(body)
+            if self._digests.get(host) != body_digest:
+                changed[host] = (body_digest, gzip.compress(body, compresslevel=6))
+        return changed, serialize_registry(self.self_registry)
+
+    async def _publish(self) -> bool:
+        started = time.monotonic()
+        dirty, removed = self.store.drain_changes()
+        changed, self_payload = await asyncio.to_thread(self._serialize_changed, dirty)
+        poller_push_bytes.labels(encoding="gzip").set(
+            len(self_payload) + sum(len(payload) for _, payload in changed.values())
+        )
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(method: str, url: str, payload: Optional[bytes] = None) -> bool:
+            async with semaphore:
+                return await self._send_with_retry(method, url, payload)
+
+        hosts = list(changed)
+        results = await asyncio.gather(
+            send("PUT", self.url, self_payload),
+            *[send("POST", self.group_url(host), changed[host][1]) for host in hosts],
+            *[send("DELETE", self.group_url(host)) for host in removed],
+        )
+        self_ok, push_results, delete_results = results[0], results[1:len(hosts) + 1], results[len(hosts) + 1:]
+
+        failed_pushes = []
+        for host, ok in zip(hosts, push_results):
+            if ok:
+                self._digests[host] = changed[host][0]
+            else:
+                failed_pushes.append(host)
+        failed_deletes = [host for host, ok in zip(removed, delete_results) if not ok]
+        for host, ok in zip(removed, delete_results):
+            if ok:
+                self._digests.pop(host, None)
+
+        # Failed groups are retried on the next round
+        self.store.mark_dirty(failed_pushes)
+        self.store.mark_removed(failed_deletes)
+
+        self.last_round = {
+            "pushed": len(hosts) - len(failed_pushes),
+            "unchanged": len(dirty) - len(hosts),
+            "deleted": len(removed) - len(failed_deletes),
+            "failed": len(failed_pushes) + len(failed_deletes),
+        }
+        for result, count in self.last_round.items():
+            if count:
+                poller_push_groups.labels(result=result).inc(count)
+        duration = time.monotonic() - started
+        poller_push_duration.set(round(duration, 3))
+        stage_clock.observe("push", duration)
+
+        ok = self_ok and not failed_pushes and not failed_deletes
+        if ok:
+            self.last_success = time.time()
+        return ok
+
+    async def _send_with_retry(self, method: str, url: str, payload: Optional[bytes] = None) -> bool:
+        headers = {"Content-Type": CONTENT_TYPE_LATEST, "Content-Encoding": "gzip"} if payload is not None else {}
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self._client.request(method, url, content=payload, headers=headers)  # type: ignore
+                response.raise_for_status()
+                poller_push_total.labels(result="success").inc()
+                self.last_error = None
+                return True
+            except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                self.last_error = str(e)
+                if attempt == self.retries:
+                    break
+                poller_push_total.labels(result="retry").inc()
+                await asyncio.sleep(min(self.backoff * 2 ** attempt, self.max_backoff))
+
+        poller_push_total.labels(result="failure").inc()
+        logger.error(f"{method} {url} failed after {self.retries + 1} attempts: {self.last_error}")
+        return False
+
+    def report(self) -> dict:
+        return {
+            "url": self.url,
+            "running": self._task is not None,
+            "pending": self._pending.is_set(),
+            "groups": len(self._digests),
+            "last_round": self.last_round,
+            "last_success": self.last_success,
+            "last_error": self.last_error,
+        }
+
+
+# Sharded workers each publish their self-monitoring metrics under their own instance
+metrics_publisher = (
+    PushgatewayPublisher(instance=f"snmp_poller-{shard_membership.worker_id}", ephemeral=True)
+    if shard_membership.enabled
+    else PushgatewayPublisher()
+)
+
+
+def get_metrics_publisher() -> PushgatewayPublisher:
+    return metrics_publisher
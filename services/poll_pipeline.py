@@ -0,0 +1,172 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional
+from app.config.settings import settings
+from app.config.logging import logger
+from app.core.prometheus_model import (
+    poller_pipeline_queue_depth,
+    poller_pipeline_busy_workers,
+    poller_pipeline_items,
+    stage_clock,
+)
+
+STAGES = ("fetch", "decode", "write")
+
+
+@dataclass
+class PipelineItem:
+    plan: Any
+    client: Any
+    future: asyncio.Future
+    raw: Any = None
+    decoded: Any = None
+
+
+@dataclass
+class _Stage:
+    name: str
+    concurrency: int
+    queue: asyncio.Queue
+    busy: int = 0
+    tasks: List[asyncio.Task] = field(default_factory=list)
+
+
+class PollPipeline:
+    """
+    Splits a device poll into stages connected by bounded queues:
+
+        submit -> [fetch queue] -> fetch workers (SNMP I/O)
+               -> [decode queue] -> decode workers (parsing, in worker threads)
+               -> [write queue] -> write workers (metric store / sinks)
+
+    Every stage has its own worker count. A full queue blocks the stage feeding
+    it, so a slow stage applies backpressure all the way up to submit() instead
+    of letting work pile up in memory. Decoding runs off the event loop so it
+    cannot starve the network stage.
+    """
+
+    def __init__(
+        self,
+        fetch_fn: Callable[[Any, Any], Awaitable[Any]],
+        decode_fn: Callable[[Any, Any], Any],
+        write_fn: Callable[[Any, Any], Any],
+        fetch_concurrency: Optional[int] = None,
+        decode_concurrency: Optional[int] = None,
+        write_concurrency: int = 1,
+        queue_size: Optional[int] = None
+    ):
+        self.fetch_fn = fetch_fn
+        self.decode_fn = decode_fn
+        self.write_fn = write_fn
+        queue_size = queue_size or settings.pipeline_queue_size
+        self.stages = {
+            "fetch": _Stage("fetch", fetch_concurrency or settings.polling_concurrency, asyncio.Queue(queue_size)),
+            "decode": _Stage("decode", decode_concurrency or settings.pipeline_decode_concurrency, asyncio.Queue(queue_size)),
+            "write": _Stage("write", write_concurrency, asyncio.Queue(queue_size)),
+        }
+
+    @property
+    def running(self) -> bool:
+        return any(stage.tasks for stage in self.stages.values())
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        handlers = {"fetch": self._fetch, "decode": self._decode, "write": self._write}
+        for name, stage in self.stages.items():
+            stage.tasks = [asyncio.create_task(self._worker(stage, handlers[name])) for _ in range(stage.concurrency)]
+        logger.info(
+            "Poll pipeline started ("
+            + ", ".join(f"{name}={stage.concurrency}" for name, stage in self.stages.items())
+            + ")"
+        )
+
+    async def stop(self) -> None:
+        tasks = [task for stage in self.stages.values() for task in stage.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for stage in self.stages.values():
+            stage.tasks = []
+            while not stage.queue.empty():
+                item = stage.queue.get_nowait()
+                if not item.future.done():
+                    item.future.cancel()
+
+    async def submit(self, plan: Any, client: Any) -> Any:
+        """Queue a poll and wait until it has been written; blocks while the fetch queue is full"""
+        if not self.running:
+            await self.start()
+        item = PipelineItem(plan, client, asyncio.get_running_loop().create_future())
+        await self._put("fetch", item)
+        try:
+            return await item.future
+        except asyncio.CancelledError:
+            # Caller gave up (e.g. deadline); later stages will skip the item
+            item.future.cancel()
+            raise
+
+    async def _put(self, name: str, item: PipelineItem) -> None:
+        stage = self.stages[name]
+        await stage.queue.put(item)
+        poller_pipeline_queue_depth.labels(stage=name).set(stage.queue.qsize())
+
+    async def _worker(self, stage: _Stage, handler: Callable[[PipelineItem], Awaitable[None]]) -> None:
+        while True:
+            item = await stage.queue.get()
+            poller_pipeline_queue_depth.labels(stage=stage.name).set(stage.queue.qsize())
+            if item.future.done():
+                poller_pipeline_items.labels(stage=stage.name, result="cancelled").inc()
+                continue
+
+            stage.busy += 1
+            poller_pipeline_busy_workers.labels(stage=stage.name).set(stage.busy)
+            started = time.monotonic()
+            try:
+                await handler(item)
+                stage_clock.observe(stage.name, time.monotonic() - started)
+                poller_pipeline_items.labels(stage=stage.name, result="success").inc()
+            except asyncio.CancelledError:
+                if not item.future.done():
+                    item.future.cancel()
+                raise
+            except Exception as e:
+                poller_pipeline_items.labels(stage=stage.name, result="error").inc()
+                if not item.future.done():
+                    item.future.set_exception(e)
+            finally:
+                stage.busy -= 1
+                poller_pipeline_busy_workers.labels(stage=stage.name).set(stage.busy)
+
+    async def _fetch(self, item: PipelineItem) -> None:
+        fetch = asyncio.ensure_future(self.fetch_fn(item.plan, item.client))
+        # Abandon the SNMP request as soon as the submitter stops waiting
+        await asyncio.wait({fetch, item.future}, return_when=asyncio.FIRST_COMPLETED)
+        if not fetch.done():
+            fetch.cancel()
+            await asyncio.gather(fetch, return_exceptions=True)
+            return
+        item.raw = fetch.result()
+        await self._put("decode", item)
+
+    async def _decode(self, item: PipelineItem) -> None:
+        item.decoded = await asyncio.to_thread(self.decode_fn, item.plan, item.raw)
+        item.raw = None
+        await self._put("write", item)
+
+    async def _write(self, item: PipelineItem) -> None:
+        result = self.write_fn(item.plan, item.decoded)
+        if not item.future.done():
+            item.future.set_result(result)
+
+    def report(self) -> dict:
+        return {
+            name: {
+                "concurrency": stage.concurrency,
+                "queue_depth": stage.queue.qsize(),
+                "queue_size": stage.queue.maxsize,
+                "busy": stage.busy,
+            }
+            for name, stage in self.stages.items()
+        }
@@ -0,0 +1,527 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.config.settings import settings, PollingTier
+from app.config.logging import logger
+from app.core import database, models
+from app.core.ring_store import recent_samples
+from services.snmp_budget import snmp_budget
+from app.core.prometheus_model import (
+    poller_tier_devices,
+    poller_tier_achieved_interval,
+    poller_schedule_lag,
+    poller_dispatch_queue_depth,
+    poller_dispatch_rate,
+    poller_skipped_polls,
+    poller_cycle_duration,
+    poller_cycle_budget,
+    poller_cycle_overruns,
+    poller_late_devices,
+    poller_cycle_late_devices,
+    poller_series_evicted,
+    stage_clock,
+    metrics_store,
+    mark_registry_updated,
+)
+
+POLL_KINDS = ("system", "interface")
+
+
+@dataclass
+class PollPlan:
+    ip_address: str
+    vendor: str
+    tier: int
+    poll_system: bool
+    poll_interfaces: bool
+    priority: Optional[int] = None  # Device.priority, which tier only approximates
+
+
+class TierScheduler:
+    """Tracks when each device was last polled and decides what is due based on Device.priority"""
+
+    def __init__(self, tiers: Optional[Dict[int, PollingTier]] = None, smoothing: float = 0.2):
+        self.tiers = tiers or settings.polling_tiers
+        self.smoothing = smoothing
+        self._last_polled: Dict[Tuple[str, str], float] = {}
+        self._achieved: Dict[Tuple[int, str], float] = {}
+        self._tier_sizes: Dict[int, int] = {}
+        self._late: Dict[str, int] = {}
+
+    def tier_for(self, priority: Optional[int]) -> int:
+        if priority in self.tiers:
+            return priority  # type: ignore
+        return max(self.tiers)
+
+    def interval_for(self, tier: int, kind: str) -> int:
+        config = self.tiers[tier]
+        return config.system_interval if kind == "system" else config.interface_interval
+
+    def is_due(self, ip_address: str, tier: int, kind: str, now: float) -> bool:
+        last = self._last_polled.get((ip_address, kind))
+        return last is None or now - last >= self.interval_for(tier, kind)
+
+    def plan(
+        self,
+        devices: Iterable[Tuple[str, str, Optional[int]]],
+        now: Optional[float] = None,
+        force: bool = False
+    ) -> List[PollPlan]:
+        """Build poll plans for (ip, vendor, priority) rows, skipping devices with nothing due"""
+        now = now if now is not None else time.monotonic()
+        devices = list(devices)
+        self.update_sizes(devices)
+        plans = []
+        for ip_address, vendor, priority in devices:
+            tier = self.tier_for(priority)
+            poll_system = force or self.is_due(ip_address, tier, "system", now)
+            poll_interfaces = force or self.is_due(ip_address, tier, "interface", now)
+            if poll_system or poll_interfaces:
+                plans.append(PollPlan(ip_address, vendor, tier, poll_system, poll_interfaces, priority))
+        # Devices that missed the last deadline go last so they cannot hold up the rest
+        plans.sort(key=lambda plan: plan.ip_address in self._late)
+        return plans
+
+    def update_sizes(self, devices: Iterable[Tuple[str, str, Optional[int]]]) -> None:
+        """Count devices per tier; also ranks them for the SNMP request budget queue"""
+        sizes = {tier: 0 for tier in self.tiers}
+        priorities = {}
+        for ip_address, _, priority in devices:
+            tier = self.tier_for(priority)
+            sizes[tier] += 1
+            priorities[ip_address] = tier
+        snmp_budget.set_priorities(priorities)
+
+        self._tier_sizes = sizes
+        for tier, size in sizes.items():
+            poller_tier_devices.labels(tier=str(tier)).set(size)
+
+    def record(self, ip_address: str, tier: int, kind: str, now: Optional[float] = None) -> None:
+        """Mark a poll as done and fold the observed interval into the tier average"""
+        now = now if now is not None else time.monotonic()
+        last = self._last_polled.get((ip_address, kind))
+        self._last_polled[(ip_address, kind)] = now
+        if last is None:
+            return
+
+        observed = now - last
+        previous = self._achieved.get((tier, kind))
+        achieved = observed if previous is None else previous + self.smoothing * (observed - previous)
+        self._achieved[(tier, kind)] = achieved
+        poller_tier_achieved_interval.labels(tier=str(tier), kind=kind).set(round(achieved, 3))
+
+    def mark_late(self, ip_address: str, tier: int, late: bool = True) -> None:
+        if late:
+            self._late[ip_address] = tier
+        else:
+            self._late.pop(ip_address, None)
+
+    def forget(self, ip_address: str) -> None:
+        for kind in POLL_KINDS:
+            self._last_polled.pop((ip_address, kind), None)
+        self._late.pop(ip_address, None)
+
+    def export_state(self) -> Dict[str, np.ndarray]:
+        """Last-poll times (as wall clock, so they survive a restart), achieved intervals and late devices"""
+        offset = time.time() - time.monotonic()
+        polled = list(self._last_polled.items())
+        achieved = list(self._achieved.items())
+        return {
+            "polled_hosts": np.array([ip for (ip, _), _ in polled], dtype=str),
+            "polled_kinds": np.array([kind for (_, kind), _ in polled], dtype=str),
+            "polled_at": np.array([at + offset for _, at in polled], dtype=np.float64),
+            "achieved_tiers": np.array([tier for (tier, _), _ in achieved], dtype=np.int64),
+            "achieved_kinds": np.array([kind for (_, kind), _ in achieved], dtype=str),
+            "achieved": np.array([value for _, value in achieved], dtype=np.float64),
+            "late_hosts": np.array(list(self._late), dtype=str),
+            "late_tiers": np.array(list(self._late.values()), dtype=np.int64),
+        }
+
+    def import_state(self, state: Dict[str, np.ndarray], keep: Optional[Callable[[str], bool]] = None) -> None:
+        offset = time.time() - time.monotonic()
+        for ip_address, kind, at in zip(state["polled_hosts"].tolist(), state["polled_kinds"].tolist(), state["polled_at"].tolist()):
+            if keep is None or keep(ip_address):
+                self._last_polled.setdefault((ip_address, kind), at - offset)
+        for tier, kind, value in zip(state["achieved_tiers"].tolist(), state["achieved_kinds"].tolist(), state["achieved"].tolist()):
+            if tier in self.tiers:
+                self._achieved.setdefault((tier, kind), value)
+                poller_tier_achieved_interval.labels(tier=str(tier), kind=kind).set(round(value, 3))
+        for ip_address, tier in zip(state["late_hosts"].tolist(), state["late_tiers"].tolist()):
+            if tier in self.tiers and (keep is None or keep(ip_address)):
+                self._late.setdefault(ip_address, tier)
+
+    def report(self) -> List[dict]:
+        return [
+            {
+                "tier": tier,
+                "devices": self._tier_sizes.get(tier, 0),
+                "system_interval": config.system_interval,
+                "interface_interval": config.interface_interval,
+                "achieved_system_interval": self._achieved.get((tier, "system")),
+                "achieved_interface_interval": self._achieved.get((tier, "interface")),
+                "late_devices": sorted(ip for ip, late_tier in self._late.items() if late_tier == tier),
+            }
+            for tier, config in sorted(self.tiers.items())
+        ]
+
+
+tier_scheduler = TierScheduler()
+
+
+def get_tier_scheduler() -> TierScheduler:
+    return tier_scheduler
+
+
+@dataclass
+class CycleResult:
+    duration: float
+    budget: float
+    completed: int
+    late: List[str]
+    stages: Dict[str, float] = field(default_factory=dict)  # Process-wide stage seconds during the cycle
+
+    @property
+    def overrun(self) -> bool:
+        return bool(self.late)
+
+
+async def run_cycle(
+    plans: List[PollPlan],
+    poll_fn: Callable[[PollPlan], Awaitable[object]],
+    budget: float,
+    concurrency: Optional[int] = None,
+    tiers: Optional[TierScheduler] = None
+) -> CycleResult:
+    """
+    Poll every plan under one deadline. Devices still running when the budget
+    is spent are cancelled and reported as late instead of holding the cycle;
+    they stay due and are retried (last) on the next cycle.
+    """
+    tiers = tiers or tier_scheduler
+    semaphore = asyncio.Semaphore(concurrency or settings.polling_concurrency)
+
+    async def limited_polling(plan: PollPlan):
+        async with semaphore:
+            await poll_fn(plan)
+
+    started = time.monotonic()
+    stages_before = stage_clock.totals()
+    tasks = {asyncio.create_task(limited_polling(plan)): plan for plan in plans}
+    late = []
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=budget)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        for task, plan in tasks.items():
+            is_late = task in pending
+            tiers.mark_late(plan.ip_address, plan.tier, is_late)
+            if is_late:
+                late.append(plan.ip_address)
+            elif task.exception():
+                logger.error(f"Poll failed for {plan.ip_address}: {str(task.exception())}")
+
+    result = CycleResult(
+        duration=time.monotonic() - started,
+        budget=budget,
+        completed=len(plans) - len(late),
+        late=late
+    )
+    result.stages = stage_clock.report_cycle("sweep", stages_before, result.duration, result.completed)
+    poller_cycle_duration.labels(source="sweep").set(round(result.duration, 3))
+    poller_cycle_budget.labels(source="sweep").set(budget)
+    poller_cycle_late_devices.labels(source="sweep").set(len(late))
+    if result.overrun:
+        poller_cycle_overruns.labels(source="sweep").inc()
+        poller_late_devices.labels(source="sweep").inc(len(late))
+        logger.warning(f"Poll cycle hit its {budget:.1f}s deadline, {len(late)} devices deferred")
+    return result
+
+
+DeviceRow = Tuple[str, str, Optional[int]]
+
+
+def load_devices() -> List[DeviceRow]:
+    """Read (ip, vendor, priority) for every registered device"""
+    db = database.SessionLocal()
+    try:
+        return [tuple(row) for row in db.query(models.Device.ip_address, models.Device.vendor, models.Device.priority).all()]
+    finally:
+        db.close()
+
+
+class PollScheduler:
+    """
+    Background scheduler that gives every device a stable phase offset inside its
+    tier interval and feeds due devices into a rate-paced dispatch queue, so polls
+    are spread evenly instead of firing all at once.
+    """
+
+    def __init__(
+        self,
+        poll_fn: Callable[[PollPlan], Awaitable[object]],
+        device_source: Callable[[], List[DeviceRow]] = load_devices,
+        push_fn: Optional[Callable[[], None]] = None,
+        tiers: Optional[TierScheduler] = None,
+        concurrency: Optional[int] = None,
+        refresh_interval: Optional[int] = None,
+        rate_headroom: float = 1.5,
+        owns: Optional[Callable[[str], bool]] = None
+    ):
+        self.poll_fn = poll_fn
+        self.device_source = device_source
+        self.owns = owns
+        self.push_fn = push_fn
+        self.tiers = tiers or tier_scheduler
+        self.concurrency = concurrency or settings.polling_concurrency
+        self.refresh_interval = refresh_interval or settings.device_refresh_interval
+        self.rate_headroom = rate_headroom
+
+        self._devices: Dict[str, Tuple[str, int, Optional[int]]] = {}  # ip -> (vendor, tier, priority)
+        # (due, ip, generation); a device re-added after removal gets a new generation,
+        # so the entry left over from before is dropped instead of polling it twice
+        self._heap: List[Tuple[float, str, int]] = []
+        self._generations: Dict[str, int] = {}
+        self._generation = itertools.count()
+        self._in_flight: set = set()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        self._tasks: List[asyncio.Task] = []
+        self._dispatch_rate = 0.0
+        self._next_slot = 0.0
+        self._lag_last = 0.0
+        self._lag_max = 0.0
+        self._dispatched = 0
+        self._skipped = 0
+        self._completed = 0
+        self._last_stages: Dict[str, float] = {}
+        self._refresh = asyncio.Event()
+        self._unconfirmed: set = set()
+
+    @staticmethod
+    def phase_offset(ip_address: str, interval: float) -> float:
+        """Stable offset in [0, interval) derived from the device address"""
+        return (zlib.crc32(ip_address.encode()) / 2**32) * interval
+
+    def next_due(self, ip_address: str, interval: float, after: float) -> float:
+        phase = self.phase_offset(ip_address, interval)
+        return (math.floor((after - phase) / interval) + 1) * interval + phase
+
+    def expect_hosts(self, hosts: Iterable[str]) -> None:
+        """
+        Hosts already holding series (restored from a snapshot) that the next
+        sync must confirm; any it does not schedule are dropped like removed devices.
+        """
+        self._unconfirmed = set(hosts)
+
+    def sync_devices(self, rows: Iterable[DeviceRow], now: Optional[float] = None) -> None:
+        """
+        Reconcile the schedule with the device list; removed devices drop out
+        lazily. With an owns filter only this worker's share is scheduled, and
+        devices handed to another worker are dropped without unpublishing them.
+        """
+        now = now if now is not None else time.time()
+        rows = list(rows)
+        registered = {row[0] for row in rows}
+        if self.owns:
+            rows = [row for row in rows if self.owns(row[0])]
+        self.tiers.update_sizes(rows)
+
+        devices = {}
+        rate = 0.0
+        for ip_address, vendor, priority in rows:
+            tier = self.tiers.tier_for(priority)
+            devices[ip_address] = (vendor, tier, priority)
+            interval = self.tiers.interval_for(tier, "system")
+            rate += 1 / interval
+            if ip_address not in self._devices:
+                generation = self._generations[ip_address] = next(self._generation)
+                heapq.heappush(self._heap, (self.next_due(ip_address, interval, now), ip_address, generation))
+
+        for ip_address in (set(self._devices) | self._unconfirmed) - set(devices):
+            self._generations.pop(ip_address, None)
+            self.tiers.forget(ip_address)
+            reassigned = ip_address in registered
+            removed = metrics_store.remove_host(ip_address, publish=not reassigned)
+            recent_samples.remove_host(ip_address)
+            if removed:
+                poller_series_evicted.labels(reason="reassigned" if reassigned else "removed").inc(removed)
+                mark_registry_updated()
+
+        self._devices = devices
+        self._unconfirmed = set()
+        self._dispatch_rate = rate * self.rate_headroom
+        poller_dispatch_rate.set(round(self._dispatch_rate, 3))
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._refresh_loop()), asyncio.create_task(self._dispatch_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._stats_loop()))
+        if self.push_fn:
+            self._tasks.append(asyncio.create_task(self._push_loop()))
+        logger.info(f"Polling scheduler started with {self.concurrency} workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Polling scheduler stopped")
+
+    async def poll_now(self, ip_address: str) -> bool:
+        """
+        Queue a full poll of one scheduled device ahead of its next slot, e.g.
+        after a trap. Returns False if the device is not scheduled here or a
+        poll of it is already in flight.
+        """
+        device = self._devices.get(ip_address)
+        if device is None or ip_address in self._in_flight or not self._tasks:
+            return False
+        vendor, tier, priority = device
+        self._in_flight.add(ip_address)
+        await self._queue.put(PollPlan(ip_address, vendor, tier, poll_system=True, poll_interfaces=True, priority=priority))
+        self._dispatched += 1
+        poller_dispatch_queue_depth.set(self._queue.qsize())
+        return True
+
+    def request_refresh(self) -> None:
+        """Reload the device list now instead of at the next refresh interval"""
+        self._refresh.set()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            self._refresh.clear()
+            try:
+                rows = await asyncio.to_thread(self.device_source)
+                self.sync_devices(rows)
+            except Exception as e:
+                logger.error(f"Failed to refresh device list: {str(e)}")
+            try:
+                await asyncio.wait_for(self._refresh.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _pace(self) -> None:
+        """Hold dispatches to the steady target rate"""
+        if self._dispatch_rate <= 0:
+            return
+        now = time.time()
+        self._next_slot = max(self._next_slot + 1 / self._dispatch_rate, now)
+        if self._next_slot > now:
+            await asyncio.sleep(self._next_slot - now)
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            if not self._heap:
+                await asyncio.sleep(1.0)
+                continue
+
+            due, ip_address, generation = self._heap[0]
+            now = time.time()
+            if due > now:
+                # Wake up at least every second so newly added devices are picked up
+                await asyncio.sleep(min(due - now, 1.0))
+                continue
+
+            heapq.heappop(self._heap)
+            device = self._devices.get(ip_address)
+            if device is None or self._generations.get(ip_address) != generation:
+                continue
+
+            vendor, tier, priority = device
+            interval = self.tiers.interval_for(tier, "system")
+            heapq.heappush(self._heap, (self.next_due(ip_address, interval, max(now, due)), ip_address, generation))
+
+            if self.owns and not self.owns(ip_address):
+                # Lease lost or expired since the last refresh: another worker may
+                # hold it already, so skip and let a refresh drop it
+                self.request_refresh()
+                continue
+
+            if ip_address in self._in_flight:
+                self._skipped += 1
+                poller_skipped_polls.inc()
+                continue
+
+            await self._pace()
+            plan = PollPlan(
+                ip_address,
+                vendor,
+                tier,
+                poll_system=True,
+                poll_interfaces=self.tiers.is_due(ip_address, tier, "interface", time.monotonic()),
+                priority=priority
+            )
+            self._in_flight.add(ip_address)
+            await self._queue.put(plan)
+
+            self._record_lag(time.time() - due)
+            self._dispatched += 1
+            poller_dispatch_queue_depth.set(self._queue.qsize())
+
+    def _record_lag(self, lag: float) -> None:
+        self._lag_last = lag
+        self._lag_max = max(self._lag_max, lag)
+        poller_schedule_lag.labels(stat="last").set(round(lag, 3))
+        poller_schedule_lag.labels(stat="max").set(round(self._lag_max, 3))
+
+    async def _worker(self) -> None:
+        while True:
+            plan = await self._queue.get()
+            poller_dispatch_queue_depth.set(self._queue.qsize())
+            deadline = self.tiers.interval_for(plan.tier, "system") * settings.poll_deadline_ratio
+            try:
+                await asyncio.wait_for(self.poll_fn(plan), timeout=deadline)
+                self.tiers.mark_late(plan.ip_address, plan.tier, False)
+                self._completed += 1
+            except asyncio.TimeoutError:
+                self.tiers.mark_late(plan.ip_address, plan.tier)
+                poller_cycle_overruns.labels(source="scheduler").inc()
+                poller_late_devices.labels(source="scheduler").inc()
+                logger.warning(f"Poll of {plan.ip_address} exceeded its {deadline:.1f}s deadline")
+            except Exception as e:
+                logger.error(f"Scheduled poll failed for {plan.ip_address}: {str(e)}")
+            finally:
+                self._in_flight.discard(plan.ip_address)
+                self._queue.task_done()
+
+    async def _stats_loop(self) -> None:
+        """Report throughput and the stage breakdown once per shortest system interval"""
+        interval = min(tier.system_interval for tier in self.tiers.tiers.values())
+        completed, stages = self._completed, stage_clock.totals()
+        while True:
+            await asyncio.sleep(interval)
+            self._last_stages = stage_clock.report_cycle("scheduler", stages, interval, self._completed - completed)
+            completed, stages = self._completed, stage_clock.totals()
+
+    async def _push_loop(self) -> None:
+        interval = min(tier.system_interval for tier in self.tiers.tiers.values())
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.push_fn()  # type: ignore
+            except Exception as e:
+                logger.error(f"Failed to push metrics: {str(e)}")
+
+    def report(self) -> dict:
+        return {
+            "running": bool(self._tasks),
+            "devices": len(self._devices),
+            "dispatch_rate": round(self._dispatch_rate, 3),
+            "queue_depth": self._queue.qsize(),
+            "in_flight": len(self._in_flight),
+            "dispatched": self._dispatched,
+            "skipped": self._skipped,
+            "completed": self._completed,
+            "stages": self._last_stages,
+            "lag_last": round(self._lag_last, 3),
+            "lag_max": round(self._lag_max, 3),
+        }
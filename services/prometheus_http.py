@@ -0,0 +1,76 @@
+import importlib.util
+from typing import Optional
+import httpx
+from app.config.settings import settings
+from app.config.logging import logger
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class PrometheusHTTPClient:
+    """
+    One application-scoped httpx client for the Prometheus API. Created in
+    the lifespan and shared by every query, so dashboard requests reuse
+    pooled keep-alive connections instead of opening a new one each call.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None
+    ):
+        self.base_url = (base_url or settings.prometheus_url).rstrip("/")
+        self.timeout = timeout or settings.prometheus_timeout
+        self.connect_timeout = connect_timeout or settings.prometheus_connect_timeout
+        self.max_connections = max_connections or settings.prometheus_max_connections
+        self.max_keepalive = settings.prometheus_max_keepalive if max_keepalive is None else max_keepalive
+        self.keepalive_expiry = settings.prometheus_keepalive_expiry if keepalive_expiry is None else keepalive_expiry
+        self.http2 = settings.prometheus_http2 if http2 is None else http2
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _build(self) -> httpx.AsyncClient:
+        http2 = self.http2
+        if http2 and not http2_available():
+            logger.warning("PROMETHEUS_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=http2,
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry
+            )
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Built on first use too, for scripts and tests that run without the lifespan
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+        return self._client
+
+    async def start(self) -> None:
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+            logger.info(f"Prometheus client ready for {self.base_url}")
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+prometheus_http = PrometheusHTTPClient()
+
+
+def get_prometheus_http() -> httpx.AsyncClient:
+    return prometheus_http.client
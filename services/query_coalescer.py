@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from app.config.settings import settings
+from app.core.prometheus_model import poller_prometheus_queries, poller_query_cache_entries
+
+
+class QueryCoalescer:
+    """
+    Singleflight for Prometheus API calls: callers asking for the same
+    (endpoint, query, time, step) while a request is in flight await that
+    request instead of sending their own, and all get its parsed result.
+
+    Instant queries carry no time of their own (they mean "now"), so their
+    results are also kept for a short TTL; a wall of dashboards refreshing
+    together then costs one upstream query. Results are shared between
+    callers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, enabled: Optional[bool] = None):
+        self.ttl = settings.query_cache_ttl if ttl is None else ttl
+        self.enabled = settings.query_coalesce_enabled if enabled is None else enabled
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._cache: Dict[Hashable, Tuple[float, Dict[str, Any]]] = {}
+        self.counts = {"hit": 0, "coalesced": 0, "miss": 0}
+
+    def _count(self, kind: str, result: str) -> None:
+        self.counts[result] += 1
+        poller_prometheus_queries.labels(kind=kind, result=result).inc()
+
+    async def run(
+        self,
+        kind: str,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        cache: bool = False
+    ) -> Dict[str, Any]:
+        if not self.enabled:
+            return await fetch()
+
+        now = time.monotonic()
+        if cache and self.ttl > 0:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > now:
+                self._count(kind, "hit")
+                return cached[1]
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self._count(kind, "coalesced")
+            # Shielded so one caller disconnecting does not cancel the others
+            return await asyncio.shield(future)
+
+        self._count(kind, "miss")
+        future = asyncio.ensure_future(fetch())
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._settled(key, done))
+        result = await asyncio.shield(future)
+        if cache and self.ttl > 0 and isinstance(result, dict) and result.get("status") == "success":
+            self._store(key, result, time.monotonic())
+        return result
+
+    def _settled(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Retrieved so a failure nobody is left waiting on is not logged as unhandled
+            future.exception()
+
+    def _store(self, key: Hashable, result: Dict[str, Any], now: float) -> None:
+        for stale in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[stale]
+        self._cache[key] = (now + self.ttl, result)
+        poller_query_cache_entries.set(len(self._cache))
+
+    def report(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "inflight": len(self._inflight),
+            "cached": len(self._cache),
+            **self.counts,
+        }
+
+
+query_coalescer = QueryCoalescer()
+
+
+def get_query_coalescer() -> QueryCoalescer:
+    return query_coalescer
@@ -0,0 +1,209 @@
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from app.config.settings import settings
+from app.core.range_results import decode_samples
+from app.core.prometheus_model import (
+    poller_range_cache_requests,
+    poller_range_cache_bytes,
+    poller_range_cache_evictions,
+)
+
+RangeFetch = Callable[[str, str, str, str], Awaitable[Dict[str, Any]]]
+
+
+class SeriesGrid:
+    """
+    Range query result on a fixed step grid: one row per series, one column
+    per evaluation timestamp start + i * step, NaN where a series has no point.
+    """
+
+    def __init__(self, start: float, step: float, metrics: List[dict], values: np.ndarray):
+        self.start = start
+        self.step = step
+        self.metrics = metrics
+        self.keys = {tuple(sorted(metric.items())): i for i, metric in enumerate(metrics)}
+        self.values = values
+
+    @property
+    def points(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def end(self) -> float:
+        return self.start + (self.points - 1) * self.step
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + sum(len(str(metric)) for metric in self.metrics)
+
+    @classmethod
+    def from_result(cls, result: List[dict], start: float, end: float, step: float) -> "SeriesGrid":
+        points = max(int(round((end - start) / step)) + 1, 0)
+        values = np.full((len(result), points), np.nan)
+        for row, series in enumerate(result):
+            times, samples = decode_samples(series.get("values", []))
+            column = np.rint((times - start) / step).astype(np.int64)
+            inside = (column >= 0) & (column < points)
+            values[row, column[inside]] = samples[inside]
+        return cls(start, step, [series.get("metric", {}) for series in result], values)
+
+    def slice(self, start: float, end: float) -> "SeriesGrid":
+        first = max(int(round((start - self.start) / self.step)), 0)
+        last = min(int(round((end - self.start) / self.step)), self.points - 1)
+        values = self.values[:, first:last + 1] if last >= first else self.values[:, :0]
+        return SeriesGrid(self.start + first * self.step, self.step, self.metrics, values)
+
+    def splice(self, tail: "SeriesGrid") -> "SeriesGrid":
+        """Append a grid that starts right after this one; series new in the tail get a NaN head"""
+        metrics = list(self.metrics)
+        keys = dict(self.keys)
+        for metric in tail.metrics:
+            key = tuple(sorted(metric.items()))
+            if key not in keys:
+                keys[key] = len(metrics)
+                metrics.append(metric)
+
+        offset = int(round((tail.start - self.start) / self.step))
+        values = np.full((len(metrics), max(self.points, offset + tail.points)), np.nan)
+        values[:len(self.metrics), :self.points] = self.values
+        rows = [keys[tuple(sorted(metric.items()))] for metric in tail.metrics]
+        values[rows, offset:offset + tail.points] = tail.values
+        return SeriesGrid(self.start, self.step, metrics, values)
+
+    def to_result(self) -> Dict[str, Any]:
+        """Prometheus query_range response shape, so callers cannot tell a cached answer apart"""
+        times = self.start + self.step * np.arange(self.points)
+        result = []
+        for metric, row in zip(self.metrics, self.values):
+            present = ~np.isnan(row)
+            if present.any():
+                result.append({
+                    "metric": metric,
+                    "values": [[t, repr(v)] for t, v in zip(times[present].tolist(), row[present].tolist())]
+                })
+        return {"status": "success", "data": {"resultType": "matrix", "result": result}}
+
+
+def parse_time(value: str) -> float:
+    """Unix seconds or RFC 3339 (a trailing Z or no offset both mean UTC), as Prometheus reads them"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.rstrip("Z"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_step(step: str) -> float:
+    try:
+        return float(step)
+    except ValueError:
+        units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, "d": 86400}
+        for suffix in ("ms", "s", "m", "h", "d"):
+            if step.endswith(suffix):
+                return float(step[:-len(suffix)]) * units[suffix]
+        raise ValueError(f"Invalid step: {step}")
+
+
+class RangeQueryCache:
+    """
+    Query-frontend style cache for Prometheus range queries. Start and end
+    are snapped down to the step so a sliding dashboard window lands on the
+    same evaluation grid each refresh. Per (query, step) the grid already
+    fetched is kept; a later request fetches only the tail after it and
+    splices it on, and points older than the requested start are dropped.
+
+    Points newer than now - freshness are served but never stored, since
+    Prometheus may still be ingesting samples for them. Entries are evicted
+    least recently used first once the byte budget is exceeded.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, freshness: Optional[float] = None):
+        self.max_bytes = max_bytes or settings.range_cache_max_bytes
+        self.freshness = settings.range_cache_freshness if freshness is None else freshness
+        self._entries: "OrderedDict[Tuple[str, float], SeriesGrid]" = OrderedDict()
+        self.nbytes = 0
+
+    async def query_range(self, fetch: RangeFetch, query: str, start_time: str, end_time: str, step: str) -> Dict[str, Any]:
+        try:
+            step_seconds = parse_step(step)
+            start = math.floor(parse_time(start_time) / step_seconds) * step_seconds
+            end = math.floor(parse_time(end_time) / step_seconds) * step_seconds
+        except (ValueError, TypeError):
+            poller_range_cache_requests.labels(result="bypass").inc()
+            return await fetch(query, start_time, end_time, step)
+        if step_seconds <= 0 or end < start:
+            poller_range_cache_requests.labels(result="bypass").inc()
+            return await fetch(query, start_time, end_time, step)
+
+        key = (query, step_seconds)
+        cached = self._entries.get(key)
+        if cached is not None and not (cached.start <= start <= cached.end + step_seconds):
+            # Asks for history before the cached range (or after a gap): start over
+            self._drop(key)
+            cached = None
+
+        fetch_from = start if cached is None else cached.end + step_seconds
+        grid = cached.slice(start, end) if cached is not None else None
+        if fetch_from <= end:
+            response = await fetch(query, repr(fetch_from), repr(end), repr(step_seconds))
+            if not isinstance(response, dict) or response.get("status") != "success":
+                return response
+            tail = SeriesGrid.from_result(response.get("data", {}).get("result", []), fetch_from, end, step_seconds)
+            grid = tail if grid is None else grid.splice(tail)
+            self._store(key, grid, cached, tail, start)
+            poller_range_cache_requests.labels(result="miss" if cached is None else "partial").inc()
+        else:
+            self._entries.move_to_end(key)
+            poller_range_cache_requests.labels(result="hit").inc()
+        return grid.to_result()  # type: ignore
+
+    def _store(self, key: Tuple[str, float], grid: SeriesGrid, cached: Optional[SeriesGrid], tail: SeriesGrid, start: float) -> None:
+        stable_end = math.floor((time.time() - self.freshness) / key[1]) * key[1]
+        if cached is not None:
+            stable = cached.slice(start, cached.end)
+            if tail.start <= stable_end:
+                stable = stable.splice(tail.slice(tail.start, stable_end))
+        else:
+            stable = tail.slice(start, stable_end)
+        self._drop(key)
+        if stable.points == 0 or stable.end < start:
+            return
+        self._entries[key] = stable
+        self.nbytes += stable.nbytes
+        while self.nbytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            poller_range_cache_evictions.inc()
+        poller_range_cache_bytes.set(self.nbytes)
+
+    def _drop(self, key: Tuple[str, float]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry.nbytes
+            poller_range_cache_bytes.set(self.nbytes)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
+        poller_range_cache_bytes.set(0)
+
+    def report(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "freshness": self.freshness,
+        }
+
+
+range_cache = RangeQueryCache()
+
+
+def get_range_cache() -> RangeQueryCache:
+    return range_cache
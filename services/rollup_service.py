@@ -0,0 +1,337 @@
+import asyncio
+import math
+import time
+import warnings
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import insert
+from app.config.settings import settings
+from app.config.logging import logger
+from app.core import database, models
+from app.core.ring_store import RecentSamples, recent_samples
+from services.device_leases import device_assignment
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+DEVICE_ROLLUP_COLUMNS = models.DEVICE_ROLLUP_METRICS
+INTERFACE_ROLLUP_COLUMNS = models.INTERFACE_ROLLUP_METRICS
+
+# Hosts whose source rows are read at once when building an hour or day bucket
+HOSTS_PER_READ = 50
+
+# Seconds after a bucket closes before it is rolled up, so late polls land first
+FLUSH_DELAY = 5.0
+
+
+def retention_seconds(resolution: int) -> int:
+    days = {
+        MINUTE: settings.rollup_minute_retention_days,
+        HOUR: settings.rollup_hour_retention_days,
+        DAY: settings.rollup_day_retention_days,
+    }[resolution]
+    return days * DAY
+
+
+def pick_resolution(step: float, start: float, now: Optional[float] = None) -> int:
+    """
+    Coarsest tier no wider than the step that still retains `start`. If none
+    does, the finest tier that still reaches back that far.
+    """
+    now = now if now is not None else time.time()
+    for resolution in sorted(RESOLUTIONS, reverse=True):
+        if resolution <= step and start >= now - retention_seconds(resolution):
+            return resolution
+    for resolution in RESOLUTIONS:
+        if start >= now - retention_seconds(resolution):
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def summarize(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-row count/min/avg/max/p95 of a (rows, samples) array with NaN gaps; NaN for empty rows"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN rows
+        return {
+            "count": (~np.isnan(values)).sum(axis=1),
+            "min": np.nanmin(values, axis=1),
+            "avg": np.nanmean(values, axis=1),
+            "max": np.nanmax(values, axis=1),
+            "p95": np.nanpercentile(values, 95, axis=1),
+        }
+
+
+def combine(source: int, rows: np.ndarray, starts: np.ndarray, metrics: int) -> np.ndarray:
+    """
+    Merge consecutive rollup rows into one per group. rows holds count then
+    min/avg/max/p95 per metric (NaN for missing) and each group begins at
+    starts. From minutes, p95 is the 95th percentile of the 1-minute
+    averages (the usual billing figure); from hours, the max of the hourly
+    p95s, which bounds the daily figure from above.
+    """
+    count = rows[:, 0]
+    out = np.empty((len(starts), rows.shape[1]))
+    out[:, 0] = np.add.reduceat(count, starts)
+    bounds = np.append(starts, len(rows))
+    for m in range(metrics):
+        low, mean, high, p95 = (rows[:, 1 + 4 * m + i] for i in range(4))
+        has = ~np.isnan(mean)
+        weight = np.where(has, count, 0)
+        column = 1 + 4 * m
+        # fmin/fmax skip NaN, so a metric missing from some rows still rolls up
+        out[:, column] = np.fmin.reduceat(low, starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[:, column + 1] = np.add.reduceat(np.where(has, mean * count, 0), starts) / np.add.reduceat(weight, starts)
+        out[:, column + 2] = np.fmax.reduceat(high, starts)
+        if source == MINUTE:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                out[:, column + 3] = [np.nanpercentile(mean[begin:end], 95) for begin, end in zip(bounds, bounds[1:])]
+        else:
+            out[:, column + 3] = np.fmax.reduceat(p95, starts)
+    return out
+
+
+def optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+class RollupSink:
+    """
+    Downsamples polled metrics into the rollup database: one device_rollups
+    row per device and one interface_rollups row per interface per bucket,
+    with min/avg/max/p95 columns for each metric.
+
+    Every minute the closed minute is summarized straight from the recent
+    sample rings the poll write stage fills, so no extra raw buffer is held.
+    Hour buckets are built from the 1-minute rows and day buckets from the
+    hour rows (see combine), reading a few hosts at a time. Rows are written
+    in batches of ROLLUP_WRITE_BATCH and each tier is pruned to its own
+    retention.
+    """
+
+    def __init__(
+        self,
+        recent: RecentSamples = recent_samples,
+        session_factory: Callable = database.RollupSessionLocal,
+        owns: Optional[Callable[[str], bool]] = None,
+        batch_size: Optional[int] = None
+    ):
+        self.recent = recent
+        self.session_factory = session_factory
+        self.owns = owns or (lambda host: True)
+        self.batch_size = batch_size or settings.rollup_write_batch
+        self._last_minute: Optional[int] = None
+        self._last_prune = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.rows_written = 0
+
+    @staticmethod
+    def _tables() -> Iterable[Tuple[type, Sequence[str], Tuple[str, ...]]]:
+        """(model, metrics, series key columns) per rollup table"""
+        yield models.DeviceRollup, DEVICE_ROLLUP_COLUMNS, ("host",)
+        yield models.InterfaceRollup, INTERFACE_ROLLUP_COLUMNS, ("host", "interface_index")
+
+    @staticmethod
+    def _records(resolution: int, bucket: int, key_columns: Tuple[str, ...], keys: List[Tuple], metrics: Sequence[str], rows: np.ndarray) -> List[dict]:
+        records = []
+        for key, row in zip(keys, rows.tolist()):
+            record = dict(zip(key_columns, key), resolution=resolution, bucket=bucket, count=int(row[0]))
+            for m, metric in enumerate(metrics):
+                for i, stat in enumerate(models.ROLLUP_STATS):
+                    record[models.rollup_column(metric, stat)] = optional(row[1 + 4 * m + i])
+            records.append(record)
+        return records
+
+    def rollup_minute(self, bucket: int) -> int:
+        """Summarize the minute starting at bucket from the sample rings"""
+        written = 0
+        for (model, metrics, key_columns), kind in zip(self._tables(), ("device", "interface")):
+            keys, windows = self.recent.snapshot(kind, metrics, bucket, bucket + MINUTE - 1e-6)
+            if not keys:
+                continue
+            stats = [summarize(windows[metric]) for metric in metrics]
+            rows = np.column_stack(
+                [np.max([s["count"] for s in stats], axis=0)]
+                + [s[stat] for s in stats for stat in models.ROLLUP_STATS]
+            )
+            present = rows[:, 0] > 0
+            keys = [(key,) if kind == "device" else key for key, keep in zip(keys, present.tolist()) if keep]
+            written += self._write(model, self._records(MINUTE, bucket, key_columns, keys, metrics, rows[present]))
+        return written
+
+    def rollup_period(self, resolution: int, bucket: int) -> int:
+        """Build one hour bucket from its 1-minute rows, or one day bucket from its hour rows"""
+        source = MINUTE if resolution == HOUR else HOUR
+        written = 0
+        for model, metrics, key_columns in self._tables():
+            keys = [getattr(model, column) for column in key_columns]
+            stats = [getattr(model, models.rollup_column(metric, stat)) for metric in metrics for stat in models.ROLLUP_STATS]
+            db = self.session_factory()
+            try:
+                done = {
+                    host for (host,) in db.query(model.host).filter(
+                        model.resolution == resolution, model.bucket == bucket
+                    ).distinct()
+                }
+                hosts = [
+                    host for (host,) in db.query(model.host).filter(
+                        model.resolution == source, model.bucket >= bucket, model.bucket < bucket + resolution
+                    ).distinct()
+                    if host not in done and self.owns(host)
+                ]
+                records: List[dict] = []
+                for first in range(0, len(hosts), HOSTS_PER_READ):
+                    rows = (
+                        db.query(*keys, model.count, *stats)
+                        .filter(
+                            model.resolution == source,
+                            model.host.in_(hosts[first:first + HOSTS_PER_READ]),
+                            model.bucket >= bucket,
+                            model.bucket < bucket + resolution
+                        )
+                        .order_by(*keys)
+                        .all()
+                    )
+                    if not rows:
+                        continue
+                    series = [tuple(row[:len(keys)]) for row in rows]
+                    starts = np.array([0] + [i for i in range(1, len(series)) if series[i] != series[i - 1]])
+                    values = np.array([row[len(keys):] for row in rows], dtype=np.float64)  # NULL -> NaN
+                    combined = combine(source, values, starts, len(metrics))
+                    records.extend(self._records(resolution, bucket, key_columns, [series[i] for i in starts.tolist()], metrics, combined))
+                    if len(records) >= self.batch_size:
+                        written += self._write(model, records)
+                        records = []
+                written += self._write(model, records)
+            finally:
+                db.close()
+        return written
+
+    def _write(self, model: type, records: List[dict]) -> int:
+        """Insert in batches of batch_size, one transaction each"""
+        if not records:
+            return 0
+        db = self.session_factory()
+        try:
+            for first in range(0, len(records), self.batch_size):
+                db.execute(insert(model), records[first:first + self.batch_size])
+                db.commit()
+        finally:
+            db.close()
+        self.rows_written += len(records)
+        return len(records)
+
+    def prune(self, now: float) -> int:
+        db = self.session_factory()
+        try:
+            deleted = 0
+            for model, _, _ in self._tables():
+                for resolution in RESOLUTIONS:
+                    deleted += db.query(model).filter(
+                        model.resolution == resolution,
+                        model.bucket < now - retention_seconds(resolution)
+                    ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def flush(self, now: Optional[float] = None) -> None:
+        """Roll up every bucket that closed since the last flush; blocking DB I/O"""
+        now = now if now is not None else time.time()
+        closed = math.floor((now - FLUSH_DELAY) / MINUTE) * MINUTE
+        if self._last_minute is None:
+            # After a restart, build the last hour and day if no one has yet
+            for resolution in (HOUR, DAY):
+                self.rollup_period(resolution, math.floor(closed / resolution) * resolution - resolution)
+        first = closed - MINUTE if self._last_minute is None else self._last_minute
+        for bucket in range(first, closed, MINUTE):
+            # Minutes the rings no longer hold are skipped rather than written short
+            if self.recent.covers(bucket):
+                self.rollup_minute(bucket)
+
+            end = bucket + MINUTE
+            for resolution in (HOUR, DAY):
+                if end % resolution == 0:
+                    self.rollup_period(resolution, end - resolution)
+        self._last_minute = closed
+
+        if now - self._last_prune >= HOUR:
+            self.prune(now)
+            self._last_prune = now
+
+    async def start(self) -> None:
+        if self._task:
+            return
+        if not self.recent.enabled:
+            logger.warning("Rollups need the recent sample history; set RECENT_SAMPLES above 0")
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info("Rollup sink started")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            now = time.time()
+            await asyncio.sleep(MINUTE - now % MINUTE + FLUSH_DELAY)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Rollup flush failed: {str(e)}")
+
+    def query(
+        self,
+        host: str,
+        metric: str,
+        start: float,
+        end: float,
+        step: float,
+        interface_index: str = ""
+    ) -> Tuple[int, List[dict]]:
+        """Points of one series from the coarsest tier that fits step; duplicate buckets are merged"""
+        resolution = pick_resolution(step, start)
+        model = models.InterfaceRollup if interface_index else models.DeviceRollup
+        stats = [getattr(model, models.rollup_column(metric, stat)) for stat in models.ROLLUP_STATS]
+        db = self.session_factory()
+        try:
+            rows = db.query(model.bucket, model.count, *stats).filter(
+                model.resolution == resolution,
+                model.host == host,
+                model.bucket >= math.floor(start / resolution) * resolution,
+                model.bucket <= end
+            )
+            if interface_index:
+                rows = rows.filter(model.interface_index == interface_index)
+            rows = rows.order_by(model.bucket).all()
+        finally:
+            db.close()
+
+        points: Dict[int, dict] = {}
+        for bucket, count, low, mean, high, p95 in rows:
+            if mean is None:
+                continue  # Row for the device or interface, but this metric was not polled
+            point = points.get(bucket)
+            if point is None:
+                points[bucket] = {"timestamp": bucket, "count": count, "min": low, "avg": mean, "max": high, "p95": p95}
+                continue
+            # Two pollers covered the bucket (e.g. a device changed owner mid-minute)
+            total = point["count"] + count
+            point["avg"] = (point["avg"] * point["count"] + mean * count) / total if total else point["avg"]
+            point["count"] = total
+            point["min"] = min(point["min"], low)
+            point["max"] = max(point["max"], high)
+            point["p95"] = max(point["p95"], p95)
+        return resolution, list(points.values())
+
+
+rollup_sink = RollupSink(owns=device_assignment.owns)
+
+
+def get_rollup_sink() -> RollupSink:
+    return rollup_sink
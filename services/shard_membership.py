@@ -0,0 +1,186 @@
+import asyncio
+import bisect
+import hashlib
+import os
+import socket
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from app.config.settings import settings
+from app.config.logging import logger
+from app.core import database, models
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes. When a worker joins or leaves,
+    only the devices on the arcs it gains or loses change owner.
+    """
+
+    def __init__(self, members: Iterable[str] = (), virtual_nodes: int = 64):
+        self.virtual_nodes = virtual_nodes
+        self.members = sorted(set(members))
+        points = sorted(
+            (ring_hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        i = bisect.bisect(self._hashes, ring_hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ShardMembership:
+    """
+    Tracks the live poller workers through the poller_workers table and
+    decides which devices this worker polls.
+
+    Every worker upserts its heartbeat row on an interval and reads back the
+    rows that are still fresh; the ring is rebuilt from those, so a worker
+    that stops heartbeating loses its devices to the others after
+    shard_member_ttl. When sharding is disabled the worker owns every device.
+    """
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        worker_id: Optional[str] = None,
+        heartbeat_interval: Optional[int] = None,
+        member_ttl: Optional[int] = None,
+        virtual_nodes: Optional[int] = None,
+        session_factory: Callable = database.SessionLocal
+    ):
+        self.enabled = settings.sharding_enabled if enabled is None else enabled
+        self.worker_id = worker_id or default_worker_id()
+        self.heartbeat_interval = heartbeat_interval or settings.shard_heartbeat_interval
+        self.member_ttl = member_ttl or settings.shard_member_ttl
+        self.virtual_nodes = virtual_nodes or settings.shard_virtual_nodes
+        self.session_factory = session_factory
+
+        self.ring = HashRing(virtual_nodes=self.virtual_nodes)
+        self.started_at = time.time()
+        self.rebalances = 0
+        self._listeners: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def owns(self, ip_address: str) -> bool:
+        if not self.enabled:
+            return True
+        return self.ring.owner(ip_address) == self.worker_id
+
+    def on_change(self, listener: Callable[[], None]) -> None:
+        """Call listener whenever the set of live workers changes"""
+        self._listeners.append(listener)
+
+    def heartbeat(self, now: Optional[float] = None) -> List[str]:
+        """Renew this worker's row and return the live members; blocking DB I/O"""
+        now = now if now is not None else time.time()
+        db = self.session_factory()
+        try:
+            row = db.get(models.PollerWorker, self.worker_id)
+            if row is None:
+                row = models.PollerWorker(
+                    worker_id=self.worker_id,
+                    hostname=socket.gethostname(),
+                    pid=os.getpid(),
+                    started_at=self.started_at
+                )
+                db.add(row)
+            row.heartbeat_at = now
+
+            cutoff = now - self.member_ttl
+            # Rows of long-gone workers are cleared by whoever notices first
+            db.query(models.PollerWorker).filter(models.PollerWorker.heartbeat_at < cutoff - self.member_ttl).delete()
+            db.commit()
+            return [
+                worker_id for (worker_id,) in db.query(models.PollerWorker.worker_id)
+                .filter(models.PollerWorker.heartbeat_at >= cutoff)
+                .all()
+            ]
+        finally:
+            db.close()
+
+    def leave(self) -> None:
+        db = self.session_factory()
+        try:
+            db.query(models.PollerWorker).filter(models.PollerWorker.worker_id == self.worker_id).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def apply_members(self, members: Iterable[str]) -> bool:
+        """Rebuild the ring if membership changed; returns whether it did"""
+        members = sorted(set(members) | {self.worker_id})
+        if members == self.ring.members:
+            return False
+        previous = self.ring.members
+        self.ring = HashRing(members, self.virtual_nodes)
+        self.rebalances += 1
+        logger.info(f"Shard membership changed ({len(previous)} -> {len(members)} workers), rebalancing devices")
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Shard change listener failed: {str(e)}")
+        return True
+
+    async def start(self) -> None:
+        if not self.enabled or self._task:
+            return
+        # Join before the first poll so this worker never starts with an empty ring
+        self.apply_members(await asyncio.to_thread(self.heartbeat))
+        self._task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"Poller worker {self.worker_id} joined shard ring with {len(self.ring.members)} workers")
+
+    async def stop(self) -> None:
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await asyncio.to_thread(self.leave)
+        except Exception as e:
+            logger.error(f"Failed to leave shard ring: {str(e)}")
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.apply_members(await asyncio.to_thread(self.heartbeat))
+            except Exception as e:
+                logger.error(f"Shard heartbeat failed: {str(e)}")
+
+    def report(self, devices: Iterable[str] = ()) -> dict:
+        owners: Dict[str, int] = {member: 0 for member in self.ring.members}
+        for ip_address in devices:
+            owner = self.ring.owner(ip_address)
+            if owner is not None:
+                owners[owner] += 1
+        return {
+            "enabled": self.enabled,
+            "mode": "hash",
+            "worker_id": self.worker_id,
+            "workers": self.ring.members,
+            "devices_per_worker": owners,
+            "rebalances": self.rebalances,
+        }
+
+
+shard_membership = ShardMembership()
+
+
+def get_shard_membership() -> ShardMembership:
+    return shard_membership
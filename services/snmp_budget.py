@@ -0,0 +1,243 @@
+import asyncio
+import bisect
+import ipaddress
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Tuple
+from app.config.settings import settings
+from app.core.prometheus_model import (
+    poller_snmp_budget_rate,
+    poller_snmp_budget_tokens,
+    poller_snmp_budget_waiters,
+    poller_snmp_budget_wait,
+    poller_snmp_budget_throttled,
+    poller_snmp_packets,
+)
+
+# Priority of hosts the scheduler does not know, e.g. discovery sweeps; they yield to polling
+UNRANKED_PRIORITY = 1000
+
+# Idle per-device/subnet buckets are dropped after this many seconds (they would be full anyway)
+IDLE_BUCKET_SECONDS = 60.0
+
+
+@dataclass
+class TokenBucket:
+    rate: float
+    burst: float
+    tokens: float = 0.0
+    updated: float = 0.0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available, after a refill"""
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    host: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    since: float = field(compare=False)
+
+
+class SnmpRequestBudget:
+    """
+    Token buckets metering every SNMP packet the poller sends: one global
+    packets-per-second budget plus per-device and per-subnet caps (a rate of
+    0 disables a level). A packet needs a token from all three.
+
+    When tokens are short, requests queue and are granted in device priority
+    order (P1 first, unknown hosts last), skipping any waiter whose own
+    device or subnet is still capped so one slow box cannot stall the queue.
+    """
+
+    def __init__(
+        self,
+        global_rate: Optional[float] = None,
+        global_burst: Optional[float] = None,
+        device_rate: Optional[float] = None,
+        device_burst: Optional[float] = None,
+        subnet_rate: Optional[float] = None,
+        subnet_burst: Optional[float] = None,
+        subnet_prefix: Optional[int] = None
+    ):
+        pick = lambda value, default: default if value is None else value
+        self.global_rate = pick(global_rate, settings.snmp_global_rate)
+        self.device_rate = pick(device_rate, settings.snmp_device_rate)
+        self.subnet_rate = pick(subnet_rate, settings.snmp_subnet_rate)
+        self.global_burst = pick(global_burst, settings.snmp_global_burst)
+        self.device_burst = pick(device_burst, settings.snmp_device_burst)
+        self.subnet_burst = pick(subnet_burst, settings.snmp_subnet_burst)
+        self.subnet_prefix = pick(subnet_prefix, settings.snmp_subnet_prefix)
+
+        now = time.monotonic()
+        self.global_bucket = TokenBucket(self.global_rate, self.global_burst, self.global_burst, now) if self.global_rate else None
+        self._devices: Dict[str, TokenBucket] = {}
+        self._subnets: Dict[str, TokenBucket] = {}
+        self._subnet_of: Dict[str, str] = {}
+        self.priorities: Dict[str, int] = {}
+
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._last_prune = now
+        self.granted = 0
+
+        for scope, rate in (("global", self.global_rate), ("device", self.device_rate), ("subnet", self.subnet_rate)):
+            poller_snmp_budget_rate.labels(scope=scope).set(rate)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.global_rate or self.device_rate or self.subnet_rate)
+
+    def set_priorities(self, priorities: Mapping[str, int]) -> None:
+        """Replace the host -> priority map used to order queued requests"""
+        self.priorities = dict(priorities)
+
+    def subnet(self, host: str) -> str:
+        subnet = self._subnet_of.get(host)
+        if subnet is None:
+            try:
+                subnet = str(ipaddress.ip_network(f"{host}/{self.subnet_prefix}", strict=False))
+            except ValueError:
+                subnet = host
+            self._subnet_of[host] = subnet
+        return subnet
+
+    def _buckets(self, host: str, now: float) -> List[Tuple[str, TokenBucket]]:
+        buckets = []
+        if self.global_bucket is not None:
+            buckets.append(("global", self.global_bucket))
+        if self.device_rate:
+            bucket = self._devices.get(host)
+            if bucket is None:
+                bucket = self._devices[host] = TokenBucket(self.device_rate, self.device_burst, self.device_burst, now)
+            buckets.append(("device", bucket))
+        if self.subnet_rate:
+            subnet = self.subnet(host)
+            bucket = self._subnets.get(subnet)
+            if bucket is None:
+                bucket = self._subnets[subnet] = TokenBucket(self.subnet_rate, self.subnet_burst, self.subnet_burst, now)
+            buckets.append(("subnet", bucket))
+        for _, bucket in buckets:
+            bucket.refill(now)
+        return buckets
+
+    def _try_take(self, host: str, now: float) -> Tuple[bool, float, str]:
+        """Take one token from every bucket of host if all have one; else (False, wait, limiting scope)"""
+        buckets = self._buckets(host, now)
+        wait, scope = 0.0, ""
+        for name, bucket in buckets:
+            if bucket.wait_time() > wait:
+                wait, scope = bucket.wait_time(), name
+        if wait > 0:
+            return False, wait, scope
+        for _, bucket in buckets:
+            bucket.tokens -= 1
+        self._granted()
+        return True, 0.0, ""
+
+    def _granted(self) -> None:
+        self.granted += 1
+        poller_snmp_packets.inc()
+        if self.global_bucket is not None:
+            poller_snmp_budget_tokens.set(round(self.global_bucket.tokens, 2))
+
+    async def acquire(self, host: str) -> None:
+        """Wait until one packet to host fits the budget"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        self._prune(now)
+        if not self._waiters:
+            taken, _, scope = self._try_take(host, now)
+            if taken:
+                return
+            poller_snmp_budget_throttled.labels(scope=scope).inc()
+
+        priority = self.priorities.get(host, UNRANKED_PRIORITY)
+        waiter = _Waiter(priority, next(self._seq), host, asyncio.get_running_loop().create_future(), now)
+        bisect.insort(self._waiters, waiter)
+        poller_snmp_budget_waiters.set(len(self._waiters))
+        self._ensure_dispatcher()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                poller_snmp_budget_waiters.set(len(self._waiters))
+            raise
+        poller_snmp_budget_wait.labels(priority=str(priority) if priority != UNRANKED_PRIORITY else "none").observe(
+            time.monotonic() - waiter.since
+        )
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        """Grant queued requests in priority order as tokens become available"""
+        while self._waiters:
+            self._wakeup.clear()  # type: ignore
+            now = time.monotonic()
+            next_wait = None
+            for waiter in list(self._waiters):
+                if waiter.future.done():
+                    self._waiters.remove(waiter)
+                    continue
+                taken, wait, scope = self._try_take(waiter.host, now)
+                if taken:
+                    self._waiters.remove(waiter)
+                    waiter.future.set_result(None)
+                    continue
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                if scope == "global":
+                    # Lower priorities must not take the global token this waiter is owed
+                    break
+            poller_snmp_budget_waiters.set(len(self._waiters))
+            if not self._waiters:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(next_wait or 0.0, 0.001))  # type: ignore
+            except asyncio.TimeoutError:
+                pass
+
+    def _prune(self, now: float) -> None:
+        if now - self._last_prune < IDLE_BUCKET_SECONDS:
+            return
+        self._last_prune = now
+        for buckets in (self._devices, self._subnets):
+            for key in [key for key, bucket in buckets.items() if now - bucket.updated >= IDLE_BUCKET_SECONDS]:
+                del buckets[key]
+        if len(self._subnet_of) > 4 * (len(self.priorities) + 1024):
+            self._subnet_of.clear()
+
+    def report(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rates": {"global": self.global_rate, "device": self.device_rate, "subnet": self.subnet_rate},
+            "subnet_prefix": self.subnet_prefix,
+            "global_tokens": round(self.global_bucket.tokens, 2) if self.global_bucket else None,
+            "waiters": len(self._waiters),
+            "tracked_devices": len(self._devices),
+            "tracked_subnets": len(self._subnets),
+            "granted": self.granted,
+        }
+
+
+snmp_budget = SnmpRequestBudget()
+
+
+def get_snmp_budget() -> SnmpRequestBudget:
+    return snmp_budget
@@ -1,4 +1,7 @@
 import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
 from typing import Optional
 from venv import logger
 from fastapi import Depends
@@ -13,11 +16,14 @@ from pysnmp.hlapi.v3arch.asyncio import (
     ObjectType,
     ObjectIdentity,
 )
+from pysnmp.proto import errind
 from app.core import database
 from app.config.settings import settings
 from app.core import schemas
 from abc import ABC, abstractmethod
+from app.core.prometheus_model import poller_snmp_pdu_rtt, poller_snmp_timeouts, poller_snmp_retries
 from services.device_service import DeviceRepository, SQLAlchemyDeviceRepository, update_device
+from services.snmp_budget import snmp_budget
 
 COMMUNITY = settings.snmp_community
 
@@ -27,11 +33,11 @@ def get_repository(db: Session = Depends(database.get_db)) -> DeviceRepository:
 
 class SNMPClient(ABC):
     @abstractmethod
-    async def get(self, host: str, oids: list[str]) -> Optional[dict]:
+    async def get(self, host: str, oids: list[str], vendor: Optional[str] = None) -> Optional[dict]:
         pass
     
     @abstractmethod
-    async def bulk_walk(self, host: str, oids: list[str]) -> dict:
+    async def bulk_walk(self, host: str, oids: list[str], vendor: Optional[str] = None) -> dict:
         pass
 
 
@@ -40,21 +46,52 @@ def get_snmp_client() -> SNMPClient:
 
 
 class PySNMPClient(SNMPClient):
-    def __init__(self, community: str = COMMUNITY):
+    def __init__(
+        self,
+        community: str = COMMUNITY,
+        timeout: float = settings.snmp_timeout,
+        retries: int = settings.snmp_retries
+    ):
         self.community = community
-    
-    async def get(self, host: str, oids: list[str]) -> Optional[dict]:
+        self.timeout = timeout
+        self.retries = retries
+
+    async def _send(self, op: str, vendor: Optional[str], snmp_engine: SnmpEngine, transport_address: tuple, command, *args) -> tuple:
+        """
+        Issue one SNMP request, re-sending on timeout. The timeout is the budget
+        for the whole request and is split evenly across attempts, so each
+        exchange can be timed on its own. Every attempt waits for a packet
+        token from the shared request budget first. Timeouts and retries are
+        counted per vendor to single out agents that struggle.
+        """
+        vendor = vendor or "unknown"
+        attempts = self.retries + 1
+        for attempt in range(attempts):
+            if attempt:
+                poller_snmp_retries.labels(op=op, vendor=vendor).inc()
+            await snmp_budget.acquire(transport_address[0])
+            started = time.monotonic()
+            response = await command(
+                snmp_engine,
+                CommunityData(self.community, mpModel=1),
+                await UdpTransportTarget.create(transport_address, timeout=self.timeout / attempts, retries=0),
+                ContextData(),
+                *args,
+            )
+            poller_snmp_pdu_rtt.labels(op=op).observe(time.monotonic() - started)
+            if not isinstance(response[0], errind.RequestTimedOut):
+                return response
+            poller_snmp_timeouts.labels(op=op, vendor=vendor).inc()
+        return response
+
+    async def get(self, host: str, oids: list[str], vendor: Optional[str] = None) -> Optional[dict]:
         port = 161
         transport_address = (host, port)
         try:
             snmpEngine = SnmpEngine()
             oid_objects = [ObjectType(ObjectIdentity(oid)) for oid in oids]
-            errorIndication, errorStatus, errorIndex, varBinds = await get_cmd(
-                snmpEngine,
-                CommunityData(self.community, mpModel=1),
-                await UdpTransportTarget.create(transport_address),
-                ContextData(),
-                *oid_objects,
+            errorIndication, errorStatus, errorIndex, varBinds = await self._send(
+                "get", vendor, snmpEngine, transport_address, get_cmd, *oid_objects
             )
 
             if errorIndication or errorStatus or not varBinds:
@@ -86,7 +123,7 @@ class PySNMPClient(SNMPClient):
         except Exception:
             return None
     
-    async def bulk_walk(self, host: str, oids: list[str]) -> dict:
+    async def bulk_walk(self, host: str, oids: list[str], vendor: Optional[str] = None) -> dict:
         port = 161
         transport_address = (host, port)
         snmp_engine = SnmpEngine()
@@ -95,13 +132,8 @@ class PySNMPClient(SNMPClient):
         results = []
         try:
             # Await the bulk_cmd call - it returns a single result, not an iterator
-            errorIndication, errorStatus, errorIndex, varBindTable = await bulk_cmd(
-                snmp_engine,
-                CommunityData(self.community, mpModel=1),
-                await UdpTransportTarget.create(transport_address),
-                ContextData(),
-                0, 25, 
-                *oid_objects
+            errorIndication, errorStatus, errorIndex, varBindTable = await self._send(
+                "bulk_walk", vendor, snmp_engine, transport_address, bulk_cmd, 0, 25, *oid_objects
             )
             
             if errorIndication:
@@ -128,22 +160,50 @@ class PySNMPClient(SNMPClient):
             return {"success": False, "error": str(e)}
 
 
+class DeviceRequestLimiter:
+    """
+    Caps the SNMP requests in flight to any one device, so the system and
+    interface fetches of a poll can overlap without flooding fragile agents.
+    Idle hosts hold no state: a semaphore lives only while someone uses it.
+    """
+
+    def __init__(self, limit: int = settings.snmp_max_requests_per_device):
+        self.limit = limit
+        self._slots: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        semaphore = self._slots.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit)
+            self._slots[host] = semaphore
+        async with semaphore:
+            yield
+
+
+device_request_limiter = DeviceRequestLimiter()
+
+
 async def get_snmp_data(
     host: str,
     oids: list[str],
-    snmp_client: SNMPClient
+    snmp_client: SNMPClient,
+    vendor: Optional[str] = None
 ) -> Optional[dict]:
     """Service function for SNMP GET operations"""
-    return await snmp_client.get(host, oids)
+    async with device_request_limiter.slot(host):
+        return await snmp_client.get(host, oids, vendor)
 
 
 async def bulk_snmp_walk(
     host: str,
     oids: list[str],
-    snmp_client: SNMPClient
+    snmp_client: SNMPClient,
+    vendor: Optional[str] = None
 ) -> dict:
     """Service function for SNMP BULK WALK operations"""
-    return await snmp_client.bulk_walk(host, oids)
+    async with device_request_limiter.slot(host):
+        return await snmp_client.bulk_walk(host, oids, vendor)
 
 
 async def device_discovery(
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Set
+import numpy as np
+from app.config.settings import settings
+from app.config.logging import logger
+from app.core.compact_collector import CompactMetricsCollector
+from app.core.prometheus_model import metrics_store
+from services.device_leases import DeviceAssignment, device_assignment
+from services.polling_service import DeviceRow, TierScheduler, load_devices, tier_scheduler
+
+SNAPSHOT_VERSION = 1
+
+
+class StateSnapshotter:
+    """
+    Checkpoints the in-memory poll state to a single .npz file so a restart
+    resumes where it left off: the last interface counters and sample times
+    (the first walk after a restart yields rates instead of a blank cycle),
+    interface names, device values and labels, and the scheduler's last-poll
+    times so due devices are not all polled at once.
+
+    The file is written to a temporary name and renamed into place, so a
+    crash mid-write leaves the previous snapshot intact. Snapshots older than
+    max_age are ignored, since counters that stale only produce one long,
+    averaged-out rate.
+
+    Only devices still registered and owned by this worker are restored; the
+    scheduler drops any of them its first sync does not confirm. Sharded
+    workers each keep their own file, named after STATE_SNAPSHOT_NODE_ID or
+    the worker id.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        interval: Optional[int] = None,
+        max_age: Optional[int] = None,
+        store: CompactMetricsCollector = metrics_store,
+        tiers: TierScheduler = tier_scheduler,
+        assignment: DeviceAssignment = device_assignment,
+        device_source: Callable[[], List[DeviceRow]] = load_devices
+    ):
+        self.assignment = assignment
+        self.device_source = device_source
+        self.path = path or snapshot_path(settings.state_snapshot_path, assignment)
+        self.interval = interval or settings.state_snapshot_interval
+        self.max_age = settings.state_snapshot_max_age if max_age is None else max_age
+        self.store = store
+        self.tiers = tiers
+        self.saved_at: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+        self.restored_hosts: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def save(self) -> int:
+        """Write the snapshot; returns its size in bytes. Blocking file I/O"""
+        arrays: Dict[str, np.ndarray] = {
+            "meta/version": np.array(SNAPSHOT_VERSION),
+            "meta/saved_at": np.array(time.time()),
+        }
+        arrays.update({f"store/{key}": value for key, value in self.store.export_state().items()})
+        arrays.update({f"tiers/{key}": value for key, value in self.tiers.export_state().items()})
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".poller_state-", suffix=".npz", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.saved_at = float(arrays["meta/saved_at"])
+        return os.path.getsize(self.path)
+
+    def load(self) -> bool:
+        """
+        Restore the snapshot if there is a recent one; returns whether it did.
+        Call once device assignment has started, so ownership is known. Blocking I/O
+        """
+        if not os.path.exists(self.path):
+            return False
+        with np.load(self.path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+
+        if int(arrays.get("meta/version", -1)) != SNAPSHOT_VERSION:
+            logger.warning(f"Ignoring poll state snapshot {self.path} with unknown version")
+            return False
+        age = time.time() - float(arrays["meta/saved_at"])
+        if age > self.max_age:
+            logger.info(f"Ignoring poll state snapshot {self.path}, {age:.0f}s old")
+            return False
+
+        def section(prefix: str) -> Dict[str, np.ndarray]:
+            return {key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)}
+
+        registered = {row[0] for row in self.device_source()}
+        keep = lambda host: host in registered and self.assignment.owns(host)
+        store = section("store/")
+        saved_hosts = set(store["interface_hosts"].tolist()) | set(store["device_hosts"].tolist())
+        self.restored_hosts = {host for host in saved_hosts if keep(host)}
+
+        interfaces = self.store.import_state(store, keep)
+        self.tiers.import_state(section("tiers/"), keep)
+        self.loaded_at = time.time()
+        logger.info(
+            f"Restored poll state from {self.path} ({age:.0f}s old, {len(self.restored_hosts)} devices, "
+            f"{interfaces} interfaces, {len(saved_hosts) - len(self.restored_hosts)} devices skipped)"
+        )
+        return True
+
+    async def start(self) -> None:
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic task and take a final snapshot"""
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            size = await asyncio.to_thread(self.save)
+            logger.info(f"Saved poll state to {self.path} ({size} bytes)")
+        except Exception as e:
+            logger.error(f"Failed to save poll state: {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                logger.error(f"Failed to save poll state: {str(e)}")
+
+
+def snapshot_path(path: str, assignment: DeviceAssignment) -> str:
+    """Sharded workers hold different devices, so each gets its own file"""
+    if not assignment.enabled:
+        return path
+    root, extension = os.path.splitext(path)
+    node = settings.state_snapshot_node_id or assignment.worker_id
+    return f"{root}-{node}{extension}"
+
+
+state_snapshotter = StateSnapshotter()
+
+
+def get_state_snapshotter() -> StateSnapshotter:
+    return state_snapshotter
@@ -0,0 +1,248 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api
+from app.config.settings import settings
+from app.config.logging import logger
+from app.core.prometheus_model import (
+    metrics_store,
+    mark_registry_updated,
+    poller_traps_received,
+    poller_trap_repolls,
+)
+from services.metrics_publisher import metrics_publisher
+from services.device_leases import device_assignment
+
+SNMP_TRAP_OID = "1.3.6.1.6.3.1.1.4.1.0"
+SNMP_TRAP_ADDRESS = "1.3.6.1.6.3.18.1.3.0"
+IF_INDEX_PREFIX = "1.3.6.1.2.1.2.2.1.1."
+IF_OPER_STATUS_PREFIX = "1.3.6.1.2.1.2.2.1.8."
+
+# SNMPv2-MIB / IF-MIB standard notifications and their SNMPv1 generic-trap numbers
+STANDARD_TRAPS = {
+    "1.3.6.1.6.3.1.1.5.1": "coldStart",
+    "1.3.6.1.6.3.1.1.5.2": "warmStart",
+    "1.3.6.1.6.3.1.1.5.3": "linkDown",
+    "1.3.6.1.6.3.1.1.5.4": "linkUp",
+    "1.3.6.1.6.3.1.1.5.5": "authenticationFailure",
+}
+GENERIC_TRAPS = {
+    0: "coldStart",
+    1: "warmStart",
+    2: "linkDown",
+    3: "linkUp",
+    4: "authenticationFailure",
+    5: "egpNeighborLoss",
+    6: "enterpriseSpecific",
+}
+
+# ifOperStatus to assume when a link trap carries only the ifIndex
+LINK_STATUS = {"linkUp": 1, "linkDown": 2}
+REPOLL_TRAPS = {"coldStart", "warmStart", "linkDown", "linkUp"}
+
+
+@dataclass
+class TrapEvent:
+    host: str
+    trap: str
+    interfaces: Dict[str, int] = field(default_factory=dict)
+    inform: bool = False
+
+
+def decode_notification(data: bytes, source: str, community: str) -> Tuple[Optional[TrapEvent], Optional[bytes]]:
+    """
+    Decode an SNMPv1/v2c trap or inform. Returns the event (None for other
+    PDUs or a wrong community) and, for informs, the encoded response to send back.
+    """
+    version = int(api.decodeMessageVersion(data))
+    module = api.PROTOCOL_MODULES.get(version)
+    if module is None:
+        raise ValueError(f"unsupported SNMP version {version}")
+    message, _ = decoder.decode(data, asn1Spec=module.Message())
+    if str(module.apiMessage.get_community(message)) != community:
+        return None, None
+    pdu = module.apiMessage.get_pdu(message)
+
+    if version == api.SNMP_VERSION_1:
+        if not pdu.isSameTypeWith(module.TrapPDU()):
+            return None, None
+        generic = int(module.apiTrapPDU.get_generic_trap(pdu))
+        trap = GENERIC_TRAPS.get(generic, str(generic))
+        host = module.apiTrapPDU.get_agent_address(pdu).prettyPrint() or source
+        varbinds = module.apiTrapPDU.get_varbinds(pdu)
+        inform = False
+    else:
+        inform = pdu.isSameTypeWith(module.InformRequestPDU())
+        if not inform and not pdu.isSameTypeWith(module.SNMPv2TrapPDU()):
+            return None, None
+        varbinds = module.apiPDU.get_varbinds(pdu)
+        values = {str(oid): value for oid, value in varbinds}
+        trap_oid = str(values.get(SNMP_TRAP_OID, ""))
+        trap = STANDARD_TRAPS.get(trap_oid, trap_oid or "unknown")
+        # Set by proxies and forwarders to the address of the originating agent
+        host = values[SNMP_TRAP_ADDRESS].prettyPrint() if SNMP_TRAP_ADDRESS in values else source
+
+    interfaces: Dict[str, int] = {}
+    if trap in LINK_STATUS:
+        for oid, value in varbinds:
+            oid = str(oid)
+            if oid.startswith(IF_OPER_STATUS_PREFIX):
+                interfaces[oid[len(IF_OPER_STATUS_PREFIX):]] = int(value)
+            elif oid.startswith(IF_INDEX_PREFIX):
+                interfaces.setdefault(str(int(value)), LINK_STATUS[trap])
+
+    response = None
+    if inform:
+        reply = module.apiMessage.get_response(message)
+        module.apiPDU.set_varbinds(module.apiMessage.get_pdu(reply), varbinds)
+        response = encoder.encode(reply)
+    return TrapEvent(host, trap, interfaces, inform), response
+
+
+class _TrapProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver: "TrapReceiver"):
+        self.receiver = receiver
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        response = self.receiver.datagram_received(data, addr[0])
+        if response is not None and self.transport is not None:
+            self.transport.sendto(response, addr)
+
+
+class TrapReceiver:
+    """
+    UDP listener for SNMP traps and informs. A link trap overwrites the
+    interface's oper status and any trap marks its device up straight away;
+    link and restart traps then queue one full poll of that device after a
+    short holdoff, so a burst of traps from one box (a switch reload sends
+    one per port) costs a single poll. Traps for devices another poller
+    owns are ignored.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        community: Optional[str] = None,
+        holdoff: Optional[float] = None,
+        owns: Optional[Callable[[str], bool]] = None
+    ):
+        self.host = host or settings.trap_listen_address
+        self.port = port or settings.trap_port
+        self.community = community or settings.snmp_community
+        self.holdoff = settings.trap_repoll_holdoff if holdoff is None else holdoff
+        self.owns = owns or (lambda host: True)
+        self.repoll_fn: Optional[Callable[[str], Awaitable[bool]]] = None
+        self._warned_no_repoll = False
+
+        self.received: Dict[str, int] = {}
+        self.last_trap: Optional[dict] = None
+        self._pending: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    def set_repoll(self, repoll_fn: Callable[[str], Awaitable[bool]]) -> None:
+        """Coroutine called with a device address to poll it ahead of schedule"""
+        self.repoll_fn = repoll_fn
+
+    def datagram_received(self, data: bytes, source: str) -> Optional[bytes]:
+        try:
+            event, response = decode_notification(data, source, self.community)
+        except Exception as e:
+            poller_traps_received.labels(trap="unknown", result="malformed").inc()
+            logger.debug(f"Dropped malformed SNMP packet from {source}: {str(e)}")
+            return None
+        if event is None:
+            poller_traps_received.labels(trap="unknown", result="rejected").inc()
+            return None
+        self.handle(event)
+        return response
+
+    def handle(self, event: TrapEvent) -> str:
+        """Apply a trap to the metric store and queue a re-poll; returns how it was handled"""
+        self.received[event.trap] = self.received.get(event.trap, 0) + 1
+        if not self.owns(event.host):
+            result = "ignored"
+        else:
+            known = metrics_store.mark_device_reachable(event.host)
+            for index, status in event.interfaces.items():
+                known = metrics_store.set_interface_status(event.host, index, status) or known
+            if known:
+                mark_registry_updated()
+                metrics_publisher.request_push()
+            if event.trap in REPOLL_TRAPS:
+                self._schedule_repoll(event.host)
+            result = "applied" if known else "unknown_device"
+
+        poller_traps_received.labels(trap=event.trap, result=result).inc()
+        self.last_trap = {"host": event.host, "trap": event.trap, "interfaces": event.interfaces, "result": result}
+        logger.info(f"{event.trap} trap from {event.host} ({result})")
+        return result
+
+    def _schedule_repoll(self, host: str) -> None:
+        if self.repoll_fn is None:
+            poller_trap_repolls.labels(result="no_scheduler").inc()
+            if not self._warned_no_repoll:
+                logger.warning("Traps are received but nothing re-polls them; set SCHEDULER_ENABLED=true")
+                self._warned_no_repoll = True
+            return
+        if host in self._pending:
+            poller_trap_repolls.labels(result="coalesced").inc()
+            return
+        self._pending.add(host)
+        task = asyncio.create_task(self._repoll(host))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _repoll(self, host: str) -> None:
+        try:
+            await asyncio.sleep(self.holdoff)
+            queued = await self.repoll_fn(host)  # type: ignore
+            poller_trap_repolls.labels(result="queued" if queued else "skipped").inc()
+        except Exception as e:
+            logger.error(f"Trap re-poll of {host} failed: {str(e)}")
+        finally:
+            self._pending.discard(host)
+
+    async def start(self) -> None:
+        if self._transport:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _TrapProtocol(self),
+                local_addr=(self.host, self.port)
+            )
+        except OSError as e:
+            logger.error(f"Trap receiver could not bind {self.host}:{self.port}: {str(e)}")
+            return
+        logger.info(f"Trap receiver listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._transport:
+            self._transport.close()
+            self._transport = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def report(self) -> dict:
+        return {
+            "listening": self._transport is not None,
+            "address": f"{self.host}:{self.port}",
+            "received": self.received,
+            "pending_repolls": sorted(self._pending),
+            "last_trap": self.last_trap,
+        }
+
+
+trap_receiver = TrapReceiver(owns=device_assignment.owns)
+
+
+def get_trap_receiver() -> TrapReceiver:
+    return trap_receiver
@@ -13,6 +13,8 @@ class QueryTester:
         self.prometheus_url = prometheus_url
         self.query_endpoint = f"{prometheus_url}/api/v1/query"
         self.query_range_endpoint = f"{prometheus_url}/api/v1/query_range"
+        # One pooled client for the whole run, opened in run_all_tests
+        self.client: httpx.AsyncClient = None
 
     async def test_query(self, query, description):
         """Test a single Prometheus query"""
@@ -20,33 +22,32 @@ class QueryTester:
         print(f"Query: {query}")
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    self.query_endpoint, 
-                    params={"query": query}, 
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = await self.client.get(
+                self.query_endpoint, 
+                params={"query": query}, 
+                timeout=10.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            
+            if data.get("status") == "success":
+                results = data.get("data", {}).get("result", [])
+                print(f"✅ Success: {len(results)} results")
                 
-                if data.get("status") == "success":
-                    results = data.get("data", {}).get("result", [])
-                    print(f"✅ Success: {len(results)} results")
-                    
-                    # Show sample results
-                    for i, result in enumerate(results[:3]):  # Show first 3
-                        metric = result.get("metric", {})
-                        value = result.get("value", ["", ""])[1]
-                        labels = ", ".join([f"{k}={v}" for k, v in metric.items() if not k.startswith("__")])
-                        print(f"   [{i+1}] {labels} = {value}")
-                    
-                    if len(results) > 3:
-                        print(f"   ... and {len(results) - 3} more")
-                    
-                    return True
-                else:
-                    print(f"❌ Failed: {data.get('error', 'Unknown error')}")
-                    return False
+                # Show sample results
+                for i, result in enumerate(results[:3]):  # Show first 3
+                    metric = result.get("metric", {})
+                    value = result.get("value", ["", ""])[1]
+                    labels = ", ".join([f"{k}={v}" for k, v in metric.items() if not k.startswith("__")])
+                    print(f"   [{i+1}] {labels} = {value}")
+                
+                if len(results) > 3:
+                    print(f"   ... and {len(results) - 3} more")
+                
+                return True
+            else:
+                print(f"❌ Failed: {data.get('error', 'Unknown error')}")
+                return False
                     
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -62,38 +63,37 @@ class QueryTester:
         print(f"Time range: {duration}")
         
         try:
-            async with httpx.AsyncClient() as client:
-                params = {
-                    "query": query,
-                    "start": start_time.isoformat() + "Z",
-                    "end": end_time.isoformat() + "Z",
-                    "step": "30s"
-                }
+            params = {
+                "query": query,
+                "start": start_time.isoformat() + "Z",
+                "end": end_time.isoformat() + "Z",
+                "step": "30s"
+            }
+            
+            response = await self.client.get(
+                self.query_range_endpoint,
+                params=params,
+                timeout=10.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            
+            if data.get("status") == "success":
+                results = data.get("data", {}).get("result", [])
+                print(f"✅ Success: {len(results)} series")
                 
-                response = await client.get(
-                    self.query_range_endpoint,
-                    params=params,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                data = response.json()
+                for i, result in enumerate(results[:2]):  # Show first 2 series
+                    metric = result.get("metric", {})
+                    values = result.get("values", [])
+                    labels = ", ".join([f"{k}={v}" for k, v in metric.items() if not k.startswith("__")])
+                    print(f"   [{i+1}] {labels}: {len(values)} data points")
+                    if values:
+                        print(f"       Latest: {values[-1][1]} at {datetime.fromtimestamp(float(values[-1][0]))}")
                 
-                if data.get("status") == "success":
-                    results = data.get("data", {}).get("result", [])
-                    print(f"✅ Success: {len(results)} series")
-                    
-                    for i, result in enumerate(results[:2]):  # Show first 2 series
-                        metric = result.get("metric", {})
-                        values = result.get("values", [])
-                        labels = ", ".join([f"{k}={v}" for k, v in metric.items() if not k.startswith("__")])
-                        print(f"   [{i+1}] {labels}: {len(values)} data points")
-                        if values:
-                            print(f"       Latest: {values[-1][1]} at {datetime.fromtimestamp(float(values[-1][0]))}")
-                    
-                    return True
-                else:
-                    print(f"❌ Failed: {data.get('error', 'Unknown error')}")
-                    return False
+                return True
+            else:
+                print(f"❌ Failed: {data.get('error', 'Unknown error')}")
+                return False
                     
         except Exception as e:
             print(f"❌ Error: {e}")
@@ -101,6 +101,11 @@ class QueryTester:
 
     async def run_all_tests(self):
         """Run all test queries that match your application"""
+        async with httpx.AsyncClient() as client:
+            self.client = client
+            return await self._run_all_tests()
+
+    async def _run_all_tests(self):
         print("🧪 Starting Prometheus Query Tests")
         print("=" * 50)
         
@@ -123,11 +128,14 @@ class QueryTester:
             ("interface_octets_total", "Interface traffic counters"),
             ("interface_errors_total", "Interface error counters"),
             ("interface_discards_total", "Interface discard counters"),
+            ("interface_bits_per_second", "Interface traffic rates"),
             
             # Aggregated queries (like your app uses)
             ('sum(rate(interface_octets_total{direction="in"}[5m]))', "Total inbound traffic rate"),
             ('sum(rate(interface_octets_total{direction="out"}[5m]))', "Total outbound traffic rate"),
             ('sum(rate(interface_octets_total[5m]))', "Total traffic rate"),
+            ('sum(interface_bits_per_second{direction="in"})', "Total inbound traffic rate (poller-computed)"),
+            ('sum(interface_bits_per_second)', "Total traffic rate (poller-computed)"),
             
             # Specific device queries
             ('device_up{host="192.168.1.1"}', "Specific device status"),